@@ -99,6 +99,9 @@ parser.add_argument("--preview-method", type=LatentPreviewMethod, default=Latent
 
 parser.add_argument("--preview-size", type=int, default=512, help="Sets the maximum preview size for sampler nodes.")
 
+parser.add_argument("--prompt-workers", type=int, default=1, metavar="N", help="Execute up to N prompts at the same time, each worker with its own node cache. Workers prefer queued prompts that load the models they already have cached, a prompt can be pinned to a worker with extra_data {\"worker\": index}. All workers share the torch device, so this mainly helps CPU-bound workflows. POST /interrupt accepts {\"prompt_id\": id} to stop a single worker.")
+parser.add_argument("--coalesce-prompts", action="store_true", help="Fuse queued prompts built from the same workflow that only differ in CLIPTextEncode text and KSampler seed into one batched KSampler run (each prompt keeps the noise of its own seed), the images are split back per prompt. Other prompts of the same workflow run back to back.")
+
 cache_group = parser.add_mutually_exclusive_group()
 cache_group.add_argument("--cache-classic", action="store_true", help="Use the old style (aggressive) caching.")
 cache_group.add_argument("--cache-lru", type=int, default=0, help="Use LRU caching with a maximum of N node results cached. May use more RAM/VRAM.")
@@ -153,6 +156,7 @@ parser.add_argument("--disable-all-custom-nodes", action="store_true", help="Dis
 parser.add_argument("--disable-api-nodes", action="store_true", help="Disable loading all api nodes.")
 
 parser.add_argument("--multi-user", action="store_true", help="Enables per-user storage.")
+parser.add_argument("--history-db", type=str, default=None, metavar="PATH", help="Store the prompt history and the pending queue in this SQLite database so they survive restarts.")
 
 parser.add_argument("--verbose", default='INFO', const='DEBUG', nargs="?", choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'], help='Set the logging level')
 parser.add_argument("--log-stdout", action="store_true", help="Send normal process output to stdout instead of stderr (default).")
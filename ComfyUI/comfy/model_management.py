@@ -25,6 +25,7 @@ import sys
 import platform
 import weakref
 import gc
+import threading
 
 class VRAMState(Enum):
     DISABLED = 0    #No vram present: no need to move models to vram
@@ -386,6 +387,22 @@ except:
 
 current_loaded_models = []
 
+# With several prompt workers (--prompt-workers) loads and evictions are serialized by this lock, and the
+# models a worker loaded for its current node are pinned: other workers don't evict or detach them.
+model_management_lock = threading.RLock()
+model_pins_released = threading.Condition(model_management_lock)
+pinned_models = {}  # thread id -> LoadedModels from that thread's last load_models_gpu call
+
+def _pinned_by_other_thread(loaded_model):
+    thread_id = threading.get_ident()
+    return any(t != thread_id and any(m is loaded_model for m in models) for t, models in pinned_models.items())
+
+def release_models(thread_id=None):
+    """Unpins the models of thread_id (default: the calling thread), called when its prompt is done."""
+    with model_management_lock:
+        pinned_models.pop(threading.get_ident() if thread_id is None else thread_id, None)
+        model_pins_released.notify_all()
+
 def module_size(module):
     module_mem = 0
     sd = module.state_dict()
@@ -514,6 +531,10 @@ def minimum_inference_memory():
     return (1024 * 1024 * 1024) * 0.8 + extra_reserved_memory()
 
 def free_memory(memory_required, device, keep_loaded=[]):
+    with model_management_lock:
+        return _free_memory(memory_required, device, keep_loaded)
+
+def _free_memory(memory_required, device, keep_loaded=[]):
     cleanup_models_gc()
     unloaded_model = []
     can_unload = []
@@ -522,7 +543,7 @@ def free_memory(memory_required, device, keep_loaded=[]):
     for i in range(len(current_loaded_models) -1, -1, -1):
         shift_model = current_loaded_models[i]
         if shift_model.device == device:
-            if shift_model not in keep_loaded and not shift_model.is_dead():
+            if shift_model not in keep_loaded and not shift_model.is_dead() and not _pinned_by_other_thread(shift_model):
                 can_unload.append((-shift_model.model_offloaded_memory(), sys.getrefcount(shift_model.model), shift_model.model_memory(), i))
                 shift_model.currently_used = False
 
@@ -551,6 +572,13 @@ def free_memory(memory_required, device, keep_loaded=[]):
     return unloaded_models
 
 def load_models_gpu(models, memory_required=0, force_patch_weights=False, minimum_memory_required=None, force_full_load=False):
+    with model_management_lock:
+        # The models of this thread's previous call are no longer in use once it loads the next ones
+        release_models()
+        loaded = _load_models_gpu(models, memory_required, force_patch_weights, minimum_memory_required, force_full_load)
+        pinned_models[threading.get_ident()] = loaded
+
+def _load_models_gpu(models, memory_required=0, force_patch_weights=False, minimum_memory_required=None, force_full_load=False):
     cleanup_models_gc()
     global vram_state
 
@@ -581,13 +609,22 @@ def load_models_gpu(models, memory_required=0, force_patch_weights=False, minimu
                 logging.info(f"Requested to load {x.model.__class__.__name__}")
             models_to_load.append(loaded_model)
 
+    shared = []
     for loaded_model in models_to_load:
-        to_unload = []
-        for i in range(len(current_loaded_models)):
-            if loaded_model.model.is_clone(current_loaded_models[i].model):
-                to_unload = [i] + to_unload
-        for i in to_unload:
-            current_loaded_models.pop(i).model.detach(unpatch_all=False)
+        if any(m is loaded_model for m in current_loaded_models) and _pinned_by_other_thread(loaded_model):
+            # Another worker is using this model with the same patches, use it as it is loaded
+            shared.append(loaded_model)
+            continue
+        # Clones share the weights, wait until no other worker uses one before patching them differently
+        while True:
+            to_unload = [m for m in current_loaded_models if loaded_model.model.is_clone(m.model)]
+            if not any(_pinned_by_other_thread(m) for m in to_unload):
+                break
+            model_pins_released.wait()
+        for m in to_unload:
+            current_loaded_models.remove(m)
+            m.model.detach(unpatch_all=False)
+    models_to_load = [m for m in models_to_load if not any(m is s for s in shared)]
 
     total_memory_required = {}
     for loaded_model in models_to_load:
@@ -624,7 +661,7 @@ def load_models_gpu(models, memory_required=0, force_patch_weights=False, minimu
 
         loaded_model.model_load(lowvram_model_memory, force_patch_weights=force_patch_weights)
         current_loaded_models.insert(0, loaded_model)
-    return
+    return models_to_load + shared
 
 def load_model_gpu(model):
     return load_models_gpu([model])
@@ -661,6 +698,10 @@ def cleanup_models_gc():
 
 
 def cleanup_models():
+    with model_management_lock:
+        _cleanup_models()
+
+def _cleanup_models():
     to_delete = []
     for i in range(len(current_loaded_models)):
         if current_loaded_models[i].real_model() is None:
@@ -1304,22 +1345,50 @@ class InterruptProcessingException(Exception):
 interrupt_processing_mutex = threading.RLock()
 
 interrupt_processing = False
-def interrupt_current_processing(value=True):
+# Threads (prompt workers) whose current prompt should be interrupted
+interrupted_threads = set()
+# Threads currently executing a prompt
+processing_threads = set()
+
+def set_processing_thread(active=True):
+    with interrupt_processing_mutex:
+        if active:
+            processing_threads.add(threading.get_ident())
+        else:
+            processing_threads.discard(threading.get_ident())
+
+def interrupt_current_processing(value=True, thread_id=None):
+    """
+    thread_id: only interrupt (or clear the interrupt of) the prompt executing on that thread. Without it
+    every prompt being executed is interrupted, nothing is when no prompt is executing.
+    """
     global interrupt_processing
     global interrupt_processing_mutex
     with interrupt_processing_mutex:
-        interrupt_processing = value
+        if thread_id is None:
+            if value:
+                interrupted_threads.update(processing_threads)
+            else:
+                interrupt_processing = False
+        elif value:
+            interrupted_threads.add(thread_id)
+        else:
+            interrupted_threads.discard(thread_id)
 
 def processing_interrupted():
     global interrupt_processing
     global interrupt_processing_mutex
     with interrupt_processing_mutex:
-        return interrupt_processing
+        return interrupt_processing or threading.get_ident() in interrupted_threads
 
 def throw_exception_if_processing_interrupted():
     global interrupt_processing
     global interrupt_processing_mutex
     with interrupt_processing_mutex:
+        thread_id = threading.get_ident()
+        if thread_id in interrupted_threads:
+            interrupted_threads.discard(thread_id)
+            raise InterruptProcessingException()
         if interrupt_processing:
             interrupt_processing = False
             raise InterruptProcessingException()
@@ -24,6 +24,17 @@ def prepare_noise(latent_image, seed, noise_inds=None):
     noises = torch.cat(noises, axis=0)
     return noises
 
+def prepare_noise_per_seed(latent_image, seeds, noise_inds=None):
+    """
+    noise for a batch made of len(seeds) equally sized parts, part i gets the noise prepare_noise gives it for seeds[i].
+    """
+    size = latent_image.shape[0] // len(seeds)
+    noises = []
+    for i, seed in enumerate(seeds):
+        inds = None if noise_inds is None else noise_inds[i * size:(i + 1) * size]
+        noises.append(prepare_noise(latent_image[i * size:(i + 1) * size], seed, inds))
+    return torch.cat(noises, axis=0)
+
 def fix_empty_latent_channels(model, latent_image):
     latent_format = model.get_model_object("latent_format") #Resize the empty latent image so it has the right number of channels
     if latent_format.latent_channels != latent_image.shape[1] and torch.count_nonzero(latent_image) == 0:
@@ -1,4 +1,9 @@
+import hashlib
 import itertools
+import threading
+import weakref
+import numpy as np
+import torch
 from typing import Sequence, Mapping, Dict
 from comfy_execution.graph import DynamicPrompt
 
@@ -43,17 +48,62 @@ class Unhashable:
     def __init__(self):
         self.value = float("NaN")
 
+def digest_buffer(buffer) -> str:
+    return hashlib.blake2b(buffer, digest_size=16).hexdigest()
+
+# Tensor digests by (data_ptr, version counter, layout). The version counter is shared by all views of
+# a storage and bumped by in-place writes; the weak reference detects a freed tensor whose memory was
+# reused by a new one. Inference tensors (everything created while a prompt runs under inference_mode)
+# have no version counter, so they are keyed by the identity of the tensor object instead: like cached
+# node outputs, which are handed to later prompts by reference, they are assumed not to be written in place.
+_TENSOR_DIGESTS = {}
+_TENSOR_DIGESTS_LOCK = threading.RLock()
+
+def _forget_tensor_digest(key, ref):
+    with _TENSOR_DIGESTS_LOCK:
+        memo = _TENSOR_DIGESTS.get(key, None)
+        if memo is not None and memo[0] is ref:
+            del _TENSOR_DIGESTS[key]
+
+def _tensor_digest_key(tensor: torch.Tensor):
+    layout = (tensor.data_ptr(), tensor.dtype, tuple(tensor.shape), tensor.stride(), str(tensor.device))
+    if tensor.is_inference():
+        return ("inference", id(tensor)) + layout
+    return ("version", tensor._version) + layout
+
+def tensor_digest(tensor: torch.Tensor) -> str:
+    key = _tensor_digest_key(tensor)
+    with _TENSOR_DIGESTS_LOCK:
+        memo = _TENSOR_DIGESTS.get(key, None)
+    if memo is not None and memo[0]() is not None:
+        return memo[1]
+    data = tensor.detach().cpu().contiguous().reshape(-1).view(torch.uint8).numpy()
+    digest = digest_buffer(data)
+    ref = weakref.ref(tensor, lambda ref: _forget_tensor_digest(key, ref))
+    with _TENSOR_DIGESTS_LOCK:
+        _TENSOR_DIGESTS[key] = (ref, digest)
+    return digest
+
 def to_hashable(obj):
     # So that we don't infinitely recurse since frozenset and tuples
     # are Sequences.
-    if isinstance(obj, (int, float, str, bool, type(None))):
+    if isinstance(obj, (int, float, str, bool, type(None), bytes)):
         return obj
     elif isinstance(obj, Mapping):
         return frozenset([(to_hashable(k), to_hashable(v)) for k, v in sorted(obj.items())])
     elif isinstance(obj, Sequence):
         return frozenset(zip(itertools.count(), [to_hashable(i) for i in obj]))
+    elif isinstance(obj, torch.Tensor):
+        if obj.layout != torch.strided or obj.is_nested or obj.is_meta or obj.is_quantized:
+            return Unhashable()
+        return ("TENSOR", str(obj.dtype), tuple(obj.shape), obj.device.type, tensor_digest(obj))
+    elif isinstance(obj, np.ndarray):
+        if obj.dtype.hasobject:
+            return Unhashable()
+        return ("NDARRAY", obj.dtype.str, obj.shape, digest_buffer(np.ascontiguousarray(obj)))
+    elif isinstance(obj, (bytearray, memoryview)):
+        return ("BUFFER", digest_buffer(bytes(obj)))
     else:
-        # TODO - Support other objects like tensors?
         return Unhashable()
 
 class CacheKeySetID(CacheKeySet):
@@ -72,11 +122,40 @@ class CacheKeySetID(CacheKeySet):
             self.keys[node_id] = (node_id, node["class_type"])
             self.subcache_keys[node_id] = (node_id, node["class_type"])
 
+class NodeSignature:
+    """
+    Cache key of a node, built Merkle-style from the node's own inputs and its parents' signatures.
+    Signatures are hash-consed by intern_signature: equal content always yields the same instance, so
+    equality is identity and the hash is computed once, no matter how deep the upstream graph is.
+    """
+    __slots__ = ("content", "hash", "__weakref__")
+
+    def __init__(self, content):
+        self.content = content
+        self.hash = hash(content)
+
+    def __hash__(self):
+        return self.hash
+
+# Live signatures by content. Entries disappear once no cache or key set holds the signature.
+_SIGNATURES = weakref.WeakValueDictionary()
+_SIGNATURES_LOCK = threading.Lock()
+
+def intern_signature(content):
+    with _SIGNATURES_LOCK:
+        signature = _SIGNATURES.get(content, None)
+        if signature is None:
+            signature = NodeSignature(content)
+            _SIGNATURES[content] = signature
+        return signature
+
 class CacheKeySetInputSignature(CacheKeySet):
     def __init__(self, dynprompt, node_ids, is_changed_cache):
         super().__init__(dynprompt, node_ids, is_changed_cache)
         self.dynprompt = dynprompt
         self.is_changed_cache = is_changed_cache
+        # Signatures computed for this prompt, shared by all descendants of a node
+        self.signatures = {}
         self.add_keys(node_ids)
 
     def include_node_id_in_input(self) -> bool:
@@ -93,53 +172,51 @@ class CacheKeySetInputSignature(CacheKeySet):
             self.subcache_keys[node_id] = (node_id, node["class_type"])
 
     def get_node_signature(self, dynprompt, node_id):
-        signature = []
-        ancestors, order_mapping = self.get_ordered_ancestry(dynprompt, node_id)
-        signature.append(self.get_immediate_node_signature(dynprompt, node_id, order_mapping))
-        for ancestor_id in ancestors:
-            signature.append(self.get_immediate_node_signature(dynprompt, ancestor_id, order_mapping))
-        return to_hashable(signature)
-
-    def get_immediate_node_signature(self, dynprompt, node_id, ancestor_order_mapping):
+        # Iterative post-order walk: parents are signed before their children and every node only once
+        # per prompt, so deep graphs cost O(nodes + links) and don't hit the recursion limit.
+        stack = [node_id]
+        visiting = set()
+        while len(stack) > 0:
+            current = stack[-1]
+            if current in self.signatures:
+                stack.pop()
+                continue
+            if current not in visiting:
+                visiting.add(current)
+                for ancestor_id in self.get_parent_ids(dynprompt, current):
+                    if ancestor_id not in self.signatures and ancestor_id not in visiting:
+                        stack.append(ancestor_id)
+                continue
+            stack.pop()
+            self.signatures[current] = self.get_immediate_node_signature(dynprompt, current)
+        return self.signatures[node_id]
+
+    def get_parent_ids(self, dynprompt, node_id):
+        if not dynprompt.has_node(node_id):
+            return []
+        inputs = dynprompt.get_node(node_id)["inputs"]
+        return [inputs[key][0] for key in sorted(inputs.keys()) if is_link(inputs[key])]
+
+    def get_immediate_node_signature(self, dynprompt, node_id):
         if not dynprompt.has_node(node_id):
             # This node doesn't exist -- we can't cache it.
-            return [float("NaN")]
+            return Unhashable()
         node = dynprompt.get_node(node_id)
         class_type = node["class_type"]
         class_def = nodes.NODE_CLASS_MAPPINGS[class_type]
-        signature = [class_type, self.is_changed_cache.get(node_id)]
+        signature = [class_type, to_hashable(self.is_changed_cache.get(node_id))]
         if self.include_node_id_in_input() or (hasattr(class_def, "NOT_IDEMPOTENT") and class_def.NOT_IDEMPOTENT) or include_unique_id_in_input(class_type):
             signature.append(node_id)
         inputs = node["inputs"]
         for key in sorted(inputs.keys()):
             if is_link(inputs[key]):
                 (ancestor_id, ancestor_socket) = inputs[key]
-                ancestor_index = ancestor_order_mapping[ancestor_id]
-                signature.append((key,("ANCESTOR", ancestor_index, ancestor_socket)))
+                # A parent that is still unsigned here is part of a cycle; such nodes are never cached
+                ancestor_signature = self.signatures.get(ancestor_id, None) or Unhashable()
+                signature.append((key, ("ANCESTOR", ancestor_signature, ancestor_socket)))
             else:
-                signature.append((key, inputs[key]))
-        return signature
-
-    # This function returns a list of all ancestors of the given node. The order of the list is
-    # deterministic based on which specific inputs the ancestor is connected by.
-    def get_ordered_ancestry(self, dynprompt, node_id):
-        ancestors = []
-        order_mapping = {}
-        self.get_ordered_ancestry_internal(dynprompt, node_id, ancestors, order_mapping)
-        return ancestors, order_mapping
-
-    def get_ordered_ancestry_internal(self, dynprompt, node_id, ancestors, order_mapping):
-        if not dynprompt.has_node(node_id):
-            return
-        inputs = dynprompt.get_node(node_id)["inputs"]
-        input_keys = sorted(inputs.keys())
-        for key in input_keys:
-            if is_link(inputs[key]):
-                ancestor_id = inputs[key][0]
-                if ancestor_id not in order_mapping:
-                    ancestors.append(ancestor_id)
-                    order_mapping[ancestor_id] = len(ancestors) - 1
-                    self.get_ordered_ancestry_internal(dynprompt, ancestor_id, ancestors, order_mapping)
+                signature.append((key, to_hashable(inputs[key])))
+        return intern_signature(tuple(signature))
 
 class BasicCache:
     def __init__(self, key_class):
@@ -0,0 +1,241 @@
+import copy
+import math
+from typing import Optional
+
+import torch
+
+import nodes
+from comfy_execution.graph_utils import is_link
+
+# Prompt coalescing (--coalesce-prompts): queued prompts built from the same workflow that only differ in
+# their CLIPTextEncode text and KSampler seed are fused into one prompt that samples all of them as one
+# batch. Every prompt keeps the initial noise its own seed gives it, and the images of the batched output
+# nodes are split back per prompt.
+
+MAX_COALESCED_PROMPTS = 8
+# How many of the highest priority queued prompts are checked for prompts to coalesce with
+COALESCE_WINDOW = 64
+
+# The widget input that may differ between coalesced prompts
+VARYING_INPUTS = {
+    "CLIPTextEncode": "text",
+    "KSampler": "seed",
+}
+
+# Nodes that handle each element of a batch independently, the only ones allowed downstream of the batch
+BATCHABLE_NODES = {
+    "EmptyLatentImage",
+    "KSampler",
+    "LatentUpscale",
+    "LatentUpscaleBy",
+    "VAEDecode",
+    "VAEDecodeTiled",
+    "ImageScale",
+    "ImageScaleBy",
+    "ImageInvert",
+    "SaveImage",
+    "PreviewImage",
+}
+
+# Output nodes with one ui entry per batch element
+SPLIT_OUTPUT_NODES = {"SaveImage", "PreviewImage"}
+
+
+class CoalescedConditioning:
+    """Per prompt conditionings of a coalesced prompt stacked into one batch, each repeated batch_size times."""
+    @classmethod
+    def INPUT_TYPES(s):
+        return {
+            "required": {"batch_size": ("INT", {"default": 1, "min": 1, "max": 4096})},
+            "optional": {f"conditioning_{i}": ("CONDITIONING",) for i in range(MAX_COALESCED_PROMPTS)},
+        }
+
+    RETURN_TYPES = ("CONDITIONING",)
+    FUNCTION = "batch"
+    CATEGORY = "_for_testing"
+    DESCRIPTION = "Used by --coalesce-prompts."
+
+    def batch(self, batch_size, **kwargs):
+        conditionings = [kwargs[f"conditioning_{i}"] for i in range(MAX_COALESCED_PROMPTS) if f"conditioning_{i}" in kwargs]
+        return (batch_conditioning(conditionings, batch_size),)
+
+
+class CoalescedKSampler:
+    """KSampler of a coalesced prompt: the noise of each prompt's slice of the batch comes from its own seed."""
+    @classmethod
+    def INPUT_TYPES(s):
+        inputs = nodes.KSampler.INPUT_TYPES()
+        required = {"seeds": ("STRING", {"default": "0"})}
+        required.update((k, v) for k, v in inputs["required"].items() if k != "seed")
+        return {"required": required}
+
+    RETURN_TYPES = ("LATENT",)
+    FUNCTION = "sample"
+    CATEGORY = "_for_testing"
+    DESCRIPTION = "Used by --coalesce-prompts."
+
+    def sample(self, model, seeds, steps, cfg, sampler_name, scheduler, positive, negative, latent_image, denoise=1.0):
+        seeds = [int(seed) for seed in seeds.split(",")]
+        return nodes.common_ksampler(model, seeds[0], steps, cfg, sampler_name, scheduler, positive, negative, latent_image, denoise=denoise, noise_seeds=seeds)
+
+
+NODE_CLASS_MAPPINGS = {
+    "CoalescedConditioning": CoalescedConditioning,
+    "CoalescedKSampler": CoalescedKSampler,
+}
+
+
+def _stack(tensors, batch_size):
+    if tensors[0].ndim == 3:
+        # Cross attention conds of different token counts: pad with repeats, like CONDCrossAttn.concat
+        length = math.lcm(*[t.shape[1] for t in tensors])
+        tensors = [t.repeat(1, length // t.shape[1], 1) for t in tensors]
+    return torch.cat([t.repeat_interleave(batch_size, dim=0) for t in tensors])
+
+
+def batch_conditioning(conditionings, batch_size):
+    """
+    Stacks the conditionings of several prompts (each with batch size 1) into one conditioning whose
+    batch is batch_size elements of the first prompt, then batch_size of the second and so on.
+    """
+    out = []
+    for entries in zip(*conditionings):
+        options = {}
+        for key, value in entries[0][1].items():
+            if torch.is_tensor(value):
+                options[key] = _stack([entry[1][key] for entry in entries], batch_size)
+            else:
+                options[key] = value
+        out.append([_stack([entry[0] for entry in entries], batch_size), options])
+    return out
+
+
+class CoalescedPrompt:
+    """A fused prompt and how to split its outputs back into the history results of the original prompts."""
+    def __init__(self, prompt, count, split_outputs):
+        self.prompt = prompt
+        self.count = count
+        self.split_outputs = split_outputs
+
+    def split_result(self, history_result):
+        results = [{"outputs": {}, "meta": history_result.get("meta", {})} for _ in range(self.count)]
+        for node_id, output in history_result.get("outputs", {}).items():
+            for i, result in enumerate(results):
+                if node_id not in self.split_outputs:
+                    result["outputs"][node_id] = output
+                    continue
+                part = {}
+                for key, value in output.items():
+                    if isinstance(value, list) and len(value) % self.count == 0:
+                        size = len(value) // self.count
+                        value = value[i * size:(i + 1) * size]
+                    part[key] = value
+                result["outputs"][node_id] = part
+        return results
+
+
+def _varying_inputs(prompts):
+    """node_id -> the value of each prompt for the one input allowed to differ, None if the prompts can't be fused."""
+    head = prompts[0]
+    varying = {}
+    for node_id, node in head.items():
+        class_type = node.get("class_type")
+        inputs = node.get("inputs", {})
+        for prompt in prompts[1:]:
+            other = prompt.get(node_id)
+            if other is None or other.get("class_type") != class_type or other.get("inputs", {}).keys() != inputs.keys():
+                return None
+        for name, value in inputs.items():
+            values = [prompt[node_id]["inputs"][name] for prompt in prompts]
+            if all(v == value for v in values[1:]):
+                continue
+            if any(is_link(v) for v in values) or VARYING_INPUTS.get(class_type) != name:
+                return None
+            varying[node_id] = values
+    return varying
+
+
+def fuse_prompts(prompts) -> Optional[CoalescedPrompt]:
+    """
+    Fuses prompts that can be sampled as one batch, see the top of this module. Returns None if they can't be.
+    """
+    count = len(prompts)
+    if count < 2 or count > MAX_COALESCED_PROMPTS or any(prompt.keys() != prompts[0].keys() for prompt in prompts):
+        return None
+    varying = _varying_inputs(prompts)
+    if varying is None:
+        return None
+    head = prompts[0]
+
+    def links(node):
+        return [(name, value[0]) for name, value in node.get("inputs", {}).items() if is_link(value)]
+
+    # Nodes whose output is batched: empty latents, conditionings of varying text and everything downstream
+    batched = set()
+    changed = True
+    while changed:
+        changed = False
+        for node_id, node in head.items():
+            if node_id in batched:
+                continue
+            class_type = node.get("class_type")
+            if class_type == "EmptyLatentImage" or (class_type == "CLIPTextEncode" and node_id in varying) or any(source in batched for _, source in links(node)):
+                batched.add(node_id)
+                changed = True
+
+    batch_sizes = set()
+    for node_id in batched:
+        node = head[node_id]
+        class_type = node["class_type"]
+        if class_type == "CLIPTextEncode":
+            continue
+        if class_type not in BATCHABLE_NODES:
+            return None
+        if class_type == "EmptyLatentImage":
+            batch_sizes.add(node["inputs"].get("batch_size", 1))
+        if class_type == "KSampler" and not (is_link(node["inputs"].get("latent_image")) and node["inputs"]["latent_image"][0] in batched):
+            return None
+        for name, source in links(node):
+            # Varying conditionings only reach the samplers, which get a latent batch of the same size
+            if source in varying and head[source]["class_type"] == "CLIPTextEncode" and (class_type != "KSampler" or name not in ("positive", "negative")):
+                return None
+    if any(node_id not in batched for node_id in varying) or len(batch_sizes) != 1:
+        return None
+    batch_size = batch_sizes.pop()
+    if not isinstance(batch_size, int):
+        return None
+
+    fused = {}
+    for node_id, node in head.items():
+        node = copy.deepcopy(node)
+        class_type = node["class_type"]
+        inputs = node["inputs"]
+        if class_type == "EmptyLatentImage":
+            inputs["batch_size"] = batch_size * count
+        elif class_type == "CLIPTextEncode" and node_id in varying:
+            conditionings = {}
+            for i, text in enumerate(varying[node_id]):
+                fused[f"{node_id}.{i}"] = {"class_type": class_type, "inputs": dict(inputs, text=text)}
+                conditionings[f"conditioning_{i}"] = [f"{node_id}.{i}", 0]
+            node = {"class_type": "CoalescedConditioning", "inputs": {"batch_size": batch_size, **conditionings}}
+        elif class_type == "KSampler" and node_id in batched:
+            seeds = varying.get(node_id, [inputs["seed"]] * count)
+            del inputs["seed"]
+            inputs["seeds"] = ",".join(str(int(seed)) for seed in seeds)
+            node["class_type"] = "CoalescedKSampler"
+        fused[node_id] = node
+    split_outputs = {node_id for node_id in batched if head[node_id]["class_type"] in SPLIT_OUTPUT_NODES}
+    return CoalescedPrompt(fused, count, split_outputs)
+
+
+def notify_coalesced(server, item, result, success):
+    """Sends a coalesced prompt's own outputs to its client, the fused execution only messages the first prompt's client."""
+    client_id = item[3].get("client_id", None)
+    if client_id is None:
+        return
+    prompt_id = item[1]
+    for node_id, output in result["outputs"].items():
+        server.send_sync("executed", {"node": node_id, "display_node": node_id, "output": output, "prompt_id": prompt_id}, client_id)
+    if success:
+        server.send_sync("execution_success", {"prompt_id": prompt_id}, client_id)
+    server.send_sync("executing", {"node": None, "prompt_id": prompt_id}, client_id)
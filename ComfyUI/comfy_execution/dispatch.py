@@ -0,0 +1,159 @@
+import heapq
+import threading
+from typing import Callable, Optional
+
+from comfy_execution.graph_utils import is_link
+
+# How many of the highest priority queued prompts a worker may choose between. Keeps affinity from
+# starving prompts that don't share models with any worker.
+AFFINITY_WINDOW = 8
+
+
+def prompt_models(prompt) -> frozenset:
+    """The model files a prompt loads: literal string inputs of its loader nodes."""
+    models = set()
+    for node in prompt.values():
+        class_type = node.get("class_type", "")
+        if "Loader" not in class_type:
+            continue
+        for name, value in node.get("inputs", {}).items():
+            if isinstance(value, str):
+                models.add((class_type, name, value))
+    return frozenset(models)
+
+
+# Per prompt_id memos of prompt_models/workflow_signature, queue items are scored again on every get()
+_PROMPT_MODELS = {}
+_WORKFLOW_SIGNATURES = {}
+MAX_WORKFLOW_SIGNATURES = 4096
+
+
+def _memoized(memo, item, compute):
+    prompt_id = item[1]
+    value = memo.get(prompt_id, None)
+    if value is None:
+        if len(memo) >= MAX_WORKFLOW_SIGNATURES:
+            memo.clear()
+        value = compute(item[2])
+        memo[prompt_id] = value
+    return value
+
+
+def workflow_signature(prompt) -> int:
+    """
+    Hash of a prompt's graph structure: nodes, class types and links, plus the literal inputs of
+    loader nodes. Other widget values (seeds, text, ...) are left out, so prompts built from the same
+    workflow get the same signature.
+    """
+    nodes = []
+    for node_id in sorted(prompt):
+        node = prompt[node_id]
+        class_type = node.get("class_type", "")
+        inputs = []
+        for name, value in sorted(node.get("inputs", {}).items()):
+            if is_link(value):
+                inputs.append((name, value[0], value[1]))
+            elif "Loader" in class_type:
+                inputs.append((name, repr(value)))
+            else:
+                inputs.append((name,))
+        nodes.append((node_id, class_type, tuple(inputs)))
+    return hash(tuple(nodes))
+
+
+def item_signature(item) -> int:
+    """workflow_signature of a queue item, memoized by prompt_id."""
+    return _memoized(_WORKFLOW_SIGNATURES, item, workflow_signature)
+
+
+def item_models(item) -> frozenset:
+    """prompt_models of a queue item, memoized by prompt_id."""
+    return _memoized(_PROMPT_MODELS, item, prompt_models)
+
+
+def _heap_order(heap):
+    """Yields the indices of a heap's items in priority order, only visiting the items consumed."""
+    if len(heap) == 0:
+        return
+    frontier = [(heap[0], 0)]
+    while frontier:
+        _, index = heapq.heappop(frontier)
+        yield index
+        for child in (2 * index + 1, 2 * index + 2):
+            if child < len(heap):
+                heapq.heappush(frontier, (heap[child], child))
+
+
+def select_index(queue, score: Callable, window: int = AFFINITY_WINDOW) -> Optional[int]:
+    """
+    Picks the queued item to run next from a heap ordered queue and returns its index. Items for which
+    score() returns None are not eligible. Among the `window` highest priority eligible items the
+    highest score wins, ties going to priority. Only items up to the last candidate are scored.
+    Returns None if nothing is eligible.
+    """
+    best = None
+    candidates = 0
+    for index in _heap_order(queue):
+        s = score(queue[index])
+        if s is None:
+            continue
+        if best is None or s > best[1]:
+            best = (index, s)
+        candidates += 1
+        if candidates >= window:
+            break
+    return None if best is None else best[0]
+
+
+def select_item(queue, score: Callable, window: int = AFFINITY_WINDOW):
+    """The item select_index picks, or None."""
+    index = select_index(queue, score, window)
+    return None if index is None else queue[index]
+
+
+def heap_remove(heap, index):
+    """Removes and returns heap[index] in O(log n), keeping the heap invariant."""
+    item = heap[index]
+    last = heap.pop()
+    if index < len(heap):
+        heap[index] = last
+        # last may belong either below or above index
+        heapq._siftup(heap, index)
+        heapq._siftdown(heap, 0, index)
+    return item
+
+
+class WorkerAffinity:
+    """
+    Routing state of one prompt worker in the multi-worker mode. A prompt can be pinned to a worker
+    with extra_data["worker"]; otherwise workers prefer prompts that load the models their own
+    executor cache already holds from the previous prompt.
+
+    coalesce: prefer prompts built from the same workflow as the previous prompt, so runs of a
+    workflow that differ only in seed or text execute back to back and reuse every cached node
+    output that did not change.
+    """
+    def __init__(self, worker_id: int, coalesce: bool = False):
+        self.worker_id = worker_id
+        self.coalesce = coalesce
+        self.models = frozenset()
+        self.workflow = None
+        # Set by whichever worker receives a free_memory request, handled by this worker between prompts
+        self.reset_requested = threading.Event()
+
+    def score(self, item) -> Optional[tuple]:
+        requested = item[3].get("worker", None)
+        if requested is not None and requested != self.worker_id:
+            return None
+        same_workflow = self.coalesce and self.workflow is not None and item_signature(item) == self.workflow
+        return (same_workflow, len(self.models & item_models(item)))
+
+    def executed(self, item):
+        self.models = item_models(item)
+        if self.coalesce:
+            self.workflow = item_signature(item)
+
+    def reset(self):
+        self.models = frozenset()
+        self.workflow = None
+        self.reset_requested.clear()
@@ -0,0 +1,234 @@
+import itertools
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+# extra_data keys holding credentials, never written to a persistent store
+SENSITIVE_EXTRA_DATA_KEYS = ("api_key_comfy_org", "auth_token_comfy_org")
+
+# A pending prompt restored this many times without finishing is failed instead of queued again,
+# so that a prompt that crashes the process can't do so on every start.
+MAX_PENDING_RECOVERIES = 3
+
+
+def _entry_status(entry):
+    status = entry.get("status")
+    if status is None:
+        return None
+    return status.get("status_str")
+
+
+def _strip_credentials(item):
+    """Copy of a queue item without the credential keys of its extra_data."""
+    if len(item) < 4 or not isinstance(item[3], dict) or not any(k in item[3] for k in SENSITIVE_EXTRA_DATA_KEYS):
+        return item
+    stripped = list(item)
+    stripped[3] = {k: v for k, v in item[3].items() if k not in SENSITIVE_EXTRA_DATA_KEYS}
+    return type(item)(stripped)
+
+
+def _failed_recovery_entry(item, attempts):
+    message = "Prompt was interrupted by {} restarts and is not queued again".format(attempts)
+    return {
+        "prompt": item,
+        "outputs": {},
+        "status": {
+            "status_str": "error",
+            "completed": False,
+            "messages": [("execution_error", {"prompt_id": item[1], "exception_message": message, "timestamp": int(time.time() * 1000)})],
+        },
+        "meta": {},
+    }
+
+
+class HistoryStore:
+    """
+    In-memory prompt history (the default). Entries are returned as stored, without copying, so
+    callers must treat them as read-only.
+
+    PromptQueue also reports pending queue items to the store so that a persistent store can
+    recover them after a restart; this store does not keep them.
+    """
+    def __init__(self, max_items: Optional[int] = None):
+        self.max_items = max_items
+        self.entries = {}
+        self.timestamps = {}
+
+    def put(self, prompt_id, entry):
+        if self.max_items is not None and prompt_id not in self.entries:
+            while len(self.entries) >= self.max_items:
+                self.delete(next(iter(self.entries)))
+        self.entries[prompt_id] = entry
+        self.timestamps[prompt_id] = time.time()
+
+    def get(self, prompt_id):
+        return self.entries.get(prompt_id)
+
+    def items(self, max_items=None, offset=-1, status=None, since=None):
+        keys = self.entries.keys()
+        if status is not None or since is not None:
+            keys = [k for k in keys if (status is None or _entry_status(self.entries[k]) == status)
+                    and (since is None or self.timestamps[k] >= since)]
+        if offset < 0 and max_items is not None:
+            offset = len(keys) - max_items
+        offset = max(offset, 0)
+        stop = None if max_items is None else offset + max_items
+        return {k: self.entries[k] for k in itertools.islice(keys, offset, stop)}
+
+    def delete(self, prompt_id):
+        self.entries.pop(prompt_id, None)
+        self.timestamps.pop(prompt_id, None)
+
+    def clear(self):
+        self.entries = {}
+        self.timestamps = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, prompt_id):
+        return prompt_id in self.entries
+
+    def add_pending(self, item):
+        pass
+
+    def remove_pending(self, prompt_ids):
+        pass
+
+    def load_pending(self):
+        return []
+
+    def close(self):
+        pass
+
+
+class SQLiteHistoryStore(HistoryStore):
+    """
+    Prompt history and pending queue kept in a SQLite database so they survive restarts.
+
+    History rows are indexed by prompt_id, completion time and status, and paginated queries only
+    decode the rows they return. Queue items stay in the pending table from put() until their
+    history entry is written, so prompts that were queued or running when the process died are
+    queued again on the next start, at most MAX_PENDING_RECOVERIES times.
+
+    Credentials in extra_data (SENSITIVE_EXTRA_DATA_KEYS) are not stored, so restored prompts run
+    without them.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS history (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            prompt_id TEXT NOT NULL UNIQUE,
+            created_at REAL NOT NULL,
+            status TEXT,
+            entry TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS history_created_at ON history (created_at);
+        CREATE INDEX IF NOT EXISTS history_status ON history (status);
+        CREATE TABLE IF NOT EXISTS pending (
+            prompt_id TEXT PRIMARY KEY,
+            item TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0
+        );
+    """
+
+    def __init__(self, path: str, max_items: Optional[int] = None):
+        self.path = path
+        self.max_items = max_items
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(pending)")]
+        if "attempts" not in columns:
+            self.conn.execute("ALTER TABLE pending ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+
+    def put(self, prompt_id, entry):
+        if isinstance(entry.get("prompt"), (list, tuple)):
+            entry = dict(entry, prompt=_strip_credentials(entry["prompt"]))
+        with self.lock, self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.execute(
+                "INSERT INTO history (prompt_id, created_at, status, entry) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (prompt_id) DO UPDATE SET created_at = excluded.created_at, status = excluded.status, entry = excluded.entry",
+                (prompt_id, time.time(), _entry_status(entry), json.dumps(entry, default=str)))
+            self.conn.execute("DELETE FROM pending WHERE prompt_id = ?", (prompt_id,))
+            if self.max_items is not None:
+                self.conn.execute(
+                    "DELETE FROM history WHERE seq <= (SELECT seq FROM history ORDER BY seq DESC LIMIT 1 OFFSET ?)",
+                    (self.max_items,))
+
+    def get(self, prompt_id):
+        with self.lock:
+            row = self.conn.execute("SELECT entry FROM history WHERE prompt_id = ?", (prompt_id,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def items(self, max_items=None, offset=-1, status=None, since=None):
+        conditions, params = [], []
+        if status is not None:
+            conditions.append("status = ?")
+            params.append(status)
+        if since is not None:
+            conditions.append("created_at >= ?")
+            params.append(since)
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        with self.lock:
+            if offset < 0 and max_items is not None:
+                count = self.conn.execute("SELECT COUNT(*) FROM history" + where, params).fetchone()[0]
+                offset = count - max_items
+            offset = max(offset, 0)
+            rows = self.conn.execute("SELECT prompt_id, entry FROM history" + where + " ORDER BY seq LIMIT ? OFFSET ?",
+                                     params + [-1 if max_items is None else max_items, offset]).fetchall()
+        return {prompt_id: json.loads(entry) for prompt_id, entry in rows}
+
+    def delete(self, prompt_id):
+        with self.lock:
+            self.conn.execute("DELETE FROM history WHERE prompt_id = ?", (prompt_id,))
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM history")
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM history").fetchone()[0]
+
+    def __contains__(self, prompt_id):
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM history WHERE prompt_id = ?", (prompt_id,)).fetchone() is not None
+
+    def add_pending(self, item):
+        try:
+            data = json.dumps(list(_strip_credentials(item)))
+        except (TypeError, ValueError) as e:
+            logging.warning("Queue item {} can not be persisted: {}".format(item[1], e))
+            return
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO pending (prompt_id, item) VALUES (?, ?)", (item[1], data))
+
+    def remove_pending(self, prompt_ids):
+        with self.lock, self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.executemany("DELETE FROM pending WHERE prompt_id = ?", [(prompt_id,) for prompt_id in prompt_ids])
+
+    def load_pending(self):
+        with self.lock, self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.execute("UPDATE pending SET attempts = attempts + 1")
+            rows = self.conn.execute("SELECT item, attempts FROM pending").fetchall()
+        items = []
+        for data, attempts in rows:
+            item = tuple(json.loads(data))
+            if attempts > MAX_PENDING_RECOVERIES:
+                logging.warning("Prompt {} was interrupted by {} restarts, marking it as failed".format(item[1], attempts - 1))
+                self.put(item[1], _failed_recovery_entry(item, attempts - 1))
+            else:
+                items.append(item)
+        return items
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -17,6 +17,9 @@ from comfy_execution.graph import get_input_info, ExecutionList, DynamicPrompt,
 from comfy_execution.graph_utils import is_link, GraphBuilder
 from comfy_execution.caching import HierarchicalCache, LRUCache, DependencyAwareCache, CacheKeySetInputSignature, CacheKeySetID
 from comfy_execution.validation import validate_node_input
+from comfy_execution.history import HistoryStore
+from comfy_execution import coalesce
+from comfy_execution.dispatch import heap_remove, item_signature, select_index
 
 class ExecutionResult(Enum):
     SUCCESS = 0
@@ -26,6 +29,38 @@ class ExecutionResult(Enum):
 class DuplicateNodeError(Exception):
     pass
 
+class ModelUnloadGate:
+    """
+    Runs comfy.model_management.unload_all_models() only while no prompt is executing, so that with
+    several prompt workers an unload (OOM recovery, free_memory requests, DISABLE_SMART_MEMORY) never
+    pulls models from under another running prompt. Requests made while prompts run are performed
+    when the last running prompt finishes.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.pending = False
+
+    def begin(self):
+        with self.lock:
+            self.running += 1
+
+    def end(self):
+        with self.lock:
+            self.running -= 1
+            if self.pending and self.running == 0:
+                self.pending = False
+                comfy.model_management.unload_all_models()
+
+    def unload_all_models(self):
+        with self.lock:
+            if self.running == 0:
+                comfy.model_management.unload_all_models()
+            else:
+                self.pending = True
+
+model_unload_gate = ModelUnloadGate()
+
 class IsChangedCache:
     def __init__(self, dynprompt, outputs_cache):
         self.dynprompt = dynprompt
@@ -427,7 +462,7 @@ def execute(server, dynprompt, caches, current_item, extra_data, executed, promp
         }
         if isinstance(ex, comfy.model_management.OOM_EXCEPTION):
             logging.error("Got an OOM, unloading all loaded models.")
-            comfy.model_management.unload_all_models()
+            model_unload_gate.unload_all_models()
 
         return (ExecutionResult.FAILURE, error_details, ex)
 
@@ -485,7 +520,18 @@ class PromptExecutor:
             self.add_message("execution_error", mes, broadcast=False)
 
     def execute(self, prompt, prompt_id, extra_data={}, execute_outputs=[]):
-        nodes.interrupt_processing(False)
+        model_unload_gate.begin()
+        # Clear stale interrupts of this worker only, an interrupt aimed at another worker stays set
+        nodes.interrupt_processing(False, thread_id=threading.get_ident())
+        comfy.model_management.set_processing_thread(True)
+        try:
+            self._execute(prompt, prompt_id, extra_data, execute_outputs)
+        finally:
+            comfy.model_management.set_processing_thread(False)
+            comfy.model_management.release_models()
+            model_unload_gate.end()
+
+    def _execute(self, prompt, prompt_id, extra_data, execute_outputs):
 
         if "client_id" in extra_data:
             self.server.client_id = extra_data["client_id"]
@@ -551,7 +597,7 @@ class PromptExecutor:
             }
             self.server.last_node_id = None
             if comfy.model_management.DISABLE_SMART_MEMORY:
-                comfy.model_management.unload_all_models()
+                model_unload_gate.unload_all_models()
 
 
 def validate_inputs(prompt, item, validated):
@@ -900,32 +946,54 @@ def validate_prompt(prompt):
 MAXIMUM_HISTORY_SIZE = 10000
 
 class PromptQueue:
-    def __init__(self, server):
+    def __init__(self, server, history=None):
         self.server = server
         self.mutex = threading.RLock()
         self.not_empty = threading.Condition(self.mutex)
         self.task_counter = 0
-        self.queue = []
         self.currently_running = {}
-        self.history = {}
+        # item_id -> (prompt_id, id of the worker thread executing it)
+        self.running_threads = {}
+        self.history = history if history is not None else HistoryStore(MAXIMUM_HISTORY_SIZE)
         self.flags = {}
+        # Prompts that were queued or running when a persistent history store was last closed
+        self.queue = self.history.load_pending()
+        heapq.heapify(self.queue)
+        if len(self.queue) > 0:
+            logging.info("Restored {} queued prompts".format(len(self.queue)))
+            if hasattr(server, "number"):
+                server.number = max(server.number, int(max(item[0] for item in self.queue)) + 1)
         server.prompt_queue = self
 
     def put(self, item):
         with self.mutex:
+            self.history.add_pending(item)
             heapq.heappush(self.queue, item)
             self.server.queue_updated()
-            self.not_empty.notify()
-
-    def get(self, timeout=None):
+            # With several workers only some of them may be allowed to take the item
+            self.not_empty.notify_all()
+
+    def _next_index(self, select):
+        if select is None:
+            return 0 if len(self.queue) > 0 else None
+        return select_index(self.queue, select)
+
+    def get(self, timeout=None, select=None):
+        """
+        Pops the next item to execute. select: optional function scoring queued items for the calling
+        worker (see comfy_execution.dispatch.select_index), otherwise items are taken in priority order.
+        """
         with self.not_empty:
-            while len(self.queue) == 0:
+            index = self._next_index(select)
+            while index is None:
                 self.not_empty.wait(timeout=timeout)
-                if timeout is not None and len(self.queue) == 0:
+                index = self._next_index(select)
+                if timeout is not None and index is None:
                     return None
-            item = heapq.heappop(self.queue)
+            item = heap_remove(self.queue, index)
             i = self.task_counter
             self.currently_running[i] = copy.deepcopy(item)
+            self.running_threads[i] = (item[1], threading.get_ident())
             self.task_counter += 1
             self.server.queue_updated()
             return (item, i)
@@ -939,19 +1007,20 @@ class PromptQueue:
                   status: Optional['PromptQueue.ExecutionStatus']):
         with self.mutex:
             prompt = self.currently_running.pop(item_id)
-            if len(self.history) > MAXIMUM_HISTORY_SIZE:
-                self.history.pop(next(iter(self.history)))
+            self.running_threads.pop(item_id, None)
 
             status_dict: Optional[dict] = None
             if status is not None:
                 status_dict = copy.deepcopy(status._asdict())
 
-            self.history[prompt[1]] = {
+            entry = {
                 "prompt": prompt,
                 "outputs": {},
                 'status': status_dict,
             }
-            self.history[prompt[1]].update(history_result)
+            entry.update(history_result)
+            # Also removes the prompt from the store's pending items
+            self.history.put(prompt[1], entry)
             self.server.queue_updated()
 
     def get_current_queue(self):
@@ -961,12 +1030,51 @@ class PromptQueue:
                 out += [x]
             return (out, copy.deepcopy(self.queue))
 
+    def get_coalesced(self, item, select=None):
+        """
+        Takes the queued prompts that can be fused with item, which was just returned by get() (see
+        comfy_execution.coalesce). Returns the CoalescedPrompt and the taken (item, item_id) pairs, or None.
+        """
+        with self.mutex:
+            signature = item_signature(item)
+            group = [item]
+            plan = None
+            for candidate in heapq.nsmallest(coalesce.COALESCE_WINDOW, self.queue):
+                if len(group) >= coalesce.MAX_COALESCED_PROMPTS:
+                    break
+                if item_signature(candidate) != signature or (select is not None and select(candidate) is None):
+                    continue
+                candidate_plan = coalesce.fuse_prompts([x[2] for x in group + [candidate]])
+                if candidate_plan is not None:
+                    group.append(candidate)
+                    plan = candidate_plan
+            if plan is None:
+                return None
+            taken = set(id(x) for x in group[1:])
+            self.queue = [x for x in self.queue if id(x) not in taken]
+            heapq.heapify(self.queue)
+            items = []
+            for x in group[1:]:
+                i = self.task_counter
+                self.currently_running[i] = copy.deepcopy(x)
+                self.running_threads[i] = (x[1], threading.get_ident())
+                self.task_counter += 1
+                items.append((x, i))
+            self.server.queue_updated()
+            return plan, items
+
+    def get_running_threads(self, prompt_id=None):
+        """Ids of the worker threads executing prompt_id (or any prompt if None)."""
+        with self.mutex:
+            return [thread_id for running_id, thread_id in self.running_threads.values() if prompt_id is None or running_id == prompt_id]
+
     def get_tasks_remaining(self):
         with self.mutex:
             return len(self.queue) + len(self.currently_running)
 
     def wipe_queue(self):
         with self.mutex:
+            self.history.remove_pending([x[1] for x in self.queue])
             self.queue = []
             self.server.queue_updated()
 
@@ -974,6 +1082,7 @@ class PromptQueue:
         with self.mutex:
             for x in range(len(self.queue)):
                 if function(self.queue[x]):
+                    self.history.remove_pending([self.queue[x][1]])
                     if len(self.queue) == 1:
                         self.wipe_queue()
                     else:
@@ -983,32 +1092,23 @@ class PromptQueue:
                     return True
         return False
 
-    def get_history(self, prompt_id=None, max_items=None, offset=-1):
+    def get_history(self, prompt_id=None, max_items=None, offset=-1, status=None, since=None):
+        # Returned entries are shared with the history store and must not be modified.
         with self.mutex:
             if prompt_id is None:
-                out = {}
-                i = 0
-                if offset < 0 and max_items is not None:
-                    offset = len(self.history) - max_items
-                for k in self.history:
-                    if i >= offset:
-                        out[k] = self.history[k]
-                        if max_items is not None and len(out) >= max_items:
-                            break
-                    i += 1
-                return out
-            elif prompt_id in self.history:
-                return {prompt_id: copy.deepcopy(self.history[prompt_id])}
-            else:
+                return self.history.items(max_items=max_items, offset=offset, status=status, since=since)
+            entry = self.history.get(prompt_id)
+            if entry is None:
                 return {}
+            return {prompt_id: entry}
 
     def wipe_history(self):
         with self.mutex:
-            self.history = {}
+            self.history.clear()
 
     def delete_history_item(self, id_to_delete):
         with self.mutex:
-            self.history.pop(id_to_delete, None)
+            self.history.delete(id_to_delete)
 
     def set_flag(self, name, data):
         with self.mutex:
@@ -129,6 +129,7 @@ import comfy.utils
 
 import execution
 import server
+from comfy_execution import coalesce
 from server import BinaryEventTypes
 import nodes
 import comfy.model_management
@@ -148,7 +149,11 @@ def cuda_malloc_warning():
             logging.warning("\nWARNING: this card most likely does not support cuda-malloc, if you get \"CUDA error\" please run ComfyUI with: --disable-cuda-malloc\n")
 
 
-def prompt_worker(q, server_instance):
+def prompt_worker(q, server_instance, affinity=None, workers=()):
+    """
+    affinity: this worker's comfy_execution.dispatch.WorkerAffinity when running several workers
+    (--prompt-workers) or coalescing prompts (--coalesce-prompts), workers: the affinities of all workers.
+    """
     current_time: float = 0.0
     cache_type = execution.CacheType.CLASSIC
     if args.cache_lru > 0:
@@ -166,21 +171,37 @@ def prompt_worker(q, server_instance):
         if need_gc:
             timeout = max(gc_collect_interval - (current_time - last_gc_collect), 0.0)
 
-        queue_item = q.get(timeout=timeout)
+        queue_item = q.get(timeout=timeout, select=None if affinity is None else affinity.score)
         if queue_item is not None:
             item, item_id = queue_item
             execution_start_time = time.perf_counter()
             prompt_id = item[1]
             server_instance.last_prompt_id = prompt_id
 
-            e.execute(item[2], prompt_id, item[3], item[4])
+            coalesced = None
+            if affinity is not None and affinity.coalesce:
+                coalesced = q.get_coalesced(item, select=affinity.score)
+            if coalesced is None:
+                e.execute(item[2], prompt_id, item[3], item[4])
+            else:
+                plan, coalesced_items = coalesced
+                logging.info("Coalesced {} prompts into one batch".format(plan.count))
+                e.execute(plan.prompt, prompt_id, item[3], item[4])
+            if affinity is not None:
+                affinity.executed(item)
             need_gc = True
-            q.task_done(item_id,
-                        e.history_result,
-                        status=execution.PromptQueue.ExecutionStatus(
-                            status_str='success' if e.success else 'error',
-                            completed=e.success,
-                            messages=e.status_messages))
+            status = execution.PromptQueue.ExecutionStatus(
+                status_str='success' if e.success else 'error',
+                completed=e.success,
+                messages=e.status_messages)
+            if coalesced is None:
+                q.task_done(item_id, e.history_result, status=status)
+            else:
+                results = plan.split_result(e.history_result)
+                q.task_done(item_id, results[0], status=status)
+                for (other, other_id), result in zip(coalesced_items, results[1:]):
+                    q.task_done(other_id, result, status=status)
+                    coalesce.notify_coalesced(server_instance, other, result, e.success)
             if server_instance.client_id is not None:
                 server_instance.send_sync("executing", {"node": None, "prompt_id": prompt_id}, server_instance.client_id)
 
@@ -192,12 +213,23 @@ def prompt_worker(q, server_instance):
         free_memory = flags.get("free_memory", False)
 
         if flags.get("unload_models", free_memory):
-            comfy.model_management.unload_all_models()
+            # Deferred until no prompt is executing on another worker
+            execution.model_unload_gate.unload_all_models()
             need_gc = True
             last_gc_collect = 0
 
         if free_memory:
+            # Other workers may be executing, they reset their own caches between prompts
+            for worker in workers:
+                worker.reset_requested.set()
+            if affinity is None:
+                e.reset()
+                need_gc = True
+                last_gc_collect = 0
+
+        if affinity is not None and affinity.reset_requested.is_set():
             e.reset()
+            affinity.reset()
             need_gc = True
             last_gc_collect = 0
 
@@ -260,18 +292,33 @@ def start_comfyui(asyncio_loop=None):
         asyncio_loop = asyncio.new_event_loop()
         asyncio.set_event_loop(asyncio_loop)
     prompt_server = server.PromptServer(asyncio_loop)
-    q = execution.PromptQueue(prompt_server)
+    history = None
+    if args.history_db is not None:
+        from comfy_execution.history import SQLiteHistoryStore
+        history_db = os.path.abspath(args.history_db)
+        logging.info(f"Storing prompt history in: {history_db}")
+        history = SQLiteHistoryStore(history_db, max_items=execution.MAXIMUM_HISTORY_SIZE)
+    q = execution.PromptQueue(prompt_server, history=history)
 
     hook_breaker_ac10a0.save_functions()
     nodes.init_extra_nodes(init_custom_nodes=not args.disable_all_custom_nodes, init_api_nodes=not args.disable_api_nodes)
     hook_breaker_ac10a0.restore_functions()
+    if args.coalesce_prompts:
+        nodes.NODE_CLASS_MAPPINGS.update(coalesce.NODE_CLASS_MAPPINGS)
 
     cuda_malloc_warning()
 
     prompt_server.add_routes()
     hijack_progress(prompt_server)
 
-    threading.Thread(target=prompt_worker, daemon=True, args=(q, prompt_server,)).start()
+    if args.prompt_workers > 1 or args.coalesce_prompts:
+        from comfy_execution.dispatch import WorkerAffinity
+        logging.info(f"Starting {args.prompt_workers} prompt workers")
+        workers = [WorkerAffinity(i, coalesce=args.coalesce_prompts) for i in range(args.prompt_workers)]
+        for worker in workers:
+            threading.Thread(target=prompt_worker, daemon=True, args=(q, prompt_server, worker, workers)).start()
+    else:
+        threading.Thread(target=prompt_worker, daemon=True, args=(q, prompt_server,)).start()
 
     if args.quick_test_for_ci:
         exit(0)
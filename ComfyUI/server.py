@@ -11,6 +11,7 @@ import urllib
 import json
 import glob
 import struct
+import threading
 import ssl
 import socket
 import ipaddress
@@ -146,8 +147,32 @@ def create_origin_only_middleware():
 
     return origin_only_middleware
 
+def _execution_property(name):
+    return property(lambda self: self._get_execution_value(name), lambda self, value: self._set_execution_value(name, value))
+
 class PromptServer():
+    # State of the prompt being executed. With several prompt workers (--prompt-workers) each worker
+    # thread reads back its own values; other threads (e.g. the websocket handler) see the latest ones.
+    client_id = _execution_property("client_id")
+    last_node_id = _execution_property("last_node_id")
+    last_prompt_id = _execution_property("last_prompt_id")
+
+    def _get_execution_value(self, name):
+        values = getattr(self._execution_local, "values", None)
+        if values is not None and name in values:
+            return values[name]
+        return self._execution_shared.get(name, None)
+
+    def _set_execution_value(self, name, value):
+        values = getattr(self._execution_local, "values", None)
+        if values is None:
+            values = self._execution_local.values = {}
+        values[name] = value
+        self._execution_shared[name] = value
+
     def __init__(self, loop):
+        self._execution_local = threading.local()
+        self._execution_shared = {}
         PromptServer.instance = self
 
         mimetypes.init()
@@ -611,7 +636,12 @@ class PromptServer():
             max_items = request.rel_url.query.get("max_items", None)
             if max_items is not None:
                 max_items = int(max_items)
-            return web.json_response(self.prompt_queue.get_history(max_items=max_items))
+            offset = int(request.rel_url.query.get("offset", -1))
+            status = request.rel_url.query.get("status", None)
+            since = request.rel_url.query.get("since", None)
+            if since is not None:
+                since = float(since)
+            return web.json_response(self.prompt_queue.get_history(max_items=max_items, offset=offset, status=status, since=since))
 
         @routes.get("/history/{prompt_id}")
         async def get_history_prompt_id(request):
@@ -651,6 +681,15 @@ class PromptServer():
 
                 if "client_id" in json_data:
                     extra_data["client_id"] = json_data["client_id"]
+                worker = extra_data.get("worker", None)
+                if worker is not None and (type(worker) is not int or worker not in range(args.prompt_workers)):
+                    error = {
+                        "type": "invalid_worker",
+                        "message": "Invalid worker",
+                        "details": "extra_data worker must be an integer between 0 and {}".format(args.prompt_workers - 1),
+                        "extra_info": {}
+                    }
+                    return web.json_response({"error": error, "node_errors": {}}, status=400)
                 if valid[0]:
                     prompt_id = str(uuid.uuid4())
                     outputs_to_execute = valid[2]
@@ -685,7 +724,17 @@ class PromptServer():
 
         @routes.post("/interrupt")
         async def post_interrupt(request):
-            nodes.interrupt_processing()
+            prompt_id = None
+            if request.can_read_body:
+                try:
+                    json_data = await request.json()
+                except json.JSONDecodeError:
+                    json_data = {}
+                if isinstance(json_data, dict):
+                    prompt_id = json_data.get("prompt_id", None)
+            # Only interrupt the workers running prompts (the given one if prompt_id is set)
+            for thread_id in self.prompt_queue.get_running_threads(prompt_id):
+                nodes.interrupt_processing(thread_id=thread_id)
             return web.Response(status=200)
 
         @routes.post("/free")
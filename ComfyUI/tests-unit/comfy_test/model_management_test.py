@@ -0,0 +1,65 @@
+import types
+import threading
+import torch
+import comfy.model_management as mm
+
+
+def test_models_pinned_by_other_worker_are_not_evicted():
+    class FakeLoaded:
+        device = torch.device("cpu")
+        model = types.SimpleNamespace(model=None)
+
+        def model_offloaded_memory(self):
+            return 0
+
+        def model_memory(self):
+            return 0
+
+        def is_dead(self):
+            return False
+
+        def model_unload(self, memory_to_free=None, unpatch_weights=True):
+            return True
+
+    pinned, free = FakeLoaded(), FakeLoaded()
+    saved = list(mm.current_loaded_models)
+    mm.current_loaded_models[:] = [pinned, free]
+    other = threading.Thread(target=lambda: mm.pinned_models.__setitem__(other.ident, [pinned]))
+    other.start()
+    other.join()
+    try:
+        mm.free_memory(1e30, torch.device("cpu"))
+        assert mm.current_loaded_models == [pinned]
+        mm.release_models(other.ident)
+        mm.free_memory(1e30, torch.device("cpu"))
+        assert mm.current_loaded_models == []
+    finally:
+        mm.pinned_models.pop(other.ident, None)
+        mm.current_loaded_models[:] = saved
+
+
+def test_global_interrupt_reaches_every_processing_thread():
+    other = threading.Thread(target=lambda: None)
+    other.start()
+    other.join()
+    mm.processing_threads.update({threading.get_ident(), other.ident})
+    try:
+        mm.interrupt_current_processing()
+        assert not mm.interrupt_processing
+        assert mm.interrupted_threads >= {threading.get_ident(), other.ident}
+        try:
+            mm.throw_exception_if_processing_interrupted()
+            assert False
+        except mm.InterruptProcessingException:
+            pass
+        # Consumed for this thread only
+        assert other.ident in mm.interrupted_threads
+        assert not mm.processing_interrupted()
+        mm.processing_threads.clear()
+        mm.interrupted_threads.clear()
+        # No prompt executing: a later prompt must not start interrupted
+        mm.interrupt_current_processing()
+        assert not mm.processing_interrupted()
+    finally:
+        mm.processing_threads.clear()
+        mm.interrupted_threads.clear()
@@ -0,0 +1,114 @@
+import numpy as np
+import torch
+from comfy_execution import caching
+from comfy_execution.caching import CacheKeySetInputSignature, Unhashable, to_hashable
+from comfy_execution.graph import DynamicPrompt
+
+
+class NotChanged:
+    def get(self, node_id):
+        return False
+
+
+def make_prompt(width=512, scale_by=1.5):
+    return {
+        "1": {"class_type": "EmptyLatentImage", "inputs": {"width": width, "height": 512, "batch_size": 1}},
+        "2": {"class_type": "LatentUpscaleBy", "inputs": {"samples": ["1", 0], "upscale_method": "nearest-exact", "scale_by": scale_by}},
+        "3": {"class_type": "LatentUpscaleBy", "inputs": {"samples": ["2", 0], "upscale_method": "nearest-exact", "scale_by": 2.0}},
+        "4": {"class_type": "EmptyLatentImage", "inputs": {"width": 64, "height": 64, "batch_size": 1}},
+    }
+
+
+def make_keys(prompt):
+    return CacheKeySetInputSignature(DynamicPrompt(prompt), list(prompt.keys()), NotChanged())
+
+
+def test_signatures_shared_across_prompts():
+    first = make_keys(make_prompt())
+    second = make_keys(make_prompt())
+    for node_id in ("1", "2", "3", "4"):
+        assert first.get_data_key(node_id) is second.get_data_key(node_id)
+
+
+def test_changed_input_only_affects_descendants():
+    first = make_keys(make_prompt())
+    second = make_keys(make_prompt(scale_by=3.0))
+    assert first.get_data_key("1") is second.get_data_key("1")
+    assert first.get_data_key("4") is second.get_data_key("4")
+    assert first.get_data_key("2") != second.get_data_key("2")
+    assert first.get_data_key("3") != second.get_data_key("3")
+
+
+def test_identical_nodes_share_signature():
+    prompt = make_prompt()
+    prompt["4"]["inputs"] = dict(prompt["1"]["inputs"])
+    keys = make_keys(prompt)
+    assert keys.get_data_key("1") is keys.get_data_key("4")
+
+
+def test_deep_chain():
+    prompt = {"0": {"class_type": "EmptyLatentImage", "inputs": {"width": 64, "height": 64, "batch_size": 1}}}
+    for i in range(1, 5000):
+        prompt[str(i)] = {"class_type": "LatentUpscaleBy", "inputs": {"samples": [str(i - 1), 0], "upscale_method": "nearest-exact", "scale_by": 1.0}}
+    first = make_keys(prompt)
+    second = make_keys(prompt)
+    assert first.get_data_key("4999") is second.get_data_key("4999")
+    assert first.get_data_key("4999") != first.get_data_key("4998")
+
+
+def test_missing_ancestor_is_never_cached():
+    prompt = make_prompt()
+    prompt["2"]["inputs"]["samples"] = ["missing", 0]
+    first = make_keys(prompt)
+    second = make_keys(prompt)
+    assert isinstance(first.signatures["missing"], Unhashable)
+    assert first.get_data_key("2") != second.get_data_key("2")
+
+
+def test_to_hashable_tensor_content():
+    a = torch.arange(12, dtype=torch.float32).reshape(3, 4)
+    assert to_hashable(a) == to_hashable(a.clone())
+    assert to_hashable(a) != to_hashable(a.reshape(4, 3))
+    assert to_hashable(a) != to_hashable(a.to(torch.float64))
+    assert to_hashable(a.t()) == to_hashable(a.t().contiguous())
+    b = a.clone()
+    b[0, 0] = 100.0
+    assert to_hashable(a) != to_hashable(b)
+
+
+def test_to_hashable_tensor_in_place_change():
+    a = torch.zeros(4)
+    before = to_hashable(a)
+    assert to_hashable(a) == before
+    a.add_(1.0)
+    assert to_hashable(a) != before
+
+
+def test_inference_tensor_digest_memoized(monkeypatch):
+    calls = []
+    digest_buffer = caching.digest_buffer
+    monkeypatch.setattr(caching, "digest_buffer", lambda buffer: calls.append(1) or digest_buffer(buffer))
+    with torch.inference_mode():
+        c = torch.zeros(4)
+        d = torch.zeros(4)
+    assert to_hashable(c) == to_hashable(c) == to_hashable(d)
+    assert len(calls) == 2
+
+
+def test_to_hashable_arrays_and_buffers():
+    array = np.arange(6, dtype=np.int16).reshape(2, 3)
+    assert to_hashable(array) == to_hashable(array.copy())
+    assert to_hashable(array) != to_hashable(array.astype(np.int32))
+    assert isinstance(to_hashable(np.array([object()])), Unhashable)
+    assert to_hashable(b"abc") == b"abc"
+    assert to_hashable(bytearray(b"abc")) == to_hashable(memoryview(b"abc"))
+    assert isinstance(to_hashable(object()), Unhashable)
+
+
+def test_tensor_inputs_share_signature():
+    mask = torch.ones(1, 8, 8)
+    first = make_prompt()
+    first["1"]["inputs"]["mask"] = mask
+    second = make_prompt()
+    second["1"]["inputs"]["mask"] = mask.clone()
+    assert make_keys(first).get_data_key("3") is make_keys(second).get_data_key("3")
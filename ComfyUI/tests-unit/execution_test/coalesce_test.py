@@ -0,0 +1,88 @@
+import torch
+import comfy.sample
+from comfy_execution.coalesce import batch_conditioning, fuse_prompts
+
+
+def make_prompt(text="a cat", seed=1, steps=20, batch_size=1):
+    return {
+        "4": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": "a.safetensors"}},
+        "5": {"class_type": "EmptyLatentImage", "inputs": {"width": 512, "height": 512, "batch_size": batch_size}},
+        "6": {"class_type": "CLIPTextEncode", "inputs": {"text": text, "clip": ["4", 1]}},
+        "7": {"class_type": "CLIPTextEncode", "inputs": {"text": "blurry", "clip": ["4", 1]}},
+        "3": {"class_type": "KSampler", "inputs": {"seed": seed, "steps": steps, "cfg": 8.0, "sampler_name": "euler", "scheduler": "normal", "denoise": 1.0,
+                                                   "model": ["4", 0], "positive": ["6", 0], "negative": ["7", 0], "latent_image": ["5", 0]}},
+        "8": {"class_type": "VAEDecode", "inputs": {"samples": ["3", 0], "vae": ["4", 2]}},
+        "9": {"class_type": "SaveImage", "inputs": {"filename_prefix": "ComfyUI", "images": ["8", 0]}},
+    }
+
+
+def test_fuse_text_and_seed():
+    plan = fuse_prompts([make_prompt("a cat", 1, batch_size=2), make_prompt("a dog", 2, batch_size=2)])
+    fused = plan.prompt
+    assert plan.count == 2
+    assert fused["5"]["inputs"]["batch_size"] == 4
+    assert fused["3"]["class_type"] == "CoalescedKSampler"
+    assert fused["3"]["inputs"]["seeds"] == "1,2"
+    assert "seed" not in fused["3"]["inputs"]
+    assert fused["6"] == {"class_type": "CoalescedConditioning", "inputs": {"batch_size": 2, "conditioning_0": ["6.0", 0], "conditioning_1": ["6.1", 0]}}
+    assert fused["6.1"]["inputs"] == {"text": "a dog", "clip": ["4", 1]}
+    # Unchanged negative prompt is encoded once
+    assert fused["7"]["class_type"] == "CLIPTextEncode"
+    assert plan.split_outputs == {"9"}
+
+
+def test_fuse_rejects_other_differences():
+    assert fuse_prompts([make_prompt(steps=20), make_prompt(steps=30)]) is None
+    assert fuse_prompts([make_prompt(batch_size=1), make_prompt(batch_size=2)]) is None
+    img2img = make_prompt()
+    img2img["5"] = {"class_type": "VAEEncode", "inputs": {"pixels": ["10", 0], "vae": ["4", 2]}}
+    img2img["10"] = {"class_type": "LoadImage", "inputs": {"image": "a.png"}}
+    assert fuse_prompts([img2img, img2img]) is None
+    unknown_downstream = make_prompt()
+    unknown_downstream["9"]["class_type"] = "SomeCustomNode"
+    assert fuse_prompts([unknown_downstream, unknown_downstream]) is None
+    assert fuse_prompts([make_prompt()]) is None
+
+
+def test_split_result():
+    plan = fuse_prompts([make_prompt("a cat", 1, batch_size=2), make_prompt("a dog", 2, batch_size=2)])
+    images = [{"filename": f"{i}.png"} for i in range(4)]
+    results = plan.split_result({"outputs": {"9": {"images": images}}, "meta": {"9": {"node_id": "9"}}})
+    assert [r["outputs"]["9"]["images"] for r in results] == [images[:2], images[2:]]
+    assert results[1]["meta"] == {"9": {"node_id": "9"}}
+
+
+def test_noise_per_seed_matches_separate_batches():
+    latent = torch.zeros(4, 4, 8, 8)
+    noise = comfy.sample.prepare_noise_per_seed(latent, [5, 7])
+    assert torch.equal(noise[:2], comfy.sample.prepare_noise(latent[:2], 5))
+    assert torch.equal(noise[2:], comfy.sample.prepare_noise(latent[2:], 7))
+
+
+def test_batch_conditioning():
+    first = [[torch.full((1, 77, 8), 1.0), {"pooled_output": torch.full((1, 8), 1.0)}]]
+    second = [[torch.full((1, 154, 8), 2.0), {"pooled_output": torch.full((1, 8), 2.0)}]]
+    cond, options = batch_conditioning([first, second], 2)[0]
+    assert cond.shape == (4, 154, 8)
+    assert cond[:, 0, 0].tolist() == [1.0, 1.0, 2.0, 2.0]
+    assert options["pooled_output"][:, 0].tolist() == [1.0, 1.0, 2.0, 2.0]
+
+
+class FakeServer:
+    def queue_updated(self):
+        pass
+
+
+def test_queue_get_coalesced():
+    import execution
+    q = execution.PromptQueue(FakeServer())
+    q.put((0, "coalesce-q0", make_prompt("a cat", 1), {}, ["9"]))
+    q.put((1, "coalesce-q1", make_prompt(steps=30), {}, ["9"]))
+    q.put((2, "coalesce-q2", make_prompt("a dog", 2), {}, ["9"]))
+    item, _ = q.get()
+    plan, items = q.get_coalesced(item)
+    assert [x[1] for x, _ in items] == ["coalesce-q2"]
+    assert plan.prompt["3"]["inputs"]["seeds"] == "1,2"
+    assert [x[1] for x in q.queue] == ["coalesce-q1"]
+    assert len(q.currently_running) == 2
+    assert q.get_coalesced(q.get()[0]) is None
@@ -0,0 +1,109 @@
+import heapq
+import random
+from comfy_execution.dispatch import WorkerAffinity, heap_remove, prompt_models, select_index, select_item, workflow_signature
+
+
+def make_prompt(ckpt_name):
+    return {
+        "4": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": ckpt_name}},
+        "6": {"class_type": "CLIPTextEncode", "inputs": {"text": "a cat", "clip": ["4", 1]}},
+    }
+
+
+def make_item(number, prompt_id, ckpt_name="a.safetensors", extra_data=None, prompt=None):
+    return (number, prompt_id, prompt or make_prompt(ckpt_name), extra_data or {}, ["9"])
+
+
+def test_prompt_models_only_loader_literals():
+    assert prompt_models(make_prompt("a.safetensors")) == frozenset({("CheckpointLoaderSimple", "ckpt_name", "a.safetensors")})
+
+
+def test_select_item_priority_order_without_affinity():
+    queue = [make_item(2, "b"), make_item(0, "a"), make_item(1, "c")]
+    heapq.heapify(queue)
+    assert select_item(queue, WorkerAffinity(0).score)[1] == "a"
+
+
+def test_select_item_prefers_loaded_models():
+    worker = WorkerAffinity(0)
+    # Models are memoized by prompt_id, so ids must not be reused with other prompts
+    worker.executed(make_item(0, "loaded-old", "b.safetensors"))
+    queue = [make_item(0, "loaded-a", "a.safetensors"), make_item(1, "loaded-b", "b.safetensors")]
+    heapq.heapify(queue)
+    assert select_item(queue, worker.score)[1] == "loaded-b"
+
+
+def test_select_item_affinity_window():
+    worker = WorkerAffinity(0)
+    worker.executed(make_item(0, "window-old", "b.safetensors"))
+    queue = [make_item(0, "window-a", "a.safetensors"), make_item(1, "window-b", "b.safetensors")]
+    assert select_item(queue, worker.score, window=1)[1] == "window-a"
+
+
+def test_select_item_pinned_worker():
+    queue = [make_item(0, "a", extra_data={"worker": 1}), make_item(1, "b")]
+    assert select_item(queue, WorkerAffinity(0).score)[1] == "b"
+    assert select_item(queue, WorkerAffinity(1).score)[1] == "a"
+    assert select_item(queue[:1], WorkerAffinity(0).score) is None
+
+
+def test_reset_clears_affinity():
+    worker = WorkerAffinity(0)
+    worker.executed(make_item(0, "a"))
+    worker.reset_requested.set()
+    worker.reset()
+    assert worker.models == frozenset()
+    assert not worker.reset_requested.is_set()
+
+
+def test_workflow_signature_ignores_widget_values():
+    prompt = make_prompt("a.safetensors")
+    other_text = make_prompt("a.safetensors")
+    other_text["6"]["inputs"]["text"] = "a dog"
+    assert workflow_signature(prompt) == workflow_signature(other_text)
+    assert workflow_signature(prompt) != workflow_signature(make_prompt("b.safetensors"))
+    relinked = make_prompt("a.safetensors")
+    relinked["6"]["inputs"]["clip"] = ["4", 0]
+    assert workflow_signature(prompt) != workflow_signature(relinked)
+
+
+def test_coalesce_prefers_same_workflow():
+    worker = WorkerAffinity(0, coalesce=True)
+    worker.executed(make_item(0, "coalesce-old"))
+    other_workflow = make_prompt("a.safetensors")
+    other_workflow["7"] = {"class_type": "CLIPTextEncode", "inputs": {"text": "", "clip": ["4", 1]}}
+    same_workflow = make_prompt("a.safetensors")
+    same_workflow["6"]["inputs"]["text"] = "a dog"
+    queue = [make_item(0, "coalesce-a", prompt=other_workflow), make_item(1, "coalesce-b", prompt=same_workflow)]
+    assert select_item(queue, worker.score)[1] == "coalesce-b"
+    assert select_item(queue, WorkerAffinity(0).score)[1] == "coalesce-a"
+
+
+def test_score_invalid_worker_does_not_raise():
+    assert WorkerAffinity(0).score(make_item(0, "a", extra_data={"worker": "x"})) is None
+
+
+def test_select_index_scores_only_window():
+    queue = [make_item(i, f"scored-{i}") for i in range(50)]
+    random.Random(0).shuffle(queue)
+    heapq.heapify(queue)
+    scored = []
+
+    def score(item):
+        scored.append(item[0])
+        return None if item[0] % 2 else (False, 0)
+
+    assert queue[select_index(queue, score, window=3)][0] == 0
+    assert scored == [0, 1, 2, 3, 4]
+
+
+def test_heap_remove_keeps_heap_order():
+    rng = random.Random(0)
+    queue = [make_item(rng.random(), f"remove-{i}") for i in range(100)]
+    heapq.heapify(queue)
+    expected = sorted(queue)
+    while queue:
+        item = heap_remove(queue, rng.randrange(len(queue)))
+        expected.remove(item)
+        assert sorted(queue) == expected
+        assert all(queue[(i - 1) // 2] <= queue[i] for i in range(1, len(queue)))
@@ -0,0 +1,125 @@
+import pytest
+from comfy_execution.history import MAX_PENDING_RECOVERIES, HistoryStore, SQLiteHistoryStore
+
+
+def make_entry(prompt_id, status_str="success"):
+    return {
+        "prompt": [0, prompt_id, {}, {}, []],
+        "outputs": {"9": {"images": [{"filename": f"{prompt_id}.png", "subfolder": "", "type": "output"}]}},
+        "status": {"status_str": status_str, "completed": status_str == "success", "messages": []},
+        "meta": {},
+    }
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        yield HistoryStore(max_items=5)
+    else:
+        store = SQLiteHistoryStore(str(tmp_path / "history.db"), max_items=5)
+        yield store
+        store.close()
+
+
+def test_put_and_get(store):
+    store.put("a", make_entry("a"))
+    assert store.get("a") == make_entry("a")
+    assert store.get("missing") is None
+    assert "a" in store
+    assert len(store) == 1
+
+
+def test_items_pagination(store):
+    for prompt_id in "abcd":
+        store.put(prompt_id, make_entry(prompt_id))
+    assert list(store.items()) == ["a", "b", "c", "d"]
+    # Negative offset with max_items returns the most recent entries
+    assert list(store.items(max_items=2)) == ["c", "d"]
+    assert list(store.items(max_items=2, offset=1)) == ["b", "c"]
+    assert list(store.items(offset=3)) == ["d"]
+
+
+def test_items_filters(store):
+    store.put("a", make_entry("a"))
+    store.put("b", make_entry("b", "error"))
+    store.put("c", make_entry("c"))
+    assert list(store.items(status="success")) == ["a", "c"]
+    assert list(store.items(status="error")) == ["b"]
+    assert list(store.items(status="success", max_items=1)) == ["c"]
+    assert store.items(since=4102444800.0) == {}
+
+
+def test_max_items_evicts_oldest(store):
+    for i in range(7):
+        store.put(str(i), make_entry(str(i)))
+    assert list(store.items()) == ["2", "3", "4", "5", "6"]
+
+
+def test_delete_and_clear(store):
+    store.put("a", make_entry("a"))
+    store.put("b", make_entry("b"))
+    store.delete("a")
+    assert list(store.items()) == ["b"]
+    store.clear()
+    assert len(store) == 0
+
+
+def test_sqlite_history_survives_restart(tmp_path):
+    path = str(tmp_path / "history.db")
+    store = SQLiteHistoryStore(path)
+    store.put("a", make_entry("a"))
+    store.close()
+
+    store = SQLiteHistoryStore(path)
+    assert store.get("a") == make_entry("a")
+    store.close()
+
+
+def test_sqlite_pending_recovery(tmp_path):
+    path = str(tmp_path / "history.db")
+    store = SQLiteHistoryStore(path)
+    store.add_pending((1, "done", {"1": {"class_type": "A", "inputs": {}}}, {}, ["1"]))
+    store.add_pending((2, "running", {"1": {"class_type": "A", "inputs": {}}}, {"client_id": "x"}, ["1"]))
+    store.add_pending((3, "deleted", {}, {}, []))
+    store.put("done", make_entry("done"))
+    store.remove_pending(["deleted"])
+    store.close()
+
+    store = SQLiteHistoryStore(path)
+    assert store.load_pending() == [(2, "running", {"1": {"class_type": "A", "inputs": {}}}, {"client_id": "x"}, ["1"])]
+    store.close()
+
+
+def test_sqlite_does_not_store_credentials(tmp_path):
+    path = str(tmp_path / "history.db")
+    extra_data = {"client_id": "x", "api_key_comfy_org": "secret", "auth_token_comfy_org": "token"}
+    store = SQLiteHistoryStore(path)
+    store.add_pending((1, "queued", {}, dict(extra_data), []))
+    entry = make_entry("done")
+    entry["prompt"] = (0, "done", {}, dict(extra_data), [])
+    store.put("done", entry)
+    store.close()
+    with open(path, "rb") as f:
+        data = f.read()
+    assert b"secret" not in data and b"token" not in data
+
+    store = SQLiteHistoryStore(path)
+    assert store.load_pending() == [(1, "queued", {}, {"client_id": "x"}, [])]
+    assert store.get("done")["prompt"][3] == {"client_id": "x"}
+    store.close()
+
+
+def test_sqlite_pending_recovery_limit(tmp_path):
+    path = str(tmp_path / "history.db")
+    store = SQLiteHistoryStore(path)
+    store.add_pending((1, "crashing", {}, {}, []))
+    store.close()
+    for _ in range(MAX_PENDING_RECOVERIES):
+        store = SQLiteHistoryStore(path)
+        assert [item[1] for item in store.load_pending()] == ["crashing"]
+        store.close()
+
+    store = SQLiteHistoryStore(path)
+    assert store.load_pending() == []
+    assert store.get("crashing")["status"]["status_str"] == "error"
+    store.close()
@@ -0,0 +1,184 @@
+import os
+import sys
+import queue
+import secrets
+import datetime
+import argparse
+import threading
+import concurrent.futures
+from multiprocessing.connection import Listener, Client
+
+# --- 디버깅 로그 함수 ---
+def log_message(message):
+    print(f"[{datetime.datetime.now()}] ANALYSIS_WORKER_DEBUG: {message}", flush=True)
+
+WORKER_HOST = os.getenv("ANALYSIS_WORKER_HOST", "localhost")
+WORKER_PORT = int(os.getenv("ANALYSIS_WORKER_PORT", "6010"))
+# 인증 키: ANALYSIS_WORKER_AUTHKEY가 없으면 설치별 비밀 파일(권한 0600)을 워커와 클라이언트가 함께 사용
+WORKER_AUTHKEY_PATH = os.getenv("ANALYSIS_WORKER_AUTHKEY_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", ".analysis_worker_key"))
+DEFAULT_MODEL_PATH = "yolov8m.pt"
+
+
+class AnalysisWorker:
+    """
+    torch/ultralytics/nltk import와 CLIP·YOLO 가중치 로드를 한 번만 수행하고,
+    큐에 들어온 (prompt, video) 작업을 PipelineScheduler로 넘겨 단계별로 병렬 처리하는 상주 워커.
+    workers: 자원 종류별 워커 수 (예: {"cpu": 2, "gpu": 2, "network": 4})
+    """
+
+    def __init__(self, model_path: str = DEFAULT_MODEL_PATH, workers: dict = None, max_inflight_jobs: int = None):
+        self.model_path = model_path
+        self.workers = workers
+        self.max_inflight_jobs = max_inflight_jobs
+        self.jobs = queue.Queue()
+        self._pipeline = None
+        self._scheduler = None
+        self._futures = set()  # 스케줄러에 넘긴 뒤 아직 끝나지 않은 작업 (완료 콜백은 스케줄러 스레드에서 호출됨)
+        self._futures_lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return self
+        # 무거운 import는 워커 시작 시 한 번만
+        log_message("run_pipeline 모듈 import 및 모델 로드 시작")
+        import run_pipeline as pipeline
+        from pipeline_scheduler import PipelineScheduler, DEFAULT_MAX_INFLIGHT_JOBS
+        pipeline.get_clip_scorer(device="cuda")
+        pipeline.load_yolo_model(self.model_path)
+        self._pipeline = pipeline
+        self._scheduler = PipelineScheduler(workers=self.workers,
+                                            max_inflight_jobs=self.max_inflight_jobs or DEFAULT_MAX_INFLIGHT_JOBS)
+        log_message("모델 로드 완료. 작업 대기 중")
+
+        self._thread = threading.Thread(target=self._run, name="analysis-worker", daemon=True)
+        self._thread.start()
+        return self
+
+    def submit(self, prompt_path: str, video_path: str, **options) -> int:
+        """작업을 큐에 넣고, 현재 대기 중인 작업 수를 반환합니다."""
+        self.jobs.put({"prompt": prompt_path, "video": video_path, **options})
+        return self.jobs.qsize()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self.jobs.put(None)
+        self._thread.join()
+        self._thread = None
+        # 이미 스케줄러에 넘어간 작업이 끝날 때까지 기다린 뒤 워커 풀 종료
+        with self._futures_lock:
+            pending = list(self._futures)
+        concurrent.futures.wait(pending)
+        self._scheduler.shutdown()
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            try:
+                if job is None:
+                    break
+                prompt_path = job.pop("prompt")
+                video_path = job.pop("video")
+                print(f"[▶️] 분석 시작: prompt={prompt_path}, video={video_path}")
+                pipeline_job = self._pipeline.prepare_job(prompt_path, video_path, model_path=job.pop("model", self.model_path), **job)
+                future = self._scheduler.submit(pipeline_job)
+                with self._futures_lock:
+                    self._futures.add(future)
+                future.add_done_callback(lambda f, name=os.path.basename(video_path): self._on_job_done(name, f))
+            except Exception as e:
+                # 한 작업의 실패가 워커 전체를 멈추지 않도록 기록만 하고 다음 작업으로 진행
+                log_message(f"[ERROR] 작업 처리 중 예외 발생: {e}")
+                print(f"[❌] 분석 중 오류 발생: {e}")
+            finally:
+                self.jobs.task_done()
+
+    def _on_job_done(self, video_name, future):
+        with self._futures_lock:
+            self._futures.discard(future)
+        error = future.exception()
+        if error is not None:
+            print(f"[❌] 분석 중 오류 발생 ({video_name}): {error}")
+        else:
+            print(f"[✅] 분석 완료: {video_name}")
+
+
+def load_authkey(path: str = WORKER_AUTHKEY_PATH) -> bytes:
+    """ANALYSIS_WORKER_AUTHKEY 또는 설치별 비밀 파일의 키. 파일이 없으면 무작위 키로 새로 만듭니다."""
+    env_key = os.getenv("ANALYSIS_WORKER_AUTHKEY")
+    if env_key:
+        return env_key.encode("utf-8")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        # O_EXCL: 워커와 클라이언트가 동시에 만들더라도 먼저 만든 쪽의 키를 함께 사용
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        pass
+    else:
+        with os.fdopen(fd, "w") as f:
+            f.write(secrets.token_hex(32))
+        log_message(f"분석 워커 인증 키 생성: {path}")
+    with open(path, "r") as f:
+        key = f.read().strip()
+    if not key:
+        raise RuntimeError(f"분석 워커 인증 키 파일이 비어 있습니다: {path}")
+    return key.encode("utf-8")
+
+
+def serve(host: str = WORKER_HOST, port: int = WORKER_PORT, model_path: str = DEFAULT_MODEL_PATH,
+          workers: dict = None, max_inflight_jobs: int = None):
+    """로컬 소켓으로 작업 요청을 받아 AnalysisWorker 큐에 넣는 데몬."""
+    # 모델 로드 중에 들어온 요청도 거절되지 않도록 소켓을 먼저 연 뒤 워커를 시작
+    with Listener((host, port), authkey=load_authkey()) as listener:
+        worker = AnalysisWorker(model_path, workers=workers, max_inflight_jobs=max_inflight_jobs).start()
+        print(f"[👂] 분석 워커 대기 중: {host}:{port}")
+        while True:
+            try:
+                with listener.accept() as conn:
+                    job = conn.recv()
+                    pending = worker.submit(job.pop("prompt"), job.pop("video"), **job)
+                    conn.send({"status": "queued", "pending": pending})
+            except KeyboardInterrupt:
+                print("\n[🛑] 분석 워커 종료")
+                break
+            except Exception as e:
+                log_message(f"[ERROR] 요청 처리 중 예외 발생: {e}")
+    worker.stop()
+
+
+def submit_job(prompt_path: str, video_path: str, host: str = WORKER_HOST, port: int = WORKER_PORT, **options) -> dict:
+    """
+    실행 중인 분석 워커에 작업을 보내는 얇은 클라이언트.
+    워커가 떠 있지 않으면 ConnectionRefusedError가 발생합니다.
+    """
+    job = {"prompt": os.path.abspath(prompt_path), "video": os.path.abspath(video_path), **options}
+    with Client((host, port), authkey=load_authkey()) as conn:
+        conn.send(job)
+        return conn.recv()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resident analysis worker: loads CLIP/YOLO once and runs queued prompt/video jobs.")
+    parser.add_argument("--host", default=WORKER_HOST, help="Address to listen on / connect to.")
+    parser.add_argument("--port", type=int, default=WORKER_PORT, help="Port to listen on / connect to.")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH, help="Path to the YOLO model (e.g., yolov8m.pt).")
+    parser.add_argument("--prompt", help="Submit a job: path to the prompt text file.")
+    parser.add_argument("--video", help="Submit a job: path to the video file.")
+    parser.add_argument("--cpu_workers", type=int, default=1, help="Worker threads for CPU stages (frame decoding, object comparison).")
+    parser.add_argument("--gpu_workers", type=int, default=2, help="Worker threads for GPU stages (CLIP, YOLO).")
+    parser.add_argument("--network_workers", type=int, default=2, help="Worker threads for network stages (GPT calls).")
+    parser.add_argument("--max_inflight_jobs", type=int, default=2, help="Maximum number of jobs in progress at once.")
+    args = parser.parse_args()
+
+    if args.prompt or args.video:
+        if not (args.prompt and args.video):
+            parser.error("--prompt and --video must be given together.")
+        try:
+            reply = submit_job(args.prompt, args.video, host=args.host, port=args.port, model=args.model)
+            print(f"[📨] 작업 전송 완료: {reply}")
+        except ConnectionRefusedError:
+            print(f"[ERROR] 분석 워커({args.host}:{args.port})에 연결할 수 없습니다. 먼저 `python analysis_worker.py`로 워커를 실행해주세요.")
+            sys.exit(1)
+    else:
+        workers = {"cpu": args.cpu_workers, "gpu": args.gpu_workers, "network": args.network_workers}
+        serve(args.host, args.port, model_path=args.model, workers=workers, max_inflight_jobs=args.max_inflight_jobs)
@@ -0,0 +1,238 @@
+import os
+import json
+import datetime
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import run_pipeline as pipeline
+from pairing import video_keys
+
+# --- 디버깅 로그 함수 ---
+def log_message(message):
+    print(f"[{datetime.datetime.now()}] BATCH_EVALUATE_DEBUG: {message}", flush=True)
+
+DEFAULT_VIDEOS_PER_BATCH = 4
+DEFAULT_GPT_WORKERS = 4
+
+
+def discover_pairs(prompt_dir: str, video_dir: str) -> list:
+    """
+    프롬프트 base name이 비디오 파일명의 '_' 경계 접두어와 같으면 짝으로 묶습니다
+    (trigger_monitor와 같은 규칙). 한 프롬프트에 비디오가 여러 개면 모두 평가합니다.
+    """
+    prompts = {
+        os.path.splitext(f)[0]: os.path.join(prompt_dir, f)
+        for f in os.listdir(prompt_dir)
+        if f.endswith(".txt")
+    }
+    pairs = []
+    for video_file in sorted(os.listdir(video_dir)):
+        if not video_file.endswith(".mp4"):
+            continue
+        for key in video_keys(video_file):
+            if key in prompts:
+                pairs.append((prompts[key], os.path.join(video_dir, video_file)))
+                break
+    return pairs
+
+
+def load_manifest(manifest_path: str) -> list:
+    """JSONL 한 줄에 {"prompt": 경로, "video": 경로} 하나. 상대 경로는 manifest 위치 기준입니다."""
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    pairs = []
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            prompt_path = entry.get("prompt") or entry.get("prompt_path")
+            video_path = entry.get("video") or entry.get("video_path")
+            if not prompt_path or not video_path:
+                raise ValueError(f"{manifest_path}:{line_no}: prompt(prompt_path)와 video(video_path)가 모두 필요합니다: {line.strip()}")
+            pairs.append((os.path.join(base_dir, prompt_path), os.path.join(base_dir, video_path)))
+    return pairs
+
+
+def analyze_group(jobs: list):
+    """
+    여러 작업의 CLIP/YOLO를 한 번에 처리합니다. 캐시에 있는 작업은 건너뛰고,
+    나머지 작업의 프레임은 영상 경계를 넘어 하나의 배치 스트림으로 묶어 추론합니다.
+    """
+    pending = []
+    for job in jobs:
+        prompt = pipeline.load_prompt(job["prompt_path"])
+        job["prompt_text"] = prompt
+        cached_analysis = pipeline.load_cached_analysis(job, prompt)
+        if cached_analysis is not None:
+            clip_scores, embeddings, yolo_results = cached_analysis
+            job["clip"] = pipeline.save_clip_stage(job, clip_scores, embeddings)
+            job["yolo"] = pipeline.save_yolo_stage(job, yolo_results)
+            continue
+        # 영상별로 거의 같은 프레임을 묶어 대표 프레임만 배치에 넣음
+        frames, deduplicator = pipeline.dedup_job_frames(job, list(pipeline.open_frame_stream(job)))
+        pending.append((job, prompt, frames, deduplicator))
+
+    if not pending:
+        return
+
+    clip_results = pipeline.get_clip_scorer(device="cuda").score_many([(prompt, frames) for _, prompt, frames, _ in pending],
+                                                                      return_embeddings=True)
+    all_frames = [frame for _, _, frames, _ in pending for frame in frames]
+    detections = pipeline.detect_objects(pending[0][0]["model_path"], all_frames, device="cuda")
+
+    offset = 0
+    for (job, prompt, frames, deduplicator), (clip_scores, embeddings) in zip(pending, clip_results):
+        yolo_results = pipeline.expand_results(deduplicator, detections[offset:offset + len(frames)])
+        offset += len(frames)
+        if deduplicator is not None:
+            clip_scores, embeddings = deduplicator.expand(clip_scores), deduplicator.expand_rows(embeddings)
+        if job["use_cache"]:
+            cache = pipeline.get_result_cache()
+            cache.put(pipeline.clip_cache_key(job, prompt), clip_scores)
+            cache.put(pipeline.clip_embeddings_key(job), embeddings)
+            cache.put(pipeline.yolo_cache_key(job), yolo_results)
+        job["clip"] = pipeline.save_clip_stage(job, clip_scores, embeddings)
+        job["yolo"] = pipeline.save_yolo_stage(job, yolo_results)
+
+
+def summarize(job: dict) -> dict:
+    scores = [s["score"] for s in job.get("clip", [])]
+    comparison = job.get("compare", {})
+    return {
+        "prompt_path": job["prompt_path"],
+        "video_path": job["video_path"],
+        "video_name": job["video_name"],
+        "num_frames": len(scores),
+        "clip_mean": sum(scores) / len(scores) if scores else None,
+        "clip_min": min(scores) if scores else None,
+        "clip_max": max(scores) if scores else None,
+        "prompt_objects": ", ".join(comparison.get("prompt_objects", [])),
+        "detected_objects": ", ".join(comparison.get("detected_objects", [])),
+        "appeared_objects": ", ".join(comparison.get("appeared_objects", [])),
+        "missing_objects": ", ".join(comparison.get("missing_objects", [])),
+        "results_dir": job["analysis_result_dir"],
+        "status": "ok",
+        "error": "",
+    }
+
+
+def evaluate_batch(pairs: list, model_path: str = "yolov8m.pt", sampling: dict = None,
+                   videos_per_batch: int = DEFAULT_VIDEOS_PER_BATCH, skip_gpt: bool = False,
+                   use_cache: bool = True, gpt_workers: int = DEFAULT_GPT_WORKERS, dedup: bool = True) -> pd.DataFrame:
+    rows = []
+    pipeline.get_clip_scorer(device="cuda")
+    pipeline.load_yolo_model(model_path)
+
+    with ThreadPoolExecutor(max_workers=gpt_workers, thread_name_prefix="batch-gpt") as gpt_pool:
+        for start in range(0, len(pairs), videos_per_batch):
+            group = pairs[start:start + videos_per_batch]
+            print(f"\n[📦] {start + 1}-{start + len(group)} / {len(pairs)} 쌍 평가 중")
+            jobs = []
+            for prompt_path, video_path in group:
+                try:
+                    jobs.append(pipeline.prepare_job(prompt_path, video_path, model_path=model_path, sampling=sampling,
+                                                     launch_dashboard=False, use_cache=use_cache, dedup=dedup))
+                except Exception as e:
+                    log_message(f"[ERROR] 작업 준비 실패: {video_path}: {e}")
+                    rows.append({"prompt_path": prompt_path, "video_path": video_path, "status": "error", "error": str(e)})
+
+            try:
+                analyze_group(jobs)
+            except Exception as e:
+                # 묶음 추론이 실패하면 작업별로 다시 시도해 실패한 작업만 골라냅니다.
+                log_message(f"[ERROR] 묶음 분석 실패, 작업별로 재시도: {e}")
+                for job in jobs:
+                    try:
+                        analyze_group([job])
+                    except Exception as job_error:
+                        job["error"] = str(job_error)
+
+            # 묶음의 프롬프트 키워드를 한 번에 태깅해 두면 stage_compare는 캐시만 읽습니다.
+            prompt_jobs = [job for job in jobs if "prompt_text" in job]
+            try:
+                pipeline.extract_keywords_batch([job["prompt_text"] for job in prompt_jobs])
+            except Exception as e:
+                log_message(f"[ERROR] 프롬프트 키워드 일괄 추출 실패: {e}")
+
+            gpt_futures = []
+            for job in jobs:
+                if "error" in job:
+                    continue
+                try:
+                    job["ground"] = pipeline.stage_ground(job, job["clip"])
+                    job["compare"] = pipeline.stage_compare(job, job["yolo"], job["ground"])
+                except Exception as e:
+                    job["error"] = str(e)
+                    continue
+                if not skip_gpt:
+                    for stage, stage_fn in (("feedback", pipeline.stage_feedback), ("improve", pipeline.stage_improve)):
+                        future = gpt_pool.submit(stage_fn, job, job["compare"])
+                        future.stage = stage
+                        gpt_futures.append((job, future))
+
+            for job, future in gpt_futures:
+                try:
+                    job[future.stage] = future.result()
+                except Exception as e:
+                    job["error"] = str(e)
+
+            for job in jobs:
+                if "error" in job:
+                    continue
+                try:
+                    pipeline.stage_store(job, job["clip"], job["yolo"], job["compare"], job.get("feedback"), job.get("improve"))
+                except Exception as e:
+                    log_message(f"[ERROR] 결과 저장소 기록 실패: {job['video_path']}: {e}")
+
+            for job in jobs:
+                row = summarize(job)
+                if "error" in job:
+                    row.update(status="error", error=job["error"])
+                rows.append(row)
+
+    return pd.DataFrame(rows)
+
+
+def write_table(table: pd.DataFrame, output_path: str):
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    if output_path.endswith(".parquet"):
+        table.to_parquet(output_path, index=False)
+    else:
+        table.to_csv(output_path, index=False, encoding="utf-8-sig")
+    print(f"[✅] 배치 평가 결과 저장 완료 → {output_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless batch evaluation of many prompt/video pairs with shared models.")
+    parser.add_argument("--prompts_dir", default=os.path.join("data", "prompts"), help="Directory of prompt .txt files.")
+    parser.add_argument("--videos_dir", default=os.path.join("ComfyUI", "output"), help="Directory of generated .mp4 files.")
+    parser.add_argument("--manifest", help="JSONL file with one {\"prompt\": ..., \"video\": ...} object per line (overrides the directories).")
+    parser.add_argument("--model", default="yolov8m.pt", help="Path to the YOLO model (e.g., yolov8m.pt).")
+    parser.add_argument("--output", help="Result table path (.csv or .parquet). Defaults to data/batch_results/batch_<timestamp>.csv.")
+    parser.add_argument("--videos_per_batch", type=int, default=DEFAULT_VIDEOS_PER_BATCH, help="Videos whose frames are batched together for CLIP/YOLO.")
+    parser.add_argument("--sampling_mode", default="interval", choices=["interval", "keyframe", "uniform", "fps", "scene"], help="Frame sampling mode.")
+    parser.add_argument("--frame_interval", type=int, default=10, help="Keep every N-th frame (interval mode).")
+    parser.add_argument("--num_frames", type=int, help="Number of uniformly spaced frames (uniform mode).")
+    parser.add_argument("--target_fps", type=float, help="Frames per second to sample (fps mode).")
+    parser.add_argument("--scene_threshold", type=float, help="Perceptual-hash distance (0-1) that counts as a content change (scene mode).")
+    parser.add_argument("--min_spacing", type=int, help="Minimum frames between sampled frames (scene mode).")
+    parser.add_argument("--max_spacing", type=int, help="Maximum frames between sampled frames, even in static shots (scene mode).")
+    parser.add_argument("--skip_gpt", action="store_true", help="Only run CLIP/YOLO/object comparison, no GPT feedback.")
+    parser.add_argument("--no_cache", action="store_true", help="Recompute every stage instead of reusing cached results.")
+    parser.add_argument("--no_dedup", action="store_true", help="Run CLIP/YOLO on every sampled frame instead of one per group of near-duplicates.")
+    args = parser.parse_args()
+
+    pairs = load_manifest(args.manifest) if args.manifest else discover_pairs(args.prompts_dir, args.videos_dir)
+    if not pairs:
+        print("❗ 평가할 프롬프트/비디오 쌍이 없습니다.")
+    else:
+        print(f"[INFO] 평가할 쌍: {len(pairs)}개")
+        sampling = {"mode": args.sampling_mode, "frame_interval": args.frame_interval,
+                    "num_frames": args.num_frames, "target_fps": args.target_fps, "scene_threshold": args.scene_threshold,
+                    "min_spacing": args.min_spacing, "max_spacing": args.max_spacing}
+        table = evaluate_batch(pairs, model_path=args.model, sampling=sampling, videos_per_batch=args.videos_per_batch,
+                               skip_gpt=args.skip_gpt, use_cache=not args.no_cache, dedup=not args.no_dedup)
+        output_path = args.output or os.path.join("data", "batch_results", f"batch_{datetime.datetime.now():%Y%m%d_%H%M%S}.csv")
+        write_table(table, output_path)
@@ -0,0 +1,12 @@
+import os
+
+
+def video_keys(video_file):
+    """
+    비디오 파일명에서 '_' 경계 기준 접두어를 모두 만듭니다.
+    예: video_20250522_214658_00001.mp4 → video, video_20250522, video_20250522_214658, ...
+    프롬프트 base name이 이 중 하나와 같으면 같은 생성 결과로 간주합니다.
+    (trigger_monitor와 batch_evaluate가 같은 규칙을 쓰도록 무거운 의존성 없이 분리)
+    """
+    parts = os.path.splitext(video_file)[0].split("_")
+    return ["_".join(parts[:i]) for i in range(1, len(parts) + 1)]
@@ -0,0 +1,168 @@
+import datetime
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, NamedTuple, Tuple
+
+import run_pipeline as pipeline
+
+# --- 디버깅 로그 함수 ---
+def log_message(message):
+    print(f"[{datetime.datetime.now()}] SCHEDULER_DEBUG: {message}", flush=True)
+
+
+class Stage(NamedTuple):
+    name: str
+    resource: str              # 실행될 워커 풀 ("cpu", "gpu", "network")
+    deps: Tuple[str, ...]      # 출력이 이 단계의 키워드 인자로 전달되는 선행 단계
+    fn: Callable
+
+
+# 분석 파이프라인 DAG
+#   frames ─┬─ clip ─┬──────────────────────────────────┐
+#           │        └─ ground ─┐                        │
+#           └─ yolo ────────────┴─ compare ─┬─ feedback ─┬─ store ── dashboard
+#                                           └─ improve ──┘
+PIPELINE_STAGES = (
+    Stage("frames", "cpu", (), pipeline.stage_frames),
+    Stage("clip", "gpu", ("frames",), pipeline.stage_clip),
+    Stage("yolo", "gpu", ("frames",), pipeline.stage_yolo),
+    Stage("ground", "gpu", ("clip",), pipeline.stage_ground),
+    Stage("compare", "cpu", ("yolo", "ground"), pipeline.stage_compare),
+    Stage("feedback", "network", ("compare",), pipeline.stage_feedback),
+    Stage("improve", "network", ("compare",), pipeline.stage_improve),
+    Stage("store", "cpu", ("clip", "yolo", "compare", "feedback", "improve"), pipeline.stage_store),
+    Stage("dashboard", "cpu", ("store", "feedback", "improve"), lambda job, store, feedback, improve: pipeline.stage_dashboard(job, feedback, improve)),
+)
+
+# 자원 종류별 기본 워커 수. gpu=2이면 CLIP과 YOLO가 같은 프레임 청크 스트림(FrameChunkStream)을 동시에 읽고,
+# cpu 워커는 GPU 단계가 도는 동안 다음 작업의 첫 청크들을 미리 디코딩합니다.
+DEFAULT_WORKERS = {"cpu": 1, "gpu": 2, "network": 2}
+
+# 동시에 진행 중인 작업 수 상한. 디코딩이 GPU보다 빠를 때 프레임이 메모리에 쌓이지 않도록 제한합니다.
+DEFAULT_MAX_INFLIGHT_JOBS = 2
+
+
+class _JobState:
+    def __init__(self, job, stages):
+        self.job = job
+        self.future = Future()
+        self.outputs = {}
+        self.waiting = {stage.name: len(stage.deps) for stage in stages}
+        # 출력을 아직 소비하지 않은 후속 단계 수 (0이 되면 출력을 메모리에서 해제)
+        self.consumers = {stage.name: 0 for stage in stages}
+        for stage in stages:
+            for dep in stage.deps:
+                self.consumers[dep] += 1
+        self.remaining = len(stages)
+        self.failed = False
+
+
+class PipelineScheduler:
+    """
+    파이프라인 단계를 DAG로 보고, 의존 단계가 끝난 단계를 자원 종류별 스레드 풀에 제출합니다.
+    submit()은 작업 전체가 끝나면 완료되는 Future를 반환합니다
+    (결과: 단계 이름 → 출력, 후속 단계가 모두 소비한 중간 출력은 제외).
+    """
+
+    def __init__(self, stages=PIPELINE_STAGES, workers=None, max_inflight_jobs=DEFAULT_MAX_INFLIGHT_JOBS):
+        self.stages = {stage.name: stage for stage in stages}
+        self.dependents = {name: [] for name in self.stages}
+        for stage in stages:
+            for dep in stage.deps:
+                self.dependents[dep].append(stage.name)
+
+        workers = {**DEFAULT_WORKERS, **(workers or {})}
+        resources = {stage.resource for stage in stages}
+        self.pools = {
+            resource: ThreadPoolExecutor(max_workers=workers.get(resource, 1), thread_name_prefix=f"pipeline-{resource}")
+            for resource in resources
+        }
+        self.max_inflight_jobs = max_inflight_jobs
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._pending = deque()
+
+    def submit(self, job) -> Future:
+        state = _JobState(job, self.stages.values())
+        with self._lock:
+            if self._inflight >= self.max_inflight_jobs:
+                self._pending.append(state)
+                return state.future
+            self._inflight += 1
+        self._start(state)
+        return state.future
+
+    def shutdown(self, wait=True):
+        for pool in self.pools.values():
+            pool.shutdown(wait=wait)
+
+    def _start(self, state):
+        for name, count in state.waiting.items():
+            if count == 0:
+                self._schedule(state, name)
+
+    def _schedule(self, state, name):
+        stage = self.stages[name]
+        kwargs = {dep: state.outputs[dep] for dep in stage.deps}
+        future = self.pools[stage.resource].submit(stage.fn, state.job, **kwargs)
+        future.add_done_callback(lambda f, name=name: self._on_stage_done(state, name, f))
+
+    def _on_stage_done(self, state, name, future):
+        ready = []
+        finished = False
+        first_error = None
+        next_state = None
+        with self._lock:
+            error = future.exception()
+            if error is not None:
+                if not state.failed:
+                    state.failed = True
+                    first_error = error
+                    log_message(f"[ERROR] '{name}' 단계 실패: {error}")
+            else:
+                state.outputs[name] = future.result()
+            for dep in self.stages[name].deps:
+                state.consumers[dep] -= 1
+                if state.consumers[dep] == 0 and self.dependents[dep]:
+                    state.outputs.pop(dep, None)  # 모든 후속 단계가 끝난 출력(예: 프레임)은 해제
+
+            state.remaining -= 1
+            if not state.failed:
+                for child in self.dependents[name]:
+                    state.waiting[child] -= 1
+                    if state.waiting[child] == 0:
+                        ready.append(child)
+            else:
+                # 실패한 작업의 남은 단계는 실행하지 않고 완료된 것으로 처리
+                state.remaining -= self._cancel_unscheduled(state, name)
+
+            if state.remaining == 0:
+                finished = True
+                self._inflight -= 1
+                if self._pending:
+                    next_state = self._pending.popleft()
+                    self._inflight += 1
+
+        if first_error is not None:
+            state.future.set_exception(first_error)
+        for child in ready:
+            self._schedule(state, child)
+        if finished:
+            if not state.failed:
+                state.future.set_result(dict(state.outputs))
+            if next_state is not None:
+                self._start(next_state)
+
+    def _cancel_unscheduled(self, state, name):
+        """실패한 단계의 후속 단계 중 아직 제출되지 않은 것의 개수 (중복 없이 한 번만 셉니다)."""
+        cancelled = 0
+        stack = list(self.dependents[name])
+        while stack:
+            child = stack.pop()
+            if state.waiting[child] < 0:
+                continue
+            state.waiting[child] = -1
+            cancelled += 1
+            stack.extend(self.dependents[child])
+        return cancelled
@@ -4,6 +4,9 @@ import re
 import datetime # 시간 로깅을 위해 추가
 import subprocess # Streamlit 실행을 위해 추가
 import argparse # __main__ 블록에서 인자 파싱을 위해 argparse를 여기에도 import
+import threading
+from collections import deque
+import numpy as np
 
 # --- 디버깅 로그 함수 ---
 def log_message(message):
@@ -24,19 +27,21 @@ sys.path.append(FRAME_PATH)
 log_message(f"sys.path에 FRAME_PATH 추가: {FRAME_PATH}")
 
 log_message("Frame_Extraction import 시도")
-from Frame_Extraction import extract_frames
+from Frame_Extraction import DEDUP_THRESHOLD, FrameDeduplicator, dedup_frames, iter_frames, write_frames
 log_message("Frame_Extraction import 완료")
 
 log_message("CLIP_Similarity import 시도")
-from CLIP_Similarity import load_prompt, load_frames as load_clip_frames, compute_clip_similarity, save_results as save_clip_results
+from CLIP_Similarity import CLIP_MODEL_NAME, GROUNDING_MIN_COVERAGE, load_prompt, get_clip_scorer, grounding_coverage, save_grounding, save_results as save_clip_results
 log_message("CLIP_Similarity import 완료")
 
 log_message("YOLO_Detection import 시도")
-from YOLO_Detection import load_frames as load_yolo_frames, detect_objects, save_results as save_yolo_results
+from YOLO_Detection import load_model as load_yolo_model, detect_objects, save_results as save_yolo_results
 log_message("YOLO_Detection import 완료")
 
 log_message("Object_Comparison import 시도")
-from Object_Comparison import extract_keywords_from_prompt, load_yolo_results, compare_objects, save_results as save_comparison_results
+from Object_Comparison import extract_keywords_from_prompt, extract_keywords_batch, load_yolo_results, compare_objects, save_results as save_comparison_results
+from Label_Index import get_label_index
+from Object_Timeline import build_timeline, save_timeline, load_timeline
 log_message("Object_Comparison import 완료")
 
 log_message("Generate_Feedback_API import 시도")
@@ -47,11 +52,43 @@ log_message("Generate_Improved_prompt_API import 시도")
 from Generate_Improved_prompt_API import load_context as load_context_prompt, create_prompt, call_gpt as call_improved_gpt, save_output
 log_message("Generate_Improved_prompt_API import 완료")
 
+log_message("Result_Cache import 시도")
+from Result_Cache import get_result_cache, make_key, hash_file
+log_message("Result_Cache import 완료")
+
+log_message("Results_Store import 시도")
+from Results_Store import append_run
+log_message("Results_Store import 완료")
+
+from Stage_Profiler import StageProfiler, null_span
+
 log_message("모든 모듈 import 완료")
 
+# 한 번에 메모리에 올려 CLIP/YOLO에 넘기는 프레임 수 (긴 영상에서도 메모리 사용량 일정)
+FRAME_CHUNK_SIZE = 32
+
+
+def iter_frame_chunks(frames, chunk_size=FRAME_CHUNK_SIZE):
+    chunk = []
+    for frame in frames:
+        chunk.append(frame)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
 
-def run_pipeline(prompt_path, video_path, model_path="yolov8m.pt"):
-    log_message(f"run_pipeline 함수 시작. prompt_path='{prompt_path}', video_path='{video_path}'")
+
+def prepare_job(prompt_path, video_path, model_path="yolov8m.pt", save_frames=False, sampling=None, launch_dashboard=True, use_cache=True, dedup=True, trace=False):
+    """
+    결과 폴더를 만들고, 각 단계가 공유하는 경로/옵션을 담은 작업(job) 딕셔너리를 반환합니다.
+    sampling: Frame_Extraction.iter_frames에 전달할 샘플링 옵션 (예: {"mode": "uniform", "num_frames": 32})
+    use_cache: 입력 내용이 같은 단계는 Result_Cache에 저장된 결과를 재사용
+    dedup: 거의 같은 프레임은 대표 프레임만 CLIP/YOLO에 보내고 결과를 나머지 프레임에 복사
+    trace: 단계별 구간 JSONL(항상 기록)에 더해 Chrome trace 파일도 저장
+    """
+    sampling = {"frame_interval": 10, **(sampling or {})}
+    log_message(f"prepare_job 시작. prompt_path='{prompt_path}', video_path='{video_path}', save_frames={save_frames}, sampling={sampling}")
 
     prompt_filename = os.path.basename(prompt_path)
     log_message(f"prompt_filename: '{prompt_filename}'")
@@ -83,82 +120,419 @@ def run_pipeline(prompt_path, video_path, model_path="yolov8m.pt"):
     log_message(f"analysis_result_dir 생성 완료 (또는 이미 존재).")
 
     print(f"\n[INFO] 모든 결과는 '{main_output_dir}' 폴더 하위에 저장됩니다.")
-    log_message("기본 INFO 메시지 출력 완료")
-
-    print("\n[1️⃣] 프레임 추출 시작")
-    log_message(f"extract_frames 호출 직전. video_path='{video_path}', frame_output_dir='{frame_output_dir}'")
-    extract_frames(video_path, frame_output_dir, frame_interval=10)
-    log_message("extract_frames 호출 완료")
 
-    print("\n[2️⃣] CLIP 유사도 분석 시작")
-    # (이하 CLIP, YOLO, 객체 비교, GPT 피드백, GPT 개선 프롬프트 생성 로직은 이전과 동일)
-    # ... (모든 분석 및 파일 저장 로직) ...
-    prompt = load_prompt(prompt_path)
-    clip_frame_paths = load_clip_frames(frame_output_dir)
-    clip_scores = compute_clip_similarity(prompt, clip_frame_paths, device="cuda")
-    clip_json_path = os.path.join(analysis_result_dir, f"{video_name_for_files}_clip.json")
-    clip_plot_path = os.path.join(analysis_result_dir, f"{video_name_for_files}_clip_plot.png")
-    save_clip_results(clip_scores, clip_json_path, clip_plot_path)
+    def result_path(suffix):
+        return os.path.join(analysis_result_dir, f"{video_name_for_files}_{suffix}")
+
+    profile_path = result_path("profile.jsonl")
+    trace_path = result_path("trace.json")
+    return {
+        "prompt_path": prompt_path,
+        "video_path": video_path,
+        "model_path": model_path,
+        "save_frames": save_frames,
+        "sampling": sampling,
+        "launch_dashboard": launch_dashboard,
+        "use_cache": use_cache,
+        "dedup_threshold": DEDUP_THRESHOLD if dedup else None,
+        # 프레임은 영상 바이트 + 샘플링 옵션으로 식별 (CLIP/YOLO 캐시 키의 입력)
+        "frames_key": make_key("frames", video=hash_file(video_path), sampling=sampling) if use_cache else None,
+        "project_base_path": project_base_path,
+        "video_name": video_name_for_files,
+        "frame_output_dir": frame_output_dir,
+        "analysis_result_dir": analysis_result_dir,
+        "clip_json_path": result_path("clip.json"),
+        "clip_embeddings_path": result_path("clip_embeddings.npy"),
+        "grounding_path": result_path("grounding.npz"),
+        "yolo_json_path": result_path("yolo.json"),
+        "timeline_path": result_path("object_timeline.npz"),
+        "comparison_path": result_path("object_comparison.json"),
+        "feedback_path": result_path("feedback_gpt.txt"),
+        "improved_prompt_path": result_path("feedback_and_revised_prompt.txt"),
+        "profile_path": profile_path,
+        "trace_path": trace_path if trace else None,
+        # 단계별 시간/메모리/처리량 기록 (스케줄러의 여러 스레드에서 공유)
+        "profiler": StageProfiler(profile_path, trace_path if trace else None),
+    }
+
+
+# --- 단계별 결과 캐시 ---
+# 키는 입력 내용의 해시: 프레임 = 영상 바이트 + 샘플링, CLIP/YOLO = 프레임 + 모델 (+ 프롬프트),
+# GPT = 정규화한 요청 텍스트. 입력이 바뀐 단계만 다시 계산됩니다.
+
+def cached(job, key, compute):
+    if not job["use_cache"]:
+        return compute()
+    return get_result_cache().get_or_compute(key, compute)
+
+
+def clip_cache_key(job, prompt):
+    # record_fields: 레코드 형식이 바뀌면 예전 캐시 항목을 재사용하지 않도록 키에 포함
+    return make_key("clip", frames=job["frames_key"], model=CLIP_MODEL_NAME, prompt=prompt, dedup=job["dedup_threshold"],
+                    record_fields="frame,score,frame_index,timestamp")
+
+
+def clip_embeddings_key(job):
+    return make_key("clip_embeddings", frames=job["frames_key"], model=CLIP_MODEL_NAME, dedup=job["dedup_threshold"])
+
+
+def yolo_cache_key(job):
+    model_path = job["model_path"]
+    weights = hash_file(model_path) if os.path.exists(model_path) else model_path
+    return make_key("yolo", frames=job["frames_key"], model=weights, dedup=job["dedup_threshold"],
+                    record_fields="frame,objects,cls,conf,area,frame_index,timestamp")
+
+
+def analysis_keys(job, prompt):
+    return clip_cache_key(job, prompt), clip_embeddings_key(job), yolo_cache_key(job)
+
+
+def analysis_cached(job, prompt):
+    """프레임이 필요한 결과(CLIP 점수/임베딩, YOLO)가 모두 캐시에 있는지. 힌트일 뿐이므로 값은 load_cached_analysis로 읽습니다."""
+    if not job["use_cache"]:
+        return False
+    cache = get_result_cache()
+    return all(key in cache for key in analysis_keys(job, prompt))
+
+
+def load_cached_analysis(job, prompt):
+    """캐시된 (CLIP 점수, CLIP 임베딩, YOLO 결과). 하나라도 없으면 None → 다시 계산."""
+    if not job["use_cache"]:
+        return None
+    return get_result_cache().get_many(analysis_keys(job, prompt))
+
+
+def gpt_cache_key(stage, request_text):
+    canonical = "\n".join(line.rstrip() for line in request_text.strip().splitlines())
+    return make_key("gpt", stage=stage, request=canonical)
+
+
+def profiled(job, stage, frames=None):
+    """단계 구간을 기록하는 컨텍스트 매니저. 블록 안에서 span.frames에 처리한 프레임 수를 넣습니다."""
+    profiler = job.get("profiler")
+    return profiler.span(stage, frames) if profiler is not None else null_span(stage, frames)
+
+
+# --- 파이프라인 단계 ---
+# 각 단계 함수는 (job, **의존 단계 출력)을 받아 자신의 출력을 반환합니다.
+# run_pipeline은 이를 순서대로, pipeline_scheduler는 DAG로 병렬 실행합니다.
+
+def open_frame_stream(job):
+    # 프레임은 디스크를 거치지 않고 디코딩 즉시 CLIP/YOLO로 전달됩니다.
+    # JPEG 저장은 save_frames=True일 때만 수행하는 선택적 sink입니다.
+    frames = iter_frames(job["video_path"], **job["sampling"])
+    if job["save_frames"]:
+        log_message(f"프레임 JPEG 저장 활성화. frame_output_dir='{job['frame_output_dir']}'")
+        frames = write_frames(frames, job["frame_output_dir"])
+    return frames
+
+
+def stage_frames(job):
+    if job["use_cache"] and not job["save_frames"]:
+        # CLIP/YOLO 결과가 모두 캐시에 있으면 디코딩 자체를 건너뜀 (후속 단계는 frames=None을 받음)
+        if analysis_cached(job, load_prompt(job["prompt_path"])):
+            log_message("CLIP/YOLO 결과가 캐시에 있어 프레임 추출을 건너뜁니다.")
+            return None
+    # 원본 프레임은 너무 커서 캐시하지 않음 (영상에서 다시 디코딩)
+    print("\n[1️⃣] 프레임 추출 시작 (스트리밍)")
+    stream = FrameChunkStream(job, consumers=("clip", "yolo"))
+    stream.prefetch()  # GPU 단계가 다른 작업을 처리하는 동안 첫 청크들을 미리 디코딩
+    return stream
+
+
+class FrameChunkStream:
+    """
+    스케줄러 경로에서 frames 단계가 CLIP/YOLO 단계에 넘기는 프레임 스트림.
+    디코딩(+중복 제거)은 청크(FRAME_CHUNK_SIZE) 단위로 일어나고, 청크는 모든 소비 단계가 읽으면 해제됩니다.
+    앞선 소비 단계는 다른 소비 단계가 실행 중이면 max_buffered 청크보다 더 앞서 나가지 않습니다.
+    다른 소비 단계가 아직 워커를 기다리는 중이면 교착을 피하려고 기다리지 않고 청크를 쌓아 둡니다.
+    소비 단계는 chunks(name)로 읽고, 다 읽지 않고 끝낼 때(캐시 적중, 예외)는 반드시 close(name)를 호출합니다.
+    """
+
+    def __init__(self, job, consumers, chunk_size=FRAME_CHUNK_SIZE, max_buffered=2):
+        frames = open_frame_stream(job)
+        self.deduplicator = FrameDeduplicator(job["dedup_threshold"]) if job["dedup_threshold"] is not None else None
+        if self.deduplicator is not None:
+            frames = self.deduplicator.unique(frames)
+        self.max_buffered = max_buffered
+        self.num_frames = 0  # 지금까지 디코딩되어 모델로 가는 프레임 수 (중복 제거 후)
+        self._job = job
+        self._chunks = iter_frame_chunks(frames, chunk_size)
+        self._buffer = deque()  # 아직 모든 소비 단계가 읽지는 않은 청크
+        self._base = 0          # _buffer[0]의 청크 번호
+        self._position = {name: 0 for name in consumers}  # 소비 단계별 다음에 읽을 청크 번호
+        self._running = set()
+        self._decoding = False
+        self._exhausted = False
+        self._error = None
+        self._cond = threading.Condition()
+
+    def prefetch(self):
+        """소비 단계가 시작되기 전에 max_buffered 청크까지 미리 디코딩합니다."""
+        while True:
+            with self._cond:
+                if self._exhausted or self._decoding or len(self._buffer) >= self.max_buffered:
+                    return
+                self._decoding = True
+            self._decode_next()
+
+    def chunks(self, name):
+        """소비 단계 name이 읽을 청크를 순서대로 내놓습니다."""
+        with self._cond:
+            self._running.add(name)
+        try:
+            while True:
+                with self._cond:
+                    while True:
+                        index = self._position[name]
+                        if index < self._base + len(self._buffer):
+                            chunk = self._buffer[index - self._base]
+                            self._position[name] = index + 1
+                            self._release()
+                            break
+                        if self._error is not None:
+                            raise self._error
+                        if self._exhausted:
+                            return
+                        if not self._decoding and not self._too_far_ahead(name, index):
+                            self._decoding = True
+                            chunk = None
+                            break
+                        self._cond.wait()
+                if chunk is None:
+                    chunk = self._decode_next()
+                    if chunk is None:
+                        return
+                    with self._cond:
+                        self._position[name] += 1
+                        self._release()
+                yield chunk
+        finally:
+            self.close(name)
+
+    def close(self, name):
+        """소비 단계 name이 더 읽지 않음을 알립니다 (남은 청크는 이 단계를 기다리지 않고 해제)."""
+        with self._cond:
+            self._running.discard(name)
+            if self._position.pop(name, None) is not None:
+                self._release()
+                self._cond.notify_all()
+
+    def _too_far_ahead(self, name, index):
+        others = [self._position[other] for other in self._running if other != name]
+        return bool(others) and index - min(others) >= self.max_buffered
+
+    def _release(self):
+        lowest = min(self._position.values(), default=self._base + len(self._buffer))
+        while self._buffer and self._base < lowest:
+            self._buffer.popleft()
+            self._base += 1
+            self._cond.notify_all()
+
+    def _decode_next(self):
+        """_decoding을 잡은 스레드가 락 밖에서 다음 청크를 디코딩해 버퍼에 넣습니다. 끝이면 None."""
+        chunk = None
+        try:
+            with profiled(self._job, "frames") as span:
+                chunk = next(self._chunks, None)
+                span.frames = len(chunk) if chunk else 0
+        except Exception as e:
+            with self._cond:
+                self._error = e
+            raise
+        finally:
+            with self._cond:
+                self._decoding = False
+                if chunk is None:
+                    self._exhausted = True
+                    if self._error is None:
+                        log_message(f"프레임 추출 완료. 모델에 보낼 프레임 수: {self.num_frames}")
+                else:
+                    self._buffer.append(chunk)
+                    self.num_frames += len(chunk)
+                self._cond.notify_all()
+        return chunk
+
+
+def dedup_job_frames(job, frames):
+    """(모델에 보낼 프레임, 결과를 모든 프레임으로 펼칠 FrameDeduplicator 또는 None)"""
+    if job["dedup_threshold"] is None:
+        return frames, None
+    with profiled(job, "dedup", frames=len(frames)):
+        return dedup_frames(frames, job["dedup_threshold"])
+
+
+def expand_results(deduplicator, records):
+    return records if deduplicator is None else deduplicator.expand(records)
+
+
+def save_clip_stage(job, clip_scores, embeddings=None):
+    save_clip_results(clip_scores, job["clip_json_path"])
+    if embeddings is not None:
+        np.save(job["clip_embeddings_path"], embeddings)  # stage_ground가 이미지를 다시 인코딩하지 않도록
     log_message("CLIP 분석 및 저장 완료")
+    return clip_scores
 
-    print("\n[3️⃣] YOLO 객체 탐지 시작")
-    yolo_frame_paths = load_yolo_frames(frame_output_dir)
-    yolo_results = detect_objects(model_path, yolo_frame_paths, device="cuda")
-    yolo_json_path = os.path.join(analysis_result_dir, f"{video_name_for_files}_yolo.json")
-    save_yolo_results(yolo_results, yolo_json_path)
+
+def concat_embeddings(embedding_chunks):
+    return np.concatenate(embedding_chunks) if embedding_chunks else np.zeros((0, 0), dtype=np.float16)
+
+
+def stage_clip(job, frames):
+    try:
+        return _clip(job, frames)
+    finally:
+        if frames is not None:
+            frames.close("clip")  # 캐시 적중/실패로 청크를 다 읽지 않았어도 YOLO 단계가 기다리지 않도록
+
+
+def _clip(job, frames):
+    print("\n[2️⃣] CLIP 유사도 분석 시작")
+    prompt = load_prompt(job["prompt_path"])
+    cache = get_result_cache() if job["use_cache"] else None
+    clip_key, embeddings_key = clip_cache_key(job, prompt), clip_embeddings_key(job)
+    cached_clip = cache.get_many((clip_key, embeddings_key)) if cache is not None else None
+    if cached_clip is not None:
+        print(f"[♻️] 캐시 적중: {clip_key}")
+        clip_scores, embeddings = cached_clip
+    else:
+        stream = frames if frames is not None else FrameChunkStream(job, consumers=("clip",))
+        clip_scorer = get_clip_scorer(device="cuda")
+        clip_scores = []
+        embedding_chunks = []
+        for chunk in stream.chunks("clip"):
+            with profiled(job, "clip", frames=len(chunk)):
+                chunk_scores, chunk_embeddings = clip_scorer.score_frames(prompt, chunk, return_embeddings=True)
+            clip_scores.extend(chunk_scores)
+            embedding_chunks.append(chunk_embeddings)
+        embeddings = concat_embeddings(embedding_chunks)
+        if stream.deduplicator is not None:
+            clip_scores, embeddings = stream.deduplicator.expand(clip_scores), stream.deduplicator.expand_rows(embeddings)
+        if cache is not None:
+            cache.put(clip_key, clip_scores)
+            cache.put(embeddings_key, embeddings)
+    with profiled(job, "save", frames=len(clip_scores)):
+        return save_clip_stage(job, clip_scores, embeddings)
+
+
+def stage_ground(job, clip):
+    print("\n[🔎] 프롬프트 키워드 grounding (CLIP 프레임 임베딩 재사용)")
+    keywords = extract_keywords_from_prompt(load_prompt(job["prompt_path"]))
+    embeddings = np.load(job["clip_embeddings_path"])
+    with profiled(job, "ground", frames=len(embeddings)):
+        presence = get_clip_scorer(device="cuda").ground_keywords(keywords, embeddings)
+    save_grounding(keywords, presence, clip, job["grounding_path"])
+    log_message("키워드 grounding 완료")
+    return grounding_coverage(keywords, presence)
+
+
+def save_yolo_stage(job, yolo_results):
+    save_yolo_results(yolo_results, job["yolo_json_path"])
+    timeline = build_timeline(yolo_results, load_yolo_model(job["model_path"]).names)
+    save_timeline(timeline, job["timeline_path"])
     log_message("YOLO 탐지 및 저장 완료")
+    return yolo_results
+
+
+def stage_yolo(job, frames):
+    try:
+        return _yolo(job, frames)
+    finally:
+        if frames is not None:
+            frames.close("yolo")  # 캐시 적중/실패로 청크를 다 읽지 않았어도 CLIP 단계가 기다리지 않도록
+
 
+def _yolo(job, frames):
+    print("\n[3️⃣] YOLO 객체 탐지 시작")
+    def compute():
+        stream = frames if frames is not None else FrameChunkStream(job, consumers=("yolo",))
+        detections = []
+        for chunk in stream.chunks("yolo"):
+            with profiled(job, "yolo", frames=len(chunk)):
+                detections.extend(detect_objects(job["model_path"], chunk, device="cuda"))
+        return expand_results(stream.deduplicator, detections)
+    yolo_results = cached(job, yolo_cache_key(job), compute)
+    with profiled(job, "save", frames=len(yolo_results)):
+        return save_yolo_stage(job, yolo_results)
+
+
+def stage_compare(job, yolo, ground=None):
     print("\n[4️⃣] 객체 비교 수행")
-    with open(prompt_path, "r", encoding="utf-8") as f:
-        prompt_text = f.read()
-    prompt_objects = extract_keywords_from_prompt(prompt_text)
-    detected_objects = load_yolo_results(yolo_json_path)
-    comparison_result = compare_objects(prompt_objects, detected_objects)
-    comparison_path = os.path.join(analysis_result_dir, f"{video_name_for_files}_object_comparison.json")
-    save_comparison_results(comparison_result, comparison_path)
+    with profiled(job, "compare"):
+        comparison_result = _compare(job, yolo, ground)
+    save_comparison_results(comparison_result, job["comparison_path"])
     log_message("객체 비교 및 저장 완료")
+    return comparison_result
+
 
+def _compare(job, yolo, ground):
+    with open(job["prompt_path"], "r", encoding="utf-8") as f:
+        prompt_text = f.read()
+    prompt_objects = extract_keywords_from_prompt(prompt_text)
+    detected_objects = load_yolo_results(job["yolo_json_path"])
+    # 검출기 라벨 어휘별 인덱스는 한 번 만들어 프로세스/실행 간에 재사용
+    label_index = get_label_index(load_yolo_model(job["model_path"]).names.values())
+    comparison_result = compare_objects(prompt_objects, detected_objects, label_index)
+    if os.path.exists(job["timeline_path"]):
+        # 객체별로 전체 프레임 중 몇 %에 등장했는지 (GPT 피드백/대시보드용)
+        timeline = load_timeline(job["timeline_path"])
+        comparison_result["object_coverage"] = {
+            str(name): round(float(coverage), 4) for name, coverage in zip(timeline["class_names"], timeline["coverage"])
+        }
+    if ground is not None:
+        # 검출기 라벨에 없는 명사는 CLIP grounding으로 등장 여부를 판단
+        # (충분한 프레임에서 보이면 등장, 아니면 누락으로 이동. grounding하지 못한 명사만 unrecognized로 남음)
+        comparison_result["grounded_objects"] = ground
+        unrecognized = comparison_result["unrecognized_objects"]
+        grounded = [keyword for keyword in unrecognized if keyword in ground and ground[keyword] >= GROUNDING_MIN_COVERAGE]
+        absent = [keyword for keyword in unrecognized if keyword in ground and ground[keyword] < GROUNDING_MIN_COVERAGE]
+        comparison_result["unrecognized_objects"] = [keyword for keyword in unrecognized if keyword not in ground]
+        comparison_result["appeared_objects"] = sorted(comparison_result["appeared_objects"] + grounded)
+        comparison_result["missing_objects"] = sorted(comparison_result["missing_objects"] + absent)
+    return comparison_result
+
+
+def stage_feedback(job, compare):
     print("\n[5️⃣] GPT 피드백 생성")
-    context = load_context_feedback(comparison_path)
-    feedback_prompt_text = generate_prompt(context) # generate_prompt 함수는 feedback_prompt로 이름을 변경했었는지 확인 필요
-    feedback = call_feedback_gpt(feedback_prompt_text)
-    feedback_path = os.path.join(analysis_result_dir, f"{video_name_for_files}_feedback_gpt.txt")
-    save_feedback(feedback, feedback_path)
+    context = load_context_feedback(job["comparison_path"])
+    feedback_prompt_text = generate_prompt(context)
+    with profiled(job, "feedback"):
+        feedback = cached(job, gpt_cache_key("feedback", feedback_prompt_text), lambda: call_feedback_gpt(feedback_prompt_text))
+    save_feedback(feedback, job["feedback_path"])
     log_message("GPT 피드백 생성 및 저장 완료")
+    return feedback
+
 
+def stage_improve(job, compare):
     print("\n[6️⃣] GPT 개선 프롬프트 생성")
-    prompt_context = load_context_prompt(prompt_path, comparison_path)
-    improved_prompt_text_for_gpt = create_prompt(prompt_context) # create_prompt 함수는 improved_prompt_text로 이름을 변경했었는지 확인 필요
-    improved_prompt_output = call_improved_gpt(improved_prompt_text_for_gpt)
-    improved_prompt_path = os.path.join(analysis_result_dir, f"{video_name_for_files}_feedback_and_revised_prompt.txt")
-    save_output(improved_prompt_output, improved_prompt_path)
+    prompt_context = load_context_prompt(job["prompt_path"], job["comparison_path"])
+    improved_prompt_text_for_gpt = create_prompt(prompt_context)
+    with profiled(job, "improve"):
+        improved_prompt_output = cached(job, gpt_cache_key("improve", improved_prompt_text_for_gpt),
+                                        lambda: call_improved_gpt(improved_prompt_text_for_gpt))
+    save_output(improved_prompt_output, job["improved_prompt_path"])
     log_message("GPT 개선 프롬프트 생성 및 저장 완료")
-    
-    print("\n[✅] 전체 분석 파이프라인 완료!")
-    log_message("run_pipeline 함수 내 분석 로직 정상 종료")
+    return improved_prompt_output
 
-    #  streamlit_app.py의 절대 경로 (run_pipeline.py와 같은 디렉토리에 있다고 가정)
-    streamlit_app_script_path = os.path.join(project_base_path, "streamlit_app.py")
 
-    # Streamlit 앱 실행에 필요한 인자들을 절대 경로로 변환
-    abs_analysis_result_dir = os.path.abspath(analysis_result_dir)
-    abs_prompt_path = os.path.abspath(prompt_path)
-    abs_video_path = os.path.abspath(video_path)
+def launch_dashboard(job):
+    #  streamlit_app.py의 절대 경로 (run_pipeline.py와 같은 디렉토리에 있다고 가정)
+    streamlit_app_script_path = os.path.join(job["project_base_path"], "streamlit_app.py")
 
-    # Streamlit 실행 명령어 구성
+    # Streamlit 실행 명령어 구성 (인자는 모두 절대 경로)
     # sys.executable은 현재 파이썬 인터프리터를 사용하도록 합니다.
     streamlit_command = [
         sys.executable, "-m", "streamlit", "run", streamlit_app_script_path,
         "--", # Streamlit 자체 인자와 스크립트 인자 구분
-        "--results_dir", abs_analysis_result_dir,
-        "--prompt_file_path", abs_prompt_path,
-        "--video_file_path", abs_video_path,
-        "--video_name", video_name_for_files # 프롬프트 파일명이 아닌, 비디오 파일에서 추출한 이름 사용
+        "--results_dir", os.path.abspath(job["analysis_result_dir"]),
+        "--prompt_file_path", os.path.abspath(job["prompt_path"]),
+        "--video_file_path", os.path.abspath(job["video_path"]),
+        "--video_name", job["video_name"] # 프롬프트 파일명이 아닌, 비디오 파일에서 추출한 이름 사용
     ]
 
     print(f"\n[🚀] Streamlit 대시보드 실행: {' '.join(streamlit_command)}")
     log_message(f"Streamlit 앱 실행 시도: {' '.join(streamlit_command)}")
-    
+
     # Popen을 사용하여 Streamlit을 백그라운드에서 실행 (run_pipeline.py 종료 후에도 유지)
     try:
         subprocess.Popen(streamlit_command)
@@ -172,6 +546,116 @@ def run_pipeline(prompt_path, video_path, model_path="yolov8m.pt"):
         print(f"[ERROR] Streamlit 실행 중 오류 발생: {e}")
 
 
+def stage_store(job, clip, yolo, compare, feedback=None, improve=None):
+    """
+    실행 요약, 프레임별 결과, 단계별 프로파일 요약을 컬럼형 결과 저장소(Results_Store)에 한 번에 추가합니다.
+    저장 단계 자체는 요약에 들어가지 않고 JSONL/trace에만 기록됩니다.
+    """
+    with open(job["prompt_path"], "r", encoding="utf-8") as f:
+        prompt_text = f.read().strip()
+    run = {
+        "prompt_path": os.path.abspath(job["prompt_path"]),
+        "video_path": os.path.abspath(job["video_path"]),
+        "video_name": job["video_name"],
+        "prompt_text": prompt_text,
+        "model_path": job["model_path"],
+        "prompt_objects": compare.get("prompt_objects"),
+        "detected_objects": compare.get("detected_objects"),
+        "appeared_objects": compare.get("appeared_objects"),
+        "missing_objects": compare.get("missing_objects"),
+        "feedback": feedback,
+        "improved_prompt": improve,
+    }
+    profiler = job.get("profiler")
+    with profiled(job, "store", frames=len(clip)):
+        run_id = append_run(run, clip, yolo, stages=profiler.summary() if profiler is not None else None)
+    log_message(f"결과 저장소에 실행 추가 완료. run_id={run_id}")
+    if profiler is not None:
+        log_profile(profiler)
+        profiler.write_trace()
+    return run_id
+
+
+def log_profile(profiler):
+    for stage in profiler.summary():
+        fps = f", {stage['fps']:.1f} frames/s" if stage["fps"] else ""
+        log_message(f"[PROFILE] {stage['stage']}: wall {stage['wall_s']:.2f}s, cpu {stage['cpu_s']:.2f}s{fps}")
+
+
+def stage_dashboard(job, feedback, improve):
+    print("\n[✅] 전체 분석 파이프라인 완료!")
+    if job["launch_dashboard"]:
+        launch_dashboard(job)
+
+
+def run_pipeline(prompt_path, video_path, model_path="yolov8m.pt", save_frames=False, sampling=None, launch_dashboard=True, use_cache=True, dedup=True, trace=False):
+    log_message(f"run_pipeline 함수 시작. prompt_path='{prompt_path}', video_path='{video_path}'")
+    job = prepare_job(prompt_path, video_path, model_path=model_path, save_frames=save_frames,
+                      sampling=sampling, launch_dashboard=launch_dashboard, use_cache=use_cache, dedup=dedup, trace=trace)
+
+    prompt = load_prompt(prompt_path)
+    cache = get_result_cache() if use_cache else None
+    clip_key = clip_cache_key(job, prompt) if use_cache else None
+    embeddings_key = clip_embeddings_key(job) if use_cache else None
+    yolo_key = yolo_cache_key(job) if use_cache else None
+
+    cached_analysis = load_cached_analysis(job, prompt) if not save_frames else None
+    if cached_analysis is not None:
+        print("\n[♻️] 프레임/CLIP/YOLO 결과를 캐시에서 불러옵니다.")
+        clip_scores, embeddings, yolo_results = cached_analysis
+    else:
+        # 단일 실행에서는 프레임 전체를 메모리에 올리지 않고 청크 단위로 CLIP/YOLO에 흘려보냅니다.
+        print("\n[1️⃣] 프레임 추출 및 [2️⃣] CLIP 유사도 / [3️⃣] YOLO 객체 탐지 시작 (스트리밍)")
+        with profiled(job, "load_models"):
+            clip_scorer = get_clip_scorer(device="cuda")  # 프로세스 안에서 한 번만 로드되어 실행 간에 재사용
+            load_yolo_model(model_path)  # 프로세스 안에서 한 번만 로드되어 실행 간에 재사용
+        log_message("CLIP/YOLO 모델 로드 완료")
+
+        clip_scores = []
+        embedding_chunks = []
+        yolo_results = []
+        # 중복 제거는 스트림 전체에 걸쳐 적용: 대표 프레임만 청크로 묶여 모델에 들어감
+        frames = open_frame_stream(job)
+        deduplicator = FrameDeduplicator(job["dedup_threshold"]) if job["dedup_threshold"] is not None else None
+        if deduplicator is not None:
+            frames = deduplicator.unique(frames)
+        # 디코딩은 청크를 꺼낼 때 일어나므로 청크마다 frames/clip/yolo 구간을 따로 기록
+        chunks = iter_frame_chunks(frames)
+        while True:
+            with profiled(job, "frames") as span:
+                chunk = next(chunks, None)
+                span.frames = len(chunk) if chunk else 0
+            if chunk is None:
+                break
+            with profiled(job, "clip", frames=len(chunk)):
+                chunk_scores, chunk_embeddings = clip_scorer.score_frames(prompt, chunk, return_embeddings=True)
+            clip_scores.extend(chunk_scores)
+            embedding_chunks.append(chunk_embeddings)
+            with profiled(job, "yolo", frames=len(chunk)):
+                yolo_results.extend(detect_objects(model_path, chunk, device="cuda"))
+        embeddings = concat_embeddings(embedding_chunks)
+        if deduplicator is not None:
+            log_message(f"중복 제거: 프레임 {len(deduplicator.members)}장 중 {deduplicator.num_representatives}장만 추론")
+            clip_scores, embeddings = deduplicator.expand(clip_scores), deduplicator.expand_rows(embeddings)
+            yolo_results = deduplicator.expand(yolo_results)
+        log_message(f"프레임 스트리밍 분석 완료. 프레임 수: {len(clip_scores)}")
+        if cache is not None:
+            cache.put(clip_key, clip_scores)
+            cache.put(embeddings_key, embeddings)
+            cache.put(yolo_key, yolo_results)
+
+    with profiled(job, "save", frames=len(clip_scores)):
+        save_clip_stage(job, clip_scores, embeddings)
+        yolo = save_yolo_stage(job, yolo_results)
+    ground = stage_ground(job, clip_scores)
+    compare = stage_compare(job, yolo, ground)
+    feedback = stage_feedback(job, compare)
+    improve = stage_improve(job, compare)
+    stage_store(job, clip_scores, yolo, compare, feedback, improve)
+    log_message("run_pipeline 함수 내 분석 로직 정상 종료")
+    stage_dashboard(job, feedback, improve)
+
+
 if __name__ == "__main__":
     log_message("스크립트의 __main__ 진입점 실행됨")
     # argparse는 이미 위에 import 되어 있음
@@ -180,12 +664,28 @@ if __name__ == "__main__":
     parser.add_argument("--prompt", required=True, help="Path to the prompt text file.")
     parser.add_argument("--video", required=True, help="Path to the video file.")
     parser.add_argument("--model", default="yolov8m.pt", help="Path to the YOLO model (e.g., yolov8m.pt).")
+    parser.add_argument("--save_frames", action="store_true", help="Also write sampled frames as JPEG files under data/<run>/frames.")
+    parser.add_argument("--sampling_mode", default="interval", choices=["interval", "keyframe", "uniform", "fps", "scene"], help="Frame sampling mode.")
+    parser.add_argument("--frame_interval", type=int, default=10, help="Keep every N-th frame (interval mode).")
+    parser.add_argument("--num_frames", type=int, help="Number of uniformly spaced frames (uniform mode).")
+    parser.add_argument("--target_fps", type=float, help="Frames per second to sample (fps mode).")
+    parser.add_argument("--scene_threshold", type=float, help="Perceptual-hash distance (0-1) that counts as a content change (scene mode).")
+    parser.add_argument("--min_spacing", type=int, help="Minimum frames between sampled frames (scene mode).")
+    parser.add_argument("--max_spacing", type=int, help="Maximum frames between sampled frames, even in static shots (scene mode).")
+    parser.add_argument("--no_cache", action="store_true", help="Recompute every stage instead of reusing cached results.")
+    parser.add_argument("--no_dedup", action="store_true", help="Run CLIP/YOLO on every sampled frame instead of one per group of near-duplicates.")
+    parser.add_argument("--no_dashboard", action="store_true", help="Do not launch the Streamlit dashboard after the analysis.")
+    parser.add_argument("--trace", action="store_true", help="Also write a Chrome trace (<video>_trace.json) of the per-stage spans.")
     
     args = parser.parse_args()
     log_message(f"커맨드 라인 인자 파싱 완료. Args: prompt='{args.prompt}', video='{args.video}', model='{args.model}'")
 
     try:
-        run_pipeline(args.prompt, args.video, model_path=args.model)
+        sampling = {"mode": args.sampling_mode, "frame_interval": args.frame_interval,
+                    "num_frames": args.num_frames, "target_fps": args.target_fps, "scene_threshold": args.scene_threshold,
+                    "min_spacing": args.min_spacing, "max_spacing": args.max_spacing}
+        run_pipeline(args.prompt, args.video, model_path=args.model, save_frames=args.save_frames, sampling=sampling, use_cache=not args.no_cache,
+                     launch_dashboard=not args.no_dashboard, dedup=not args.no_dedup, trace=args.trace)
         log_message("run_pipeline 함수 실행 완료 (메인 블록)")
     except Exception as e:
         log_message(f"run_pipeline 함수 실행 중 예외 발생 (메인 블록): {e}")
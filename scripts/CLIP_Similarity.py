@@ -1,113 +1,242 @@
 import os
+import torch
+from PIL import Image
+from transformers import CLIPProcessor, CLIPModel
+from tqdm import tqdm
 import json
-from openai import OpenAI
-from dotenv import load_dotenv
+import threading
+import numpy as np
 
-# CLIP 토큰 제한 (참고용)
-CLIP_TOKEN_LIMIT = 77
-# GPT에게 개선된 프롬프트 생성 시 요청할 목표 토큰 수 (CLIP_TOKEN_LIMIT보다 약간 작게 설정)
-TARGET_TOKEN_LIMIT_FOR_GPT_OUTPUT = 75
+CLIP_MODEL_NAME = "openai/clip-vit-base-patch32"
 
-def load_context(prompt_path: str, comparison_path: str) -> dict:
-    """
-    원본 프롬프트와 객체 비교 분석 결과를 로드하여 컨텍스트 딕셔너리를 생성합니다.
-    """
+def load_prompt(prompt_path: str) -> str:
     with open(prompt_path, "r", encoding="utf-8") as f:
-        prompt_text = f.read().strip()
-
-    with open(comparison_path, "r", encoding="utf-8") as f:
-        comparison_data = json.load(f)
-
-    return {
-        "prompt": prompt_text,
-        "missing_objects": comparison_data.get("missing_objects", []),
-        "appeared_objects": comparison_data.get("appeared_objects", []),
-        "detected_objects": comparison_data.get("detected_objects", []), # YOLO가 탐지한 모든 객체 리스트
-        "prompt_objects": comparison_data.get("prompt_objects", [])     # 프롬프트에서 추출된 명사 키워드
-    }
-
-def create_prompt(context: dict) -> str:
+        return f.read().strip()
+
+def load_frames(frame_dir: str) -> list:
+    frame_paths = sorted([
+        os.path.join(frame_dir, fname)
+        for fname in os.listdir(frame_dir)
+        if fname.endswith(".jpg")
+    ])
+    return frame_paths
+
+# torch_dtype 문자열 별칭 ("fp16"/"bf16"/"fp32")
+DTYPE_ALIASES = {"fp16": torch.float16, "bf16": torch.bfloat16, "fp32": torch.float32}
+DEFAULT_BATCH_SIZE = 32
+TEXT_CACHE_SIZE = 256
+
+# 키워드 grounding: "a photo of a {키워드}." 와 중립 문장 "a photo." 의 2-클래스 zero-shot 확률을 프레임별 등장 점수로 씁니다.
+GROUNDING_TEMPLATE = "a photo of a {}."
+GROUNDING_BASELINE = "a photo."
+GROUNDING_THRESHOLD = 0.5      # 프레임에 키워드가 있다고 볼 등장 점수
+GROUNDING_MIN_COVERAGE = 0.1   # 이 비율 이상의 프레임에 있으면 영상에 등장한 것으로 판단
+
+def _to_pil_image(frame) -> Image.Image:
+    # 경로(str) 또는 Frame_Extraction.FrameData(BGR numpy 배열) 모두 허용
+    if isinstance(frame, str):
+        return Image.open(frame).convert("RGB")
+    return Image.fromarray(frame.image[:, :, ::-1])
+
+def _frame_name(frame) -> str:
+    if isinstance(frame, str):
+        return os.path.basename(frame)
+    return frame.name
+
+def _score_record(frame, value: float) -> dict:
+    # FrameData면 원본 프레임 번호/재생 위치도 함께 남겨 대시보드가 시간 축으로 그릴 수 있게 합니다.
+    record = {"frame": _frame_name(frame), "score": round(value, 4)}
+    if not isinstance(frame, str):
+        record["frame_index"] = int(frame.index)
+        record["timestamp"] = round(float(frame.timestamp), 4)
+    return record
+
+class CLIPScorer:
     """
-    GPT에게 전달할 전체 지시사항(프롬프트)을 생성합니다.
-    개선된 프롬프트 생성 시 토큰 수 제한 지침을 포함합니다.
+    한 번 로드한 CLIP 모델로 여러 실행에 걸쳐 프레임을 채점합니다.
+    프롬프트 텍스트 임베딩은 캐시되고, 이미지는 batch_size 단위로 묶어서 추론합니다.
     """
-    original_prompt = context["prompt"]
-    prompt_objects_str = ", ".join(context["prompt_objects"]) if context["prompt_objects"] else "None"
-    # detected_objects_str = ", ".join(context["detected_objects"]) if context["detected_objects"] else "None" # 이 정보는 때로 너무 길 수 있음
-    missing_objects_str = ", ".join(context["missing_objects"]) if context["missing_objects"] else "None"
-
-    # GPT에게 전달할 지시사항에 토큰 수 제한 내용을 명시적으로 추가
-    token_constraint_instruction = f"IMPORTANT: The 'improved version of the prompt' (task 2) itself must be concise and result in **fewer than {TARGET_TOKEN_LIMIT_FOR_GPT_OUTPUT} tokens** when tokenized by OpenAI's CLIP model (which has a hard limit of {CLIP_TOKEN_LIMIT} tokens). Focus on critical visual details for the improved prompt and avoid unnecessary verbosity. Output only the prompt text for this part."
-
-    # 누락된 객체와 프롬프트 내 객체 정보를 활용하여 GPT에게 더 명확한 지시 제공
-    # detected_objects_str 대신 appeared_objects를 사용하는 것이 피드백에 더 적절할 수 있음
-    appeared_objects_str = ", ".join(context["appeared_objects"]) if context["appeared_objects"] else "None"
-
-
-    return f"""
-You are an expert AI assistant specializing in improving prompts for video generation.
-Based on the analysis of a previously generated video, your task is to provide feedback and a refined prompt.
 
-Original User Prompt:
-"{original_prompt}"
-
-Analysis:
-- Objects mentioned in the original prompt: {prompt_objects_str}
-- Objects that appeared in the video: {appeared_objects_str}
-- Objects from the prompt that were missing in the video: {missing_objects_str}
-
-Please perform the following tasks:
-
-1.  Provide concise, natural-language feedback to the user. Explain which key objects from their prompt were missing in the generated video and suggest potential reasons why they might not have appeared (e.g., ambiguity in the prompt, complexity, model limitations).
-2.  Then, suggest an "Improved Prompt:". This improved prompt should aim to address the issues, be clearer, more descriptive for visual elements, and increase the likelihood of all desired objects appearing in the video.
-    {token_constraint_instruction}
-
-Return your response structured with clear headings for "Feedback:" and "Improved Prompt:".
-""".strip()
-
-def call_gpt(full_prompt_for_gpt: str) -> str:
-    """
-    OpenAI GPT 모델을 호출하여 응답을 반환합니다.
-    """
-    load_dotenv() # .env 파일에서 환경 변수 로드
-    api_key = os.getenv("OPENAI_API_KEY")
-
-    if not api_key:
-        error_message = "[WARNING] OpenAI API Key not found in .env file. GPT-based prompt improvement cannot proceed."
-        print(error_message)
-        # API 키가 없을 경우, 사용자에게 안내할 수 있는 기본 텍스트 반환
-        return "Feedback:\nCould not generate feedback because the OpenAI API Key is not configured. Please check your .env file.\n\nImproved Prompt:\nN/A"
-
-    client = OpenAI(api_key=api_key)
-
-    try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo", # 필요에 따라 "gpt-4" 등으로 변경 가능
-            messages=[
-                {"role": "system", "content": "You are an expert assistant for analyzing and improving video generation prompts. You provide structured feedback and a revised prompt according to user instructions, including any specified length or token constraints for the revised prompt."},
-                {"role": "user", "content": full_prompt_for_gpt}
-            ],
-            temperature=0.6, # 약간의 창의성을 허용하되, 너무 벗어나지 않도록 조절
-            max_tokens=600  # GPT 응답의 전체 최대 길이 (피드백 + 개선된 프롬프트)
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        error_message = f"[ERROR] Error calling OpenAI API: {e}"
-        print(error_message)
-        return f"Feedback:\nAn error occurred while communicating with the OpenAI API: {e}\n\nImproved Prompt:\nN/A"
-
-def save_output(text_to_save: str, output_file_path: str):
-    """
-    주어진 텍스트를 지정된 경로에 파일로 저장합니다.
-    """
-    try:
-        os.makedirs(os.path.dirname(output_file_path), exist_ok=True) # 저장 경로의 디렉토리가 없으면 생성
-        with open(output_file_path, "w", encoding="utf-8") as f:
-            f.write(text_to_save)
-        # 저장 완료 메시지는 run_pipeline.py의 log_message를 사용하거나 여기서 직접 출력 가능
-        # print(f"[✅] 개선된 피드백 및 프롬프트 저장 완료 → {output_file_path}") # run_pipeline.py에서 로깅하므로 중복될 수 있음
-    except Exception as e:
-        print(f"[ERROR] Failed to save output to {output_file_path}: {e}")
-
-# 이 스크립트가 직접 실행될 때의 로직은 `run_pipeline.py`에서 모듈로 호출되므로 제거합니다.
-# 테스트나 개별 실행이 필요하다면 별도의 테스트 스크립트에서 이 모듈의 함수들을 호출하는 방식을 권장합니다.
\ No newline at end of file
+    def __init__(self, model_name: str = CLIP_MODEL_NAME, device: str = "cuda", dtype=None):
+        if device.startswith("cuda") and not torch.cuda.is_available():
+            print("[WARNING] CUDA를 사용할 수 없어 CLIP을 CPU에서 실행합니다.")
+            device = "cpu"
+        if dtype is None:
+            dtype = torch.float16 if device.startswith("cuda") else torch.float32
+        self.device = device
+        self.dtype = DTYPE_ALIASES.get(dtype, dtype)
+        self.model = CLIPModel.from_pretrained(model_name, torch_dtype=self.dtype).to(device).eval()
+        self.processor = CLIPProcessor.from_pretrained(model_name)
+        self.logit_scale = self.model.logit_scale.exp().float().item()
+        self._text_cache = {}
+
+    @torch.no_grad()
+    def encode_text(self, text: str) -> torch.Tensor:
+        """정규화된 텍스트 임베딩 (float32). 같은 텍스트는 한 번만 인코딩합니다."""
+        cached = self._text_cache.get(text)
+        if cached is not None:
+            return cached
+        inputs = self.processor(text=[text], return_tensors="pt", padding=True, truncation=True).to(self.device)
+        features = self.model.get_text_features(**inputs).float()
+        embedding = torch.nn.functional.normalize(features, dim=-1)[0]
+        if len(self._text_cache) >= TEXT_CACHE_SIZE:
+            self._text_cache.clear()
+        self._text_cache[text] = embedding
+        return embedding
+
+    @torch.no_grad()
+    def encode_texts(self, texts: list) -> torch.Tensor:
+        """여러 텍스트의 정규화된 임베딩 ([K, D]). 캐시에 없는 텍스트만 한 번에 인코딩합니다."""
+        # 캐시를 비워도 이번 호출에 필요한 임베딩은 남도록 지역 사전에서 결과를 만듦
+        found = {text: self._text_cache[text] for text in dict.fromkeys(texts) if text in self._text_cache}
+        missing = [text for text in dict.fromkeys(texts) if text not in found]
+        if missing:
+            inputs = self.processor(text=missing, return_tensors="pt", padding=True, truncation=True).to(self.device)
+            features = torch.nn.functional.normalize(self.model.get_text_features(**inputs).float(), dim=-1)
+            found.update(zip(missing, features))
+            if len(self._text_cache) + len(missing) > TEXT_CACHE_SIZE:
+                self._text_cache.clear()
+            self._text_cache.update(zip(missing, features))
+        return torch.stack([found[text] for text in texts])
+
+    @torch.no_grad()
+    def encode_images(self, frames: list) -> torch.Tensor:
+        """정규화된 이미지 임베딩 (float32, [N, D])."""
+        images = [_to_pil_image(frame) for frame in frames]
+        pixel_values = self.processor(images=images, return_tensors="pt")["pixel_values"]
+        pixel_values = pixel_values.to(self.device, dtype=self.dtype)
+        features = self.model.get_image_features(pixel_values=pixel_values).float()
+        return torch.nn.functional.normalize(features, dim=-1)
+
+    def score_frames(self, prompt: str, frames: list, batch_size: int = DEFAULT_BATCH_SIZE, return_embeddings: bool = False):
+        """
+        프레임별 {"frame", "score", "frame_index", "timestamp"} 레코드 (경로 입력이면 frame/score만).
+        score는 CLIPModel의 logits_per_image와 같은 척도입니다.
+        return_embeddings=True면 (레코드, 프레임 임베딩 [N, D] float16 numpy)를 반환합니다 (ground_keywords에서 재사용).
+        """
+        text_embedding = self.encode_text(prompt)
+        frames = list(frames)
+        scores = []
+        embeddings = []
+
+        for start in tqdm(range(0, len(frames), batch_size), desc="CLIP Similarity"):
+            batch = frames[start:start + batch_size]
+            image_embeddings = self.encode_images(batch)
+            similarity = self.logit_scale * (image_embeddings @ text_embedding)
+            for frame, value in zip(batch, similarity.tolist()):
+                scores.append(_score_record(frame, value))
+            if return_embeddings:
+                embeddings.append(image_embeddings.half().cpu())
+
+        if return_embeddings:
+            return scores, _stack_embeddings(embeddings)
+        return scores
+
+    def score_many(self, items: list, batch_size: int = DEFAULT_BATCH_SIZE, return_embeddings: bool = False) -> list:
+        """
+        여러 영상의 (prompt, frames)를 한꺼번에 채점합니다.
+        이미지 배치는 영상 경계와 무관하게 채워지므로 짧은 영상이 많아도 GPU 배치가 꽉 찹니다.
+        return_embeddings=True면 영상별 (레코드, 프레임 임베딩) 쌍의 리스트를 반환합니다.
+        """
+        flat = [(item_idx, frame) for item_idx, (_, frames) in enumerate(items) for frame in frames]
+        text_embeddings = [self.encode_text(prompt) for prompt, _ in items]
+        results = [[] for _ in items]
+        embeddings = [[] for _ in items]
+
+        for start in tqdm(range(0, len(flat), batch_size), desc="CLIP Similarity (batch)"):
+            batch = flat[start:start + batch_size]
+            image_embeddings = self.encode_images([frame for _, frame in batch])
+            for (item_idx, frame), embedding in zip(batch, image_embeddings):
+                value = self.logit_scale * float(embedding @ text_embeddings[item_idx])
+                results[item_idx].append(_score_record(frame, value))
+                if return_embeddings:
+                    embeddings[item_idx].append(embedding.half().cpu()[None])
+
+        if return_embeddings:
+            return [(scores, _stack_embeddings(item_embeddings)) for scores, item_embeddings in zip(results, embeddings)]
+        return results
+
+    @torch.no_grad()
+    def ground_keywords(self, keywords: list, image_embeddings) -> np.ndarray:
+        """
+        score_frames가 남긴 프레임 임베딩으로 키워드별·프레임별 등장 점수([K, N], 0~1)를 계산합니다.
+        이미지는 다시 인코딩하지 않고, 키워드 텍스트 임베딩은 encode_text 캐시를 공유합니다.
+        """
+        if not keywords or len(image_embeddings) == 0:
+            return np.zeros((len(keywords), len(image_embeddings)), dtype=np.float32)
+        texts = [GROUNDING_TEMPLATE.format(keyword) for keyword in keywords] + [GROUNDING_BASELINE]
+        text_embeddings = self.encode_texts(texts)
+        images = torch.as_tensor(np.asarray(image_embeddings), device=self.device).float()
+        logits = self.logit_scale * (images @ text_embeddings.T)  # [N, K + 1]
+        presence = torch.sigmoid(logits[:, :-1] - logits[:, -1:])  # 키워드 vs 중립 문장의 2-클래스 softmax
+        return presence.T.cpu().numpy().astype(np.float32)
+
+def _stack_embeddings(chunks: list) -> np.ndarray:
+    if not chunks:
+        return np.zeros((0, 0), dtype=np.float16)
+    return torch.cat(chunks).numpy()
+
+_SCORERS = {}
+_SCORERS_LOCK = threading.Lock()
+
+def get_clip_scorer(device: str = "cuda", dtype=None, model_name: str = CLIP_MODEL_NAME) -> CLIPScorer:
+    """프로세스 안에서 (model_name, device, dtype)별로 한 번만 모델을 로드합니다."""
+    key = (model_name, device, dtype)
+    with _SCORERS_LOCK:
+        if key not in _SCORERS:
+            _SCORERS[key] = CLIPScorer(model_name, device=device, dtype=dtype)
+        return _SCORERS[key]
+
+def compute_clip_similarity(prompt: str, frames: list, device: str = "cuda", batch_size: int = DEFAULT_BATCH_SIZE, dtype=None):
+    return get_clip_scorer(device, dtype).score_frames(prompt, frames, batch_size=batch_size)
+
+def grounding_coverage(keywords: list, presence: np.ndarray, threshold: float = GROUNDING_THRESHOLD) -> dict:
+    """키워드 → 등장 점수가 threshold 이상인 프레임 비율."""
+    if presence.shape[1] == 0:
+        return {keyword: 0.0 for keyword in keywords}
+    coverage = (presence >= threshold).mean(axis=1)
+    return {keyword: round(float(ratio), 4) for keyword, ratio in zip(keywords, coverage)}
+
+def save_grounding(keywords: list, presence: np.ndarray, scores: list, out_path: str):
+    """키워드별·프레임별 등장 점수를 배열로 저장합니다 (presence[k, n] = scores[n] 프레임의 keywords[k] 점수)."""
+    np.savez_compressed(
+        out_path,
+        keywords=np.array(keywords, dtype=str),
+        frames=np.array([record["frame"] for record in scores], dtype=str),
+        presence=presence.astype(np.float16),
+    )
+    print(f"[✅] 키워드 grounding 결과 저장 완료 → {out_path}")
+
+def save_results(scores, out_json_path, out_plot_path=None):
+    """점수 JSON을 저장합니다. 그래프는 대시보드가 JSON으로 직접 그리므로 out_plot_path를 줄 때만 PNG를 만듭니다."""
+    with open(out_json_path, "w", encoding="utf-8") as f:
+        json.dump(scores, f, indent=2)
+    if out_plot_path:
+        save_plot(scores, out_plot_path)
+
+def save_plot(scores, out_plot_path):
+    import matplotlib.pyplot as plt  # 독립 실행 시에만 필요하므로 지연 import
+
+    x = list(range(len(scores)))
+    y = [s["score"] for s in scores]
+    plt.figure(figsize=(10, 4))
+    plt.plot(x, y, marker="o")
+    plt.title("CLIP Similarity per Frame")
+    plt.xlabel("Frame Index")
+    plt.ylabel("Similarity Score")
+    plt.grid(True)
+    plt.savefig(out_plot_path)
+    plt.close()
+
+if __name__ == "__main__":
+    prompt_path = os.path.join("data", "prompts", "prompt1.txt")
+    frame_dir = os.path.join("data", "frames", "video1")
+    out_json = os.path.join("data", "analysis_results", "video1_clip.json")
+    out_plot = os.path.join("data", "analysis_results", "video1_clip_plot.png")
+    os.makedirs("data/analysis_results", exist_ok=True)
+
+    prompt = load_prompt(prompt_path)
+    frames = load_frames(frame_dir)
+    results = compute_clip_similarity(prompt, frames, device="cpu")
+    save_results(results, out_json, out_plot)
+    print("[✅] CLIP 분석 완료! → ", out_json, ", ", out_plot)
@@ -0,0 +1,54 @@
+import numpy as np
+
+# 긴 영상의 프레임별 점수를 대시보드에 그릴 때 점 개수를 줄이는 함수들.
+# 두 방법 모두 첫 점과 마지막 점은 항상 유지하고, 입력이 이미 충분히 작으면 그대로 반환합니다.
+
+
+def minmax_buckets(x, y, n_buckets: int):
+    """
+    x 순서대로 n_buckets개의 구간으로 나누어 구간별 (x 평균, y 최소, y 최대, y 평균)을 반환합니다.
+    선 하나로 줄이면 사라지는 급격한 점수 하락/상승을 min~max 띠로 보여줄 때 씁니다.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if len(x) <= n_buckets:
+        return x, y, y, y
+    edges = np.linspace(0, len(x), n_buckets + 1).astype(np.int64)
+    starts = edges[:-1]
+    counts = np.diff(edges)
+    x_mean = np.add.reduceat(x, starts) / counts
+    y_min = np.minimum.reduceat(y, starts)
+    y_max = np.maximum.reduceat(y, starts)
+    y_mean = np.add.reduceat(y, starts) / counts
+    return x_mean, y_min, y_max, y_mean
+
+
+def lttb(x, y, n_out: int):
+    """
+    Largest-Triangle-Three-Buckets. 시각적 모양을 가장 잘 보존하는 n_out개 점의 인덱스를 반환합니다.
+    (Steinarsson, "Downsampling Time Series for Visual Representation", 2013)
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # 첫 점/마지막 점을 제외한 나머지를 n_out - 2개 구간으로 나눔
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    prev = 0
+    for bucket in range(n_out - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        # 다음 구간의 평균점 (마지막 구간이면 마지막 점)
+        next_start, next_end = end, edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x = x[next_start:next_end].mean()
+        next_y = y[next_start:next_end].mean()
+        # 이전 선택점-후보점-다음 평균점이 이루는 삼각형 넓이가 가장 큰 후보를 선택
+        area = np.abs((x[prev] - next_x) * (y[start:end] - y[prev]) - (x[prev] - x[start:end]) * (next_y - y[prev]))
+        prev = start + int(np.argmax(area))
+        selected[bucket + 1] = prev
+    return selected
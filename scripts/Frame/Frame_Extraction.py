@@ -1,52 +1,334 @@
 import cv2
 import os
 import datetime # 시간 로깅을 위해 추가
+from typing import Iterator, NamedTuple
+
+import numpy as np
+
+try:
+    import av  # PyAV: 키프레임만 디코딩하는 keyframe 모드에 사용 (없으면 interval 모드로 대체)
+except ImportError:
+    av = None
 
 # --- 디버깅 로그 함수 ---
 def log_message_fe(message):
     print(f"[{datetime.datetime.now()}] FRAME_EXTRACTION_DEBUG: {message}", flush=True)
 
-def extract_frames(full_video_path: str, output_dir_for_frames: str, frame_interval: int = 10):
-    log_message_fe(f"extract_frames 함수 시작. full_video_path='{full_video_path}', output_dir_for_frames='{output_dir_for_frames}'")
 
-    log_message_fe(f"os.makedirs 시도: '{output_dir_for_frames}'")
-    os.makedirs(output_dir_for_frames, exist_ok=True)
-    log_message_fe(f"os.makedirs 완료 (또는 이미 존재).")
+SAMPLING_MODES = ("interval", "keyframe", "timestamps", "uniform", "fps", "scene")
+
+# 다음 샘플까지의 간격이 이 값보다 크면 grab()으로 건너뛰는 대신 seek 합니다.
+# (seek은 가장 가까운 키프레임부터 다시 디코딩하므로 짧은 간격에서는 grab()이 더 쌉니다)
+SEEK_MIN_GAP = 30
+
+# scene 모드 기본값: 마지막으로 보낸 프레임과의 dHash 해밍 거리(0~1)가 임계값 이상이면 새 프레임을 보냅니다.
+# 간격은 항상 min_spacing 이상, max_spacing 이하 (프레임 단위) 로 유지합니다.
+SCENE_THRESHOLD = 0.2
+SCENE_MIN_SPACING = 3
+SCENE_MAX_SPACING = 60
+HASH_SIZE = 8
+
+# 중복 제거: 대표 프레임과의 dHash 거리가 이 값 이하이면 같은 프레임으로 보고 모델 결과를 공유합니다.
+DEDUP_THRESHOLD = 0.05
+
+
+class FrameData(NamedTuple):
+    """디코딩된 프레임 한 장. CLIP/YOLO 단계에 디스크를 거치지 않고 바로 전달됩니다."""
+    index: int          # 원본 영상 기준 프레임 번호
+    timestamp: float    # 초 단위 재생 위치
+    name: str           # 결과 JSON의 "frame" 값 (frame_0000.jpg 형식)
+    image: np.ndarray   # BGR (OpenCV 기본 채널 순서)
+
+
+def _iter_interval(cap, frame_interval: int):
+    # grab()은 디코딩만 하고 BGR 변환/복사는 retrieve()에서만 일어나므로
+    # 버려지는 프레임은 retrieve 비용을 내지 않습니다.
+    frame_idx = 0
+    while cap.grab():
+        if frame_idx % frame_interval == 0:
+            ret, frame = cap.retrieve()
+            if not ret:
+                log_message_fe(f"cap.retrieve() 실패. frame_idx={frame_idx}")
+                break
+            yield frame_idx, frame
+        frame_idx += 1
+
+
+def _iter_fps(cap, fps: float, target_fps: float):
+    # 원본 FPS가 목표 FPS의 정수배가 아니어도 누적 오차 없이 1/target_fps 초마다 한 장씩 선택
+    if fps <= 0:
+        log_message_fe("[경고] FPS 정보를 읽을 수 없어 모든 프레임을 사용합니다.")
+        yield from _iter_interval(cap, 1)
+        return
+    step = fps / target_fps
+    next_pick = 0.0
+    frame_idx = 0
+    while cap.grab():
+        if frame_idx >= next_pick - 1e-6:
+            ret, frame = cap.retrieve()
+            if not ret:
+                log_message_fe(f"cap.retrieve() 실패. frame_idx={frame_idx}")
+                break
+            yield frame_idx, frame
+            while next_pick <= frame_idx + 1e-6:
+                next_pick += step
+        frame_idx += 1
+
+
+def perceptual_hash(image: np.ndarray, hash_size: int = HASH_SIZE) -> np.ndarray:
+    """difference hash(dHash): 축소한 흑백 영상에서 가로로 이웃한 픽셀의 밝기 대소를 비트로 묶습니다 (packbits)."""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    return np.packbits(small[:, 1:] > small[:, :-1])
+
+
+def hash_distance(a: np.ndarray, b: np.ndarray) -> float:
+    """두 perceptual_hash 사이의 해밍 거리 (0 = 같음, 1 = 모든 비트가 다름)."""
+    return float(np.unpackbits(np.bitwise_xor(a, b)).sum()) / (len(a) * 8)
+
+
+def _iter_scene(cap, threshold: float, min_spacing: int, max_spacing: int):
+    # min_spacing 이전의 프레임은 grab()만 하고 해시도 계산하지 않으므로, 정적인 장면에서는
+    # max_spacing 간격으로만 프레임이 나가고 컷이 잦은 구간에서는 최대 min_spacing 간격까지 촘촘해집니다.
+    last_idx, last_hash = None, None
+    frame_idx = 0
+    while cap.grab():
+        gap = frame_idx - last_idx if last_idx is not None else None
+        if gap is None or gap >= min_spacing:
+            ret, frame = cap.retrieve()
+            if not ret:
+                log_message_fe(f"cap.retrieve() 실패. frame_idx={frame_idx}")
+                break
+            frame_hash = perceptual_hash(frame)
+            if gap is None or gap >= max_spacing or hash_distance(frame_hash, last_hash) >= threshold:
+                yield frame_idx, frame
+                last_idx, last_hash = frame_idx, frame_hash
+        frame_idx += 1
+
+
+def _iter_indices(cap, indices):
+    """정렬된 프레임 번호 목록만 디코딩합니다. 간격이 멀면 seek, 가까우면 grab()으로 이동."""
+    position = 0  # 다음 grab()이 읽을 프레임 번호
+    for target in indices:
+        if target - position > SEEK_MIN_GAP:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+            position = target
+        while position < target:
+            if not cap.grab():
+                return
+            position += 1
+        ret, frame = cap.read()
+        if not ret:
+            log_message_fe(f"cap.read() 실패 또는 비디오 종료. target={target}")
+            return
+        position += 1
+        yield target, frame
+
+
+def _iter_timestamps_msec(cap, timestamps):
+    """FPS를 모를 때: 프레임 번호로 환산하지 않고 재생 위치(ms)로 seek 합니다."""
+    for t in timestamps:
+        cap.set(cv2.CAP_PROP_POS_MSEC, t * 1000.0)
+        frame_idx = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+        ret, frame = cap.read()
+        if not ret:
+            log_message_fe(f"cap.read() 실패 또는 비디오 종료. timestamp={t}")
+            return
+        yield frame_idx, frame
+
+
+def _count_frames(full_video_path: str) -> int:
+    """컨테이너에 프레임 수 정보가 없을 때 grab()으로 끝까지 세어 봅니다 (BGR 변환 없이 디코딩만)."""
+    cap = cv2.VideoCapture(full_video_path)
+    count = 0
+    try:
+        while cap.grab():
+            count += 1
+    finally:
+        cap.release()
+    return count
+
+
+def _iter_keyframes(full_video_path: str):
+    # 키프레임이 아닌 프레임은 디코더 단계에서 건너뛰므로 디코딩 비용 자체가 들지 않습니다.
+    with av.open(full_video_path) as container:
+        stream = container.streams.video[0]
+        stream.codec_context.skip_frame = "NONKEY"
+        fps = float(stream.average_rate) if stream.average_rate else 0.0
+        for frame in container.decode(stream):
+            timestamp = float(frame.time) if frame.time is not None else 0.0
+            frame_idx = int(round(timestamp * fps)) if fps > 0 else 0
+            yield frame_idx, timestamp, frame.to_ndarray(format="bgr24")
+
+
+def iter_frames(full_video_path: str, frame_interval: int = 10, mode: str = "interval",
+                num_frames: int = None, target_fps: float = None, timestamps: list = None,
+                scene_threshold: float = None, min_spacing: int = None, max_spacing: int = None) -> Iterator[FrameData]:
+    """
+    영상을 디코딩하면서 선택된 프레임만 FrameData로 하나씩 yield 합니다.
+    JPEG 저장이 필요하면 write_frames()로 감싸서 사용합니다.
+
+    mode:
+        "interval"   - frame_interval 프레임마다 한 장 (기본값, 기존 동작)
+        "keyframe"   - 키프레임만 디코딩 (PyAV 필요, 없으면 interval로 대체)
+        "timestamps" - timestamps(초 단위 리스트) 위치로 seek 하여 한 장씩
+        "uniform"    - 영상 전체에서 균등 간격으로 num_frames 장
+        "fps"        - 초당 target_fps 장
+        "scene"      - 내용이 scene_threshold 이상 바뀔 때만 (간격은 min_spacing ~ max_spacing 프레임)
+    """
+    if mode not in SAMPLING_MODES:
+        raise ValueError(f"지원하지 않는 샘플링 모드입니다: {mode} (가능한 값: {', '.join(SAMPLING_MODES)})")
+    required = {"uniform": ("num_frames", num_frames), "fps": ("target_fps", target_fps), "timestamps": ("timestamps", timestamps)}
+    if mode in required and not required[mode][1]:
+        raise ValueError(f"{mode} 모드에는 {required[mode][0]} 값이 필요합니다.")
+    if mode == "uniform" and num_frames <= 0:
+        raise ValueError(f"num_frames는 양수여야 합니다: {num_frames}")
+    if mode == "fps" and target_fps <= 0:
+        raise ValueError(f"target_fps는 양수여야 합니다: {target_fps}")
+    scene_threshold = SCENE_THRESHOLD if scene_threshold is None else scene_threshold
+    min_spacing = max(1, SCENE_MIN_SPACING if min_spacing is None else min_spacing)
+    max_spacing = SCENE_MAX_SPACING if max_spacing is None else max_spacing
+    if mode == "scene" and max_spacing < min_spacing:
+        raise ValueError(f"max_spacing({max_spacing})은 min_spacing({min_spacing})보다 작을 수 없습니다.")
+    if mode == "keyframe" and av is None:
+        log_message_fe("[경고] PyAV(av)가 설치되어 있지 않아 keyframe 대신 interval 모드를 사용합니다.")
+        mode = "interval"
+    if mode == "interval" and frame_interval <= 0:
+        raise ValueError(f"frame_interval은 양수여야 합니다: {frame_interval}")
+
+    log_message_fe(f"iter_frames 시작. full_video_path='{full_video_path}', mode={mode}, frame_interval={frame_interval}")
+
+    saved_idx = 0
+    if mode == "keyframe":
+        for frame_idx, timestamp, frame in _iter_keyframes(full_video_path):
+            yield FrameData(frame_idx, timestamp, f"frame_{saved_idx:04d}.jpg", frame)
+            saved_idx += 1
+        log_message_fe(f"iter_frames 종료. 전달된 프레임 수: {saved_idx}")
+        return
 
-    log_message_fe(f"cv2.VideoCapture 시도: '{full_video_path}'")
     cap = cv2.VideoCapture(full_video_path)
-    log_message_fe("cv2.VideoCapture 호출 완료.") # 성공 여부는 isOpened로 확인
 
     if not cap.isOpened():
         log_message_fe(f"[ERROR] 영상을 열 수 없습니다 (cap.isOpened() False): '{full_video_path}'")
         print(f"[ERROR] 영상을 열 수 없습니다: {full_video_path}") # 기존 사용자 출력 유지
         return
-    log_message_fe(f"영상이 성공적으로 열렸습니다 (cap.isOpened() True): '{full_video_path}'")
 
+    fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
     total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    log_message_fe(f"총 프레임 수: {total_frames}")
+    log_message_fe(f"총 프레임 수: {total_frames}, FPS: {fps}")
 
-    frame_idx = 0
-    saved_idx = 0
+    if mode == "interval":
+        selected = _iter_interval(cap, frame_interval)
+    elif mode == "fps":
+        selected = _iter_fps(cap, fps, target_fps)
+    elif mode == "scene":
+        selected = _iter_scene(cap, scene_threshold, min_spacing, max_spacing)
+    elif mode == "uniform":
+        if total_frames <= 0:
+            log_message_fe("[경고] 총 프레임 수 정보가 없어 영상을 한 번 끝까지 읽어 프레임 수를 셉니다.")
+            total_frames = _count_frames(full_video_path)
+            log_message_fe(f"센 프레임 수: {total_frames}")
+        count = min(num_frames, total_frames)
+        indices = np.unique(np.linspace(0, total_frames - 1, count).round().astype(int)) if count > 0 else []
+        selected = _iter_indices(cap, [int(i) for i in indices])
+    elif fps <= 0:  # timestamps
+        log_message_fe("[경고] FPS 정보를 읽을 수 없어 timestamps 위치로 직접 seek 합니다.")
+        selected = _iter_timestamps_msec(cap, sorted({t for t in timestamps if t >= 0}))
+    else:  # timestamps
+        # 영상 길이를 벗어난 시점은 무시 (프레임 수 정보가 없으면 끝에 닿을 때까지 읽음)
+        indices = sorted({int(round(t * fps)) for t in timestamps if t >= 0 and (total_frames <= 0 or t * fps < total_frames)})
+        selected = _iter_indices(cap, indices)
 
-    log_message_fe("프레임 추출 루프 시작")
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            log_message_fe("cap.read() 실패 또는 비디오 종료.")
-            break
-
-        if frame_idx % frame_interval == 0:
-            filename = f"frame_{saved_idx:04d}.jpg"
-            filepath = os.path.join(output_dir_for_frames, filename)
-            # log_message_fe(f"프레임 저장 시도: '{filepath}'") # 너무 많은 로그를 생성할 수 있어 주석 처리
-            cv2.imwrite(filepath, frame)
+    try:
+        for frame_idx, frame in selected:
+            timestamp = frame_idx / fps if fps > 0 else cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            yield FrameData(frame_idx, timestamp, f"frame_{saved_idx:04d}.jpg", frame)
             saved_idx += 1
+    finally:
+        cap.release()
+        log_message_fe(f"iter_frames 종료. 전달된 프레임 수: {saved_idx}")
 
-        frame_idx += 1
-    log_message_fe("프레임 추출 루프 종료")
 
-    cap.release()
-    log_message_fe("cap.release() 완료")
+class FrameDeduplicator:
+    """
+    perceptual_hash가 거의 같은 프레임을 하나의 대표 프레임으로 묶습니다.
+    unique()로 대표 프레임만 모델에 보내고, expand()로 대표의 결과를 모든 프레임에 다시 펼칩니다.
+    """
+
+    def __init__(self, threshold: float = DEDUP_THRESHOLD):
+        self.threshold = threshold
+        self.members = []      # 모든 프레임의 메타데이터 (이미지는 버림)
+        self.assignment = []   # 프레임 순번 → 대표 프레임 순번
+        self._hashes = np.zeros((16, HASH_SIZE * HASH_SIZE // 8), dtype=np.uint8)
+        self._count = 0
+
+    @property
+    def num_representatives(self) -> int:
+        return self._count
+
+    def add(self, frame: FrameData) -> bool:
+        """frame을 등록하고, 새 대표 프레임이면 True를 반환합니다."""
+        frame_hash = perceptual_hash(frame.image)
+        self.members.append(frame._replace(image=None))
+        if self._count:
+            distances = np.unpackbits(self._hashes[:self._count] ^ frame_hash, axis=1).sum(axis=1)
+            nearest = int(distances.argmin())
+            if distances[nearest] <= self.threshold * frame_hash.size * 8:
+                self.assignment.append(nearest)
+                return False
+        if self._count == len(self._hashes):
+            self._hashes = np.concatenate([self._hashes, np.zeros_like(self._hashes)])
+        self._hashes[self._count] = frame_hash
+        self.assignment.append(self._count)
+        self._count += 1
+        return True
+
+    def unique(self, frames) -> Iterator[FrameData]:
+        """프레임 스트림에서 대표 프레임만 통과시킵니다."""
+        for frame in frames:
+            if self.add(frame):
+                yield frame
+
+    def expand(self, records: list) -> list:
+        """대표 프레임별 결과 레코드를 모든 프레임의 레코드로 펼칩니다 (frame/frame_index/timestamp만 각 프레임 값으로)."""
+        expanded = []
+        for member, representative in zip(self.members, self.assignment):
+            record = dict(records[representative])
+            record["frame"] = member.name
+            if "frame_index" in record:
+                record["frame_index"] = int(member.index)
+                record["timestamp"] = round(float(member.timestamp), 4)
+            expanded.append(record)
+        return expanded
+
+    def expand_rows(self, array: np.ndarray) -> np.ndarray:
+        """대표 프레임별 배열(예: CLIP 임베딩)을 모든 프레임 순서로 펼칩니다."""
+        return array[np.asarray(self.assignment, dtype=np.int64)] if len(array) else array
+
+
+def dedup_frames(frames, threshold: float = DEDUP_THRESHOLD):
+    """(대표 프레임 리스트, FrameDeduplicator)를 반환합니다."""
+    deduplicator = FrameDeduplicator(threshold)
+    representatives = list(deduplicator.unique(frames))
+    log_message_fe(f"중복 제거: 프레임 {len(deduplicator.members)}장 → 대표 {len(representatives)}장")
+    return representatives, deduplicator
+
+
+def write_frames(frames, output_dir_for_frames: str) -> Iterator[FrameData]:
+    """프레임 스트림을 그대로 통과시키면서 각 프레임을 JPEG로 저장하는 선택적 sink."""
+    os.makedirs(output_dir_for_frames, exist_ok=True)
+    for frame in frames:
+        cv2.imwrite(os.path.join(output_dir_for_frames, frame.name), frame.image)
+        yield frame
+
+
+def extract_frames(full_video_path: str, output_dir_for_frames: str, frame_interval: int = 10, **sampling):
+    log_message_fe(f"extract_frames 함수 시작. full_video_path='{full_video_path}', output_dir_for_frames='{output_dir_for_frames}'")
+
+    saved_idx = 0
+    for _ in write_frames(iter_frames(full_video_path, frame_interval, **sampling), output_dir_for_frames):
+        saved_idx += 1
+
     print(f"[INFO] 총 {saved_idx}개의 프레임이 '{output_dir_for_frames}'에 저장되었습니다.")
-    log_message_fe("extract_frames 함수 정상 종료")
\ No newline at end of file
+    log_message_fe("extract_frames 함수 정상 종료")
+    return saved_idx
@@ -1,7 +1,6 @@
 import os
 import json
-from openai import OpenAI
-from dotenv import load_dotenv
+from LLM_Client import get_llm_client
 
 def load_context(json_path: str) -> dict:
     with open(json_path, "r", encoding="utf-8") as f:
@@ -12,13 +11,18 @@ def generate_prompt(context: dict) -> str:
     prompt_objects = context.get("prompt_objects", [])
     detected_objects = context.get("detected_objects", [])
     missing_objects = context.get("missing_objects", [])
+    coverage = context.get("object_coverage")
+    coverage_line = ""
+    if coverage:
+        coverage_line = "\nShare of frames each detected object appears in: " + ", ".join(
+            f"{name} {ratio:.0%}" for name, ratio in sorted(coverage.items(), key=lambda item: -item[1]))
 
     prompt_text = f"""
 Prompt: "{prompt}"
 
 Objects mentioned in the prompt: {', '.join(prompt_objects)}
 Objects detected in the video: {', '.join(detected_objects)}
-Objects missing from the video: {', '.join(missing_objects) if missing_objects else 'None'}
+Objects missing from the video: {', '.join(missing_objects) if missing_objects else 'None'}{coverage_line}
 
 Based on this information, write a feedback message in English that explains to the user which objects were missing in the generated video and suggest how to improve the prompt.
 """
@@ -26,11 +30,8 @@ Based on this information, write a feedback message in English that explains to
     return prompt_text.strip()
 
 def call_gpt(prompt_text: str) -> str:
-    load_dotenv()
-    api_key = os.getenv("OPENAI_API_KEY")
-    client = OpenAI(api_key=api_key)
-
-    chat_response = client.chat.completions.create(
+    # 공유 클라이언트: 연결 재사용, 동시성/속도 제한, 429·5xx 재시도
+    return get_llm_client().chat_sync(
         model="gpt-3.5-turbo",  # 또는 "gpt-4"
         messages=[
             {"role": "system", "content": "You are an assistant that helps users refine video generation prompts."},
@@ -40,8 +41,6 @@ def call_gpt(prompt_text: str) -> str:
         max_tokens=400
     )
 
-    return chat_response.choices[0].message.content.strip()
-
 def save_feedback(feedback_text: str, output_path: str):
     with open(output_path, "w", encoding="utf-8") as f:
         f.write(feedback_text)
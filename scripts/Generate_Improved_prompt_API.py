@@ -1,7 +1,6 @@
 import os
 import json
-from openai import OpenAI
-from dotenv import load_dotenv
+from LLM_Client import get_llm_client
 
 def load_context(prompt_path: str, comparison_path: str) -> dict:
     with open(prompt_path, "r", encoding="utf-8") as f:
@@ -15,7 +14,8 @@ def load_context(prompt_path: str, comparison_path: str) -> dict:
         "missing_objects": comparison.get("missing_objects", []),
         "appeared_objects": comparison.get("appeared_objects", []),
         "detected_objects": comparison.get("detected_objects", []),
-        "prompt_objects": comparison.get("prompt_objects", [])
+        "prompt_objects": comparison.get("prompt_objects", []),
+        "object_coverage": comparison.get("object_coverage", {})
     }
 
 def create_prompt(context: dict) -> str:
@@ -23,6 +23,11 @@ def create_prompt(context: dict) -> str:
     prompt_objects = ", ".join(context["prompt_objects"])
     detected = ", ".join(context["detected_objects"])
     missing = ", ".join(context["missing_objects"]) or "None"
+    coverage = context.get("object_coverage")
+    coverage_line = ""
+    if coverage:
+        coverage_line = "\nThe share of frames each detected object appears in: " + ", ".join(
+            f"{name} {ratio:.0%}" for name, ratio in sorted(coverage.items(), key=lambda item: -item[1]))
 
     return f"""
 A user entered the following prompt for AI video generation:
@@ -31,7 +36,7 @@ A user entered the following prompt for AI video generation:
 
 The objects mentioned in the prompt are: {prompt_objects}
 The detected objects in the video are: {detected}
-The missing objects are: {missing}
+The missing objects are: {missing}{coverage_line}
 
 Please perform the following tasks:
 
@@ -42,11 +47,8 @@ Return both the feedback and the improved prompt.
 """.strip()
 
 def call_gpt(full_prompt: str) -> str:
-    load_dotenv()
-    api_key = os.getenv("OPENAI_API_KEY")
-    client = OpenAI(api_key=api_key)
-
-    response = client.chat.completions.create(
+    # 공유 클라이언트: 연결 재사용, 동시성/속도 제한, 429·5xx 재시도
+    return get_llm_client().chat_sync(
         model="gpt-4o",
         messages=[
             {"role": "system", "content": "You are an expert assistant for improving video generation prompts."},
@@ -55,7 +57,6 @@ def call_gpt(full_prompt: str) -> str:
         temperature=0.7,
         max_tokens=500
     )
-    return response.choices[0].message.content.strip()
 
 def save_output(text: str, path: str):
     with open(path, "w", encoding="utf-8") as f:
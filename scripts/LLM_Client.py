@@ -0,0 +1,136 @@
+import os
+import time
+import random
+import asyncio
+import threading
+from openai import AsyncOpenAI, APIConnectionError, APIStatusError, APITimeoutError
+from dotenv import load_dotenv
+
+# 기본 설정 (환경 변수로 조정 가능)
+DEFAULT_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+DEFAULT_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "60"))
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BACKOFF_BASE = 1.0   # 초
+DEFAULT_BACKOFF_MAX = 30.0   # 초
+DEFAULT_TIMEOUT = 60.0       # 초
+
+
+class TokenBucket:
+    """초당 rate개씩 채워지고 최대 capacity개까지 쌓이는 토큰 버킷."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (APIConnectionError, APITimeoutError)):
+        return True
+    return isinstance(error, APIStatusError) and (error.status_code == 429 or error.status_code >= 500)
+
+
+def _retry_after(error: Exception):
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class AsyncLLMClient:
+    """
+    피드백/프롬프트 개선 단계가 함께 쓰는 비동기 GPT 클라이언트.
+    하나의 AsyncOpenAI(HTTP 연결 풀)를 전용 이벤트 루프 스레드에서 재사용하고,
+    동시 요청 수 제한, 토큰 버킷 속도 제한, 429/5xx 재시도(지수 백오프 + 지터)를 적용합니다.
+    base_url을 바꾸면 로컬 모의 서버로도 테스트할 수 있습니다.
+    """
+
+    def __init__(self, api_key: str = None, base_url: str = None,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 requests_per_minute: float = DEFAULT_REQUESTS_PER_MINUTE,
+                 max_retries: int = DEFAULT_MAX_RETRIES,
+                 backoff_base: float = DEFAULT_BACKOFF_BASE,
+                 backoff_max: float = DEFAULT_BACKOFF_MAX,
+                 timeout: float = DEFAULT_TIMEOUT):
+        # 재시도는 이 클래스에서 직접 처리하므로 SDK 자체 재시도는 끕니다.
+        self.client = AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0, timeout=timeout)
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-client-loop", daemon=True)
+        self._thread.start()
+        # 세마포어/버킷은 반드시 클라이언트 전용 루프 안에서 생성
+        asyncio.run_coroutine_threadsafe(self._init_limits(), self._loop).result()
+
+    async def _init_limits(self):
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        rate = self.requests_per_minute / 60.0
+        self._bucket = TokenBucket(rate, capacity=max(1.0, min(self.max_concurrency, self.requests_per_minute)))
+
+    async def _chat(self, messages: list, model: str, **params) -> str:
+        attempt = 0
+        while True:
+            try:
+                async with self._semaphore:
+                    await self._bucket.acquire()
+                    response = await self.client.chat.completions.create(model=model, messages=messages, **params)
+                return response.choices[0].message.content.strip()
+            except Exception as e:
+                if not _is_retryable(e) or attempt >= self.max_retries:
+                    raise
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = min(self.backoff_max, self.backoff_base * (2 ** attempt)) * random.uniform(0.5, 1.0)
+                print(f"[WARNING] GPT 요청 실패 ({e.__class__.__name__}), {delay:.1f}초 후 재시도 ({attempt + 1}/{self.max_retries})")
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    def submit(self, messages: list, model: str, **params):
+        """요청을 전용 루프에 예약하고 concurrent.futures.Future를 반환합니다."""
+        return asyncio.run_coroutine_threadsafe(self._chat(messages, model, **params), self._loop)
+
+    async def chat(self, messages: list, model: str, **params) -> str:
+        """어느 이벤트 루프에서든 await 할 수 있는 채팅 호출."""
+        return await asyncio.wrap_future(self.submit(messages, model, **params))
+
+    def chat_sync(self, messages: list, model: str, **params) -> str:
+        """스레드(파이프라인 스케줄러 워커 등)에서 쓰는 블로킹 호출."""
+        return self.submit(messages, model, **params).result()
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self.client.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+_CLIENT = None
+_CLIENT_LOCK = threading.Lock()
+
+def get_llm_client() -> AsyncLLMClient:
+    """프로세스 전체에서 공유하는 클라이언트. .env는 처음 한 번만 읽습니다."""
+    global _CLIENT
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            load_dotenv()
+            _CLIENT = AsyncLLMClient(api_key=os.getenv("OPENAI_API_KEY"), base_url=os.getenv("OPENAI_BASE_URL"))
+        return _CLIENT
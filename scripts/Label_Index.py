@@ -0,0 +1,168 @@
+import os
+import threading
+from functools import lru_cache
+import nltk
+from nltk.corpus import wordnet as wn
+
+from Result_Cache import get_result_cache, make_key
+
+# YOLO(COCO) 기본 클래스 이름 (ultralytics model.names 순서)
+COCO_LABELS = (
+    "person", "bicycle", "car", "motorcycle", "airplane", "bus", "train", "truck", "boat", "traffic light",
+    "fire hydrant", "stop sign", "parking meter", "bench", "bird", "cat", "dog", "horse", "sheep", "cow",
+    "elephant", "bear", "zebra", "giraffe", "backpack", "umbrella", "handbag", "tie", "suitcase", "frisbee",
+    "skis", "snowboard", "sports ball", "kite", "baseball bat", "baseball glove", "skateboard", "surfboard", "tennis racket", "bottle",
+    "wine glass", "cup", "fork", "knife", "spoon", "bowl", "banana", "apple", "sandwich", "orange",
+    "broccoli", "carrot", "hot dog", "pizza", "donut", "cake", "chair", "couch", "potted plant", "bed",
+    "dining table", "toilet", "tv", "laptop", "mouse", "remote", "keyboard", "cell phone", "microwave", "oven",
+    "toaster", "sink", "refrigerator", "book", "clock", "vase", "scissors", "teddy bear", "hair drier", "toothbrush",
+)
+
+# 라벨 이름만으로는 뜻이 모호하거나 WordNet 표제어와 다른 라벨의 WordNet 의미 (앞의 후보부터, 없는 이름은 건너뜀).
+# 여기 없는 라벨은 명사 첫 번째 의미를 씁니다.
+LABEL_SENSES = {
+    "mouse": ("mouse.n.04",),
+    "keyboard": ("computer_keyboard.n.01",),
+    "remote": ("remote_control.n.01",),
+    "tv": ("television_receiver.n.01",),
+    "cell phone": ("cellular_telephone.n.01",),
+    "tie": ("necktie.n.01",),
+    "sports ball": ("ball.n.01",),
+    "potted plant": ("pot_plant.n.01", "houseplant.n.01"),
+}
+
+# 상위어는 이 깊이까지만 올라가고, 너무 일반적인 개념(entity, object 등)은 WordNet 깊이로 걸러냅니다.
+HYPERNYM_DEPTH = 2
+MIN_HYPERNYM_DEPTH = 6
+INDEX_VERSION = 2
+
+_INDEXES = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def singularize(word: str) -> str:
+    """WordNet 없이도 쓸 수 있는 간단한 단수화 (cars → car, buses → bus, puppies → puppy)."""
+    if len(word) > 3 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith(("ses", "xes", "zes", "ches", "shes")):
+        return word[:-2]
+    if len(word) > 2 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def _normalize(word: str) -> str:
+    return word.strip().lower().replace("_", " ").replace("-", " ")
+
+
+def _label_synsets(label: str) -> list:
+    for name in LABEL_SENSES.get(label, ()):
+        try:
+            return [wn.synset(name)]
+        except Exception:
+            continue
+    synsets = wn.synsets(label.replace(" ", "_"), pos=wn.NOUN)
+    return synsets[:1]
+
+
+def _lemmas(synset) -> list:
+    return [_normalize(name) for name in synset.lemma_names()]
+
+
+@lru_cache(maxsize=None)
+def _dominant_sense(name: str):
+    """표제어의 가장 흔한 명사 의미 (WordNet 첫 번째 의미)."""
+    senses = wn.synsets(name, pos=wn.NOUN)
+    return senses[0] if senses else None
+
+
+def _wordnet_available() -> bool:
+    """로컬에 WordNet이 있으면 True. 없으면 NLTK_OFFLINE=1이 아닐 때만 내려받아 봅니다."""
+    try:
+        nltk.data.find("corpora/wordnet")
+        return True
+    except LookupError:
+        pass
+    if os.getenv("NLTK_OFFLINE", "0") == "1":
+        return False
+    try:
+        return nltk.download("wordnet", quiet=True)
+    except Exception:
+        return False
+
+
+def _build_index(labels: tuple, use_wordnet: bool = True) -> dict:
+    """
+    키워드 → 라벨 튜플 사전을 만듭니다.
+      라벨 이름: 항상 자기 자신에만 대응 (cat → cat)
+      specific: 동의어/하위어 (puppy → dog, taxi → car)
+      broad:    상위어 (animal → 여러 동물 라벨). specific에 없는 키워드에만 적용합니다.
+    하위어는 그 표제어의 가장 흔한 의미가 라벨의 하위 개념일 때만 추가합니다.
+    (person의 하위어에는 비유적 의미의 cat/tiger/dog 등이 있어 그대로 쓰면 동물 키워드가 사람에 대응됨)
+    """
+    specific, broad = {}, {}
+
+    def add(table, word, label):
+        table.setdefault(word, set()).add(label)
+
+    for label in labels:
+        add(specific, _normalize(label), label)
+        if not use_wordnet:
+            continue
+        for synset in _label_synsets(label):
+            for lemma in _lemmas(synset):
+                add(specific, lemma, label)
+            hyponyms = set(synset.closure(lambda s: s.hyponyms()))
+            members = hyponyms | {synset}
+            for hyponym in hyponyms:
+                for name in hyponym.lemma_names():
+                    if _dominant_sense(name) in members:
+                        add(specific, _normalize(name), label)
+            frontier = [synset]
+            for _ in range(HYPERNYM_DEPTH):
+                frontier = [h for s in frontier for h in s.hypernyms() if h.min_depth() >= MIN_HYPERNYM_DEPTH]
+                for hypernym in frontier:
+                    for lemma in _lemmas(hypernym):
+                        add(broad, lemma, label)
+
+    index = {word: tuple(sorted(found)) for word, found in broad.items()}
+    index.update({word: tuple(sorted(found)) for word, found in specific.items()})
+    index.update({_normalize(label): (label,) for label in labels})
+    return index
+
+
+def get_label_index(labels=COCO_LABELS) -> "LabelIndex":
+    """
+    라벨 어휘별로 한 번만 인덱스를 만듭니다. 프로세스 안에서는 메모리에,
+    프로세스 사이에서는 Result_Cache에 저장해 재사용합니다.
+    WordNet이 없으면 라벨 이름 일치만으로 동작하고, 그 인덱스는 디스크에 저장하지 않습니다.
+    """
+    labels = tuple(sorted({_normalize(label) for label in labels}))
+    with _INDEXES_LOCK:
+        if labels not in _INDEXES:
+            key = make_key("label_index", labels=labels, version=INDEX_VERSION, hypernym_depth=HYPERNYM_DEPTH)
+            cache = get_result_cache()
+            table = cache.get(key)
+            if table is None:
+                if _wordnet_available():
+                    table = _build_index(labels)
+                    cache.put(key, table)
+                else:
+                    print("[WARNING] WordNet을 찾을 수 없어 라벨 이름만으로 객체를 비교합니다.")
+                    table = _build_index(labels, use_wordnet=False)
+            _INDEXES[labels] = LabelIndex(table)
+        return _INDEXES[labels]
+
+
+class LabelIndex:
+    """프롬프트 키워드를 검출기 라벨로 바꾸는 사전 조회 (키워드당 dict 조회 최대 2번)."""
+
+    def __init__(self, table: dict):
+        self.table = table
+
+    def lookup(self, keyword: str) -> tuple:
+        word = _normalize(keyword)
+        found = self.table.get(word)
+        if found is None:
+            found = self.table.get(singularize(word), ())
+        return found
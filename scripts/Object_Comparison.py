@@ -1,23 +1,104 @@
 import os
 import json
 import re
+import threading
 import nltk
 from collections import Counter
+from functools import lru_cache
 from nltk.corpus import stopwords
-from nltk import word_tokenize, pos_tag
+from nltk import word_tokenize, pos_tag_sents
 
-nltk.download("punkt")
-nltk.download("averaged_perceptron_tagger")
-nltk.download("stopwords")
+from Label_Index import get_label_index
 
-def extract_keywords_from_prompt(prompt_text: str) -> list:
-    stop_words = set(stopwords.words("english"))
-    words = word_tokenize(prompt_text)
-    pos_tags = pos_tag(words)
+# 필요한 NLTK 리소스: 이름 → (nltk.data.find 경로, download 이름) 후보.
+# NLTK 버전에 따라 리소스 이름이 달라서(3.8.2+ 는 *_tab, *_eng) 앞의 후보부터 찾습니다.
+NLTK_RESOURCES = {
+    "punkt": (("tokenizers/punkt_tab/english/", "punkt_tab"), ("tokenizers/punkt", "punkt")),
+    "tagger": (("taggers/averaged_perceptron_tagger_eng/", "averaged_perceptron_tagger_eng"),
+               ("taggers/averaged_perceptron_tagger", "averaged_perceptron_tagger")),
+    "stopwords": (("corpora/stopwords", "stopwords"),),
+}
+# NLTK_OFFLINE=1 이면 로컬(NLTK_DATA 등)에 없는 리소스를 내려받지 않고 바로 오류를 냅니다 (망 분리 환경용).
+NLTK_OFFLINE = os.getenv("NLTK_OFFLINE", "0") == "1"
+KEYWORD_CACHE_SIZE = 4096
+
+_RESOURCES_READY = False
+_RESOURCES_LOCK = threading.Lock()
+
+def _find_resource(candidates) -> bool:
+    for path, _ in candidates:
+        try:
+            nltk.data.find(path)
+            return True
+        except LookupError:
+            continue
+    return False
+
+def ensure_nltk_resources(offline: bool = None):
+    """
+    키워드 추출에 필요한 NLTK 리소스를 확인합니다. import 시점에는 호출되지 않고 첫 추출 때 한 번만 실행됩니다.
+    로컬에 있으면 네트워크를 쓰지 않고, 없을 때만(offline이 아니면) 내려받습니다.
+    """
+    global _RESOURCES_READY
+    if _RESOURCES_READY:
+        return
+    offline = NLTK_OFFLINE if offline is None else offline
+    with _RESOURCES_LOCK:
+        if _RESOURCES_READY:
+            return
+        for name, candidates in NLTK_RESOURCES.items():
+            if _find_resource(candidates):
+                continue
+            if offline:
+                raise LookupError(f"NLTK 리소스 '{name}'가 로컬에 없습니다 (NLTK_OFFLINE=1). "
+                                  f"'python -m nltk.downloader {candidates[0][1]}'로 미리 설치하거나 NLTK_DATA를 지정하세요.")
+            print(f"[INFO] NLTK 리소스 '{name}' 다운로드")
+            if not any(nltk.download(download_name, quiet=True) for _, download_name in candidates) or not _find_resource(candidates):
+                raise LookupError(f"NLTK 리소스 '{name}'를 내려받지 못했습니다.")
+        _RESOURCES_READY = True
+
+@lru_cache(maxsize=1)
+def _stop_words() -> frozenset:
+    ensure_nltk_resources()
+    return frozenset(stopwords.words("english"))
+
+def _keywords_from_tags(pos_tags) -> tuple:
+    stop_words = _stop_words()
     # NN, NNS, NNP, NNPS → 명사류
-    nouns = [word.lower() for word, tag in pos_tags if tag.startswith("NN")]
-    keywords = [word for word in nouns if word not in stop_words]
-    return list(set(keywords))
+    nouns = {word.lower() for word, tag in pos_tags if tag.startswith("NN")}
+    return tuple(sorted(nouns - stop_words))
+
+# 프롬프트 텍스트(앞뒤 공백 제거) → 키워드. 배치 API가 한꺼번에 채우므로 lru_cache 대신 dict를 씁니다.
+_KEYWORD_CACHE = {}
+_KEYWORD_CACHE_LOCK = threading.Lock()
+
+def extract_keywords_batch(prompt_texts: list) -> list:
+    """
+    여러 프롬프트의 키워드를 한 번에 추출합니다. 캐시에 없는 프롬프트만 모아 pos_tag_sents로 한 번에 태깅합니다.
+    반환: 입력 순서대로 키워드 리스트
+    """
+    keys = [text.strip() for text in prompt_texts]
+    with _KEYWORD_CACHE_LOCK:
+        results = {key: _KEYWORD_CACHE[key] for key in keys if key in _KEYWORD_CACHE}
+    missing = [key for key in dict.fromkeys(keys) if key not in results]
+    if missing:
+        ensure_nltk_resources()
+        tagged = pos_tag_sents([word_tokenize(text) for text in missing])
+        with _KEYWORD_CACHE_LOCK:
+            for text, pos_tags in zip(missing, tagged):
+                results[text] = _keywords_from_tags(pos_tags)
+                if len(_KEYWORD_CACHE) >= KEYWORD_CACHE_SIZE:
+                    _KEYWORD_CACHE.pop(next(iter(_KEYWORD_CACHE)))  # 가장 먼저 들어온 항목부터 제거
+                _KEYWORD_CACHE[text] = results[text]
+    return [list(results[key]) for key in keys]
+
+def extract_keywords_from_prompt(prompt_text: str) -> list:
+    key = prompt_text.strip()
+    with _KEYWORD_CACHE_LOCK:
+        cached = _KEYWORD_CACHE.get(key)
+    if cached is not None:
+        return list(cached)
+    return extract_keywords_batch([key])[0]
 
 def load_yolo_results(json_path: str) -> list:
     with open(json_path, "r", encoding="utf-8") as f:
@@ -29,18 +110,33 @@ def load_yolo_results(json_path: str) -> list:
 
     return list(set(all_objects))
 
-def compare_objects(prompt_objects: list, detected_objects: list) -> dict:
-    prompt_set = set(prompt_objects)
+def compare_objects(prompt_objects: list, detected_objects: list, label_index=None) -> dict:
+    """
+    프롬프트 명사를 label_index(검출기 라벨 어휘 + WordNet 동의어/하위어/상위어)로 라벨에 대응시킨 뒤 비교합니다.
+    어떤 라벨에도 대응하지 않는 명사(예: park, sky)는 검출기가 찾을 수 없으므로 누락이 아닌 unrecognized로 분류합니다.
+    """
+    if label_index is None:
+        label_index = get_label_index()
     detected_set = set(obj.lower() for obj in detected_objects)
 
-    appeared = sorted(prompt_set & detected_set)
-    missing = sorted(prompt_set - detected_set)
+    appeared, missing, unrecognized = [], [], []
+    matched_labels = {}
+    for keyword in sorted(set(prompt_objects)):
+        labels = label_index.lookup(keyword)
+        if not labels:
+            (appeared if keyword in detected_set else unrecognized).append(keyword)
+            continue
+        hits = [label for label in labels if label in detected_set]
+        matched_labels[keyword] = hits or list(labels)
+        (appeared if hits else missing).append(keyword)
 
     return {
         "prompt_objects": sorted(prompt_objects),
         "detected_objects": sorted(detected_objects),
         "appeared_objects": appeared,
-        "missing_objects": missing
+        "missing_objects": missing,
+        "unrecognized_objects": unrecognized,
+        "matched_labels": matched_labels,
     }
 
 def save_results(result: dict, output_path: str):
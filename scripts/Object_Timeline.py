@@ -0,0 +1,93 @@
+import numpy as np
+
+# 객체별 시간축 요약. 모든 값은 평평한 numpy 배열이고 .npz(allow_pickle 없이)로 저장합니다.
+#   class_ids/class_names/frame_count/coverage/max_conf/mean_area/box_count : 등장한 클래스당 1개
+#   run_class/run_start/run_end : 연속 등장 구간 (RLE), 프레임 위치 기준 [start, end)
+#   frame_index/timestamp       : 프레임 위치 → 원본 프레임 번호/초 (모르면 -1 / NaN)
+
+
+def build_timeline(detections: list, names: dict) -> dict:
+    """
+    YOLO_Detection.detect_objects 레코드(박스별 cls/conf/area 배열 포함)로 타임라인을 만듭니다.
+    박스를 한 번 이어 붙인 뒤 bincount/maximum.at과 diff로 계산하므로 프레임별 파이썬 반복이 없습니다.
+    names: 클래스 id → 이름 (ultralytics model.names)
+    """
+    num_frames = len(detections)
+    counts = np.array([len(record.get("cls", ())) for record in detections], dtype=np.int64)
+    frame_pos = np.repeat(np.arange(num_frames, dtype=np.int64), counts)
+    empty = np.zeros(0, dtype=np.float32)
+    cls = np.concatenate([np.asarray(record.get("cls", empty), dtype=np.int64) for record in detections] or [empty]).astype(np.int64)
+    conf = np.concatenate([np.asarray(record.get("conf", empty), dtype=np.float32) for record in detections] or [empty])
+    area = np.concatenate([np.asarray(record.get("area", empty), dtype=np.float32) for record in detections] or [empty])
+
+    class_ids, slot = np.unique(cls, return_inverse=True)
+    num_classes = len(class_ids)
+
+    box_count = np.bincount(slot, minlength=num_classes)
+    mean_area = np.bincount(slot, weights=area, minlength=num_classes) / np.maximum(box_count, 1)
+    max_conf = np.zeros(num_classes, dtype=np.float32)
+    np.maximum.at(max_conf, slot, conf)
+
+    # 클래스 × 프레임 등장 행렬 → 등장 프레임 수와 연속 구간
+    presence = np.zeros((num_classes, num_frames + 2), dtype=np.int8)
+    presence[slot, frame_pos + 1] = 1
+    frame_count = presence.sum(axis=1)
+    edges = np.diff(presence, axis=1)
+    start_class, run_start = np.nonzero(edges == 1)
+    _, run_end = np.nonzero(edges == -1)
+
+    return {
+        "class_ids": class_ids.astype(np.int32),
+        "class_names": np.array([names[int(c)] for c in class_ids], dtype=str),
+        "frame_count": frame_count.astype(np.int32),
+        "coverage": (frame_count / max(num_frames, 1)).astype(np.float32),
+        "max_conf": max_conf,
+        "mean_area": mean_area.astype(np.float32),
+        "box_count": box_count.astype(np.int32),
+        "run_class": start_class.astype(np.int32),
+        "run_start": run_start.astype(np.int32),
+        "run_end": run_end.astype(np.int32),
+        "frame_index": np.array([record.get("frame_index", -1) for record in detections], dtype=np.int32),
+        "timestamp": np.array([record.get("timestamp", np.nan) for record in detections], dtype=np.float32),
+    }
+
+
+def save_timeline(timeline: dict, output_path: str):
+    np.savez_compressed(output_path, **timeline)
+    print(f"[✅] 객체 타임라인 저장 완료 → {output_path}")
+
+
+def load_timeline(path: str) -> dict:
+    with np.load(path, allow_pickle=False) as data:
+        return {key: data[key] for key in data.files}
+
+
+def summarize_timeline(timeline: dict) -> list:
+    """
+    클래스별 요약 레코드 (등장 비율 내림차순). 구간은 가능하면 초, 아니면 프레임 위치로 표시합니다.
+    계산량은 클래스 수 + 구간 수에만 비례합니다.
+    """
+    timestamps = timeline["timestamp"]
+    has_time = len(timestamps) > 0 and not np.isnan(timestamps).any()
+    # 구간은 build_timeline에서 클래스 순으로 정렬되어 있음
+    run_start, run_end = timeline["run_start"], timeline["run_end"]
+    bounds = np.searchsorted(timeline["run_class"], np.arange(len(timeline["class_ids"]) + 1))
+
+    summary = []
+    for slot, name in enumerate(timeline["class_names"]):
+        intervals = []
+        for start, end in zip(run_start[bounds[slot]:bounds[slot + 1]], run_end[bounds[slot]:bounds[slot + 1]]):
+            if has_time:
+                intervals.append((round(float(timestamps[start]), 2), round(float(timestamps[end - 1]), 2)))
+            else:
+                intervals.append((int(start), int(end - 1)))
+        summary.append({
+            "object": str(name),
+            "coverage": round(float(timeline["coverage"][slot]), 4),
+            "frames": int(timeline["frame_count"][slot]),
+            "max_conf": round(float(timeline["max_conf"][slot]), 3),
+            "mean_area": round(float(timeline["mean_area"][slot]), 4),
+            "intervals": intervals,
+        })
+    summary.sort(key=lambda item: item["coverage"], reverse=True)
+    return summary
@@ -0,0 +1,131 @@
+import os
+import json
+import pickle
+import hashlib
+import threading
+
+# 기본 캐시 위치/용량 (환경 변수로 조정 가능)
+DEFAULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", ".cache"))
+DEFAULT_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(4 * 1024 ** 3)))
+
+_MISSING = object()
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+
+_FILE_HASHES = {}
+
+def hash_file(path: str) -> str:
+    """파일 내용 해시. 같은 프로세스에서는 (경로, 크기, mtime)이 같으면 다시 읽지 않습니다."""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _FILE_HASHES:
+        h = hashlib.blake2b(digest_size=20)
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        _FILE_HASHES[memo_key] = h.hexdigest()
+    return _FILE_HASHES[memo_key]
+
+
+def make_key(stage: str, **parts) -> str:
+    """단계 이름과 입력 구성요소(JSON 직렬화 가능)로 만든 내용 기반 캐시 키."""
+    canonical = json.dumps({"stage": stage, **parts}, sort_keys=True, ensure_ascii=False, default=str)
+    return f"{stage}-{hash_bytes(canonical.encode('utf-8'))}"
+
+
+class ResultCache:
+    """
+    단계 결과를 키별 pickle 파일로 저장하는 디스크 캐시.
+    전체 크기가 max_bytes를 넘으면 가장 오래 사용되지 않은 항목부터 지웁니다 (mtime = 마지막 사용 시각).
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._entries = {}  # key → (size, last_used)
+        for fname in os.listdir(cache_dir):
+            if fname.endswith(".pkl"):
+                stat = os.stat(os.path.join(cache_dir, fname))
+                self._entries[fname[:-4]] = (stat.st_size, stat.st_mtime)
+        self._total = sum(size for size, _ in self._entries.values())
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def __contains__(self, key: str) -> bool:
+        # 다른 프로세스가 지웠을 수도 있으므로 힌트로만 사용 (값은 get()의 결과로 판단)
+        return os.path.exists(self._path(key))
+
+    def get(self, key: str, default=None):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return default
+        os.utime(path)  # LRU: 마지막 사용 시각 갱신
+        with self._lock:
+            if key in self._entries:
+                self._entries[key] = (self._entries[key][0], os.path.getmtime(path))
+        return value
+
+    def get_many(self, keys):
+        """모든 키의 값 리스트. 하나라도 없으면 (다른 프로세스가 지운 경우 포함) None."""
+        values = []
+        for key in keys:
+            value = self.get(key, _MISSING)
+            if value is _MISSING:
+                return None
+            values.append(value)
+        return values
+
+    def put(self, key: str, value):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)  # 중간에 죽어도 반쯤 쓴 파일이 남지 않도록
+        size = os.path.getsize(path)
+        with self._lock:
+            old_size = self._entries.get(key, (0, 0))[0]
+            self._entries[key] = (size, os.path.getmtime(path))
+            self._total += size - old_size
+            self._evict()
+
+    def get_or_compute(self, key: str, compute):
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            print(f"[♻️] 캐시 적중: {key}")
+            return value
+        value = compute()
+        self.put(key, value)
+        return value
+
+    def _evict(self):
+        if self._total <= self.max_bytes:
+            return
+        for key, (size, _) in sorted(self._entries.items(), key=lambda item: item[1][1]):
+            if self._total <= self.max_bytes:
+                break
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            del self._entries[key]
+            self._total -= size
+
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+def get_result_cache() -> ResultCache:
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = ResultCache()
+        return _CACHE
@@ -0,0 +1,235 @@
+import os
+import time
+import uuid
+import datetime
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# 실행 결과를 누적하는 컬럼형 저장소 (날짜별 파티션, 실행 하나당 parquet 파일 하나씩 추가)
+#   data/results_store/runs/date=YYYY-MM-DD/<run_id>.parquet    실행 요약 1행
+#   data/results_store/frames/date=YYYY-MM-DD/<run_id>.parquet  프레임당 1행
+#   data/results_store/stages/date=YYYY-MM-DD/<run_id>.parquet  단계당 1행 (Stage_Profiler 요약)
+# 작은 파일이 쌓이면 읽기가 느려지므로, 파티션의 파일 수가 COMPACT_MIN_FILES에 이르면
+# 파티션 전체를 compacted-<id>.parquet 하나로 다시 씁니다.
+DEFAULT_STORE_DIR = os.getenv("RESULTS_STORE_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "results_store"))
+
+RUN_SCHEMA = pa.schema([
+    ("run_id", pa.string()),
+    ("created_at", pa.timestamp("s")),
+    ("prompt_path", pa.string()),
+    ("video_path", pa.string()),
+    ("video_name", pa.string()),
+    ("prompt_text", pa.string()),
+    ("model_path", pa.string()),
+    ("num_frames", pa.int32()),
+    ("clip_mean", pa.float32()),
+    ("clip_min", pa.float32()),
+    ("clip_max", pa.float32()),
+    ("prompt_objects", pa.list_(pa.string())),
+    ("detected_objects", pa.list_(pa.string())),
+    ("appeared_objects", pa.list_(pa.string())),
+    ("missing_objects", pa.list_(pa.string())),
+    ("feedback", pa.string()),
+    ("improved_prompt", pa.string()),
+])
+
+FRAME_SCHEMA = pa.schema([
+    ("run_id", pa.string()),
+    ("video_name", pa.string()),
+    ("frame", pa.string()),
+    ("frame_position", pa.int32()),   # 샘플링된 프레임 중 순번
+    ("frame_index", pa.int32()),      # 원본 영상 기준 프레임 번호 (없으면 null)
+    ("timestamp", pa.float32()),      # 초 단위 (없으면 null)
+    ("clip_score", pa.float32()),
+    ("objects", pa.list_(pa.string())),
+])
+
+STAGE_SCHEMA = pa.schema([
+    ("run_id", pa.string()),
+    ("video_name", pa.string()),
+    ("stage", pa.string()),
+    ("calls", pa.int32()),            # 구간 수 (스트리밍 실행에서는 청크마다 1개)
+    ("wall_s", pa.float64()),
+    ("cpu_s", pa.float64()),
+    ("peak_rss_mb", pa.float32()),
+    ("gpu_peak_mb", pa.float32()),    # GPU가 없으면 null
+    ("frames", pa.int32()),           # 프레임을 다루지 않는 단계는 null
+    ("fps", pa.float32()),
+])
+
+SCHEMAS = {"runs": RUN_SCHEMA, "frames": FRAME_SCHEMA, "stages": STAGE_SCHEMA}
+
+PARTITIONING = ds.partitioning(pa.schema([("date", pa.string())]), flavor="hive")
+
+COMPACT_MIN_FILES = int(os.getenv("RESULTS_STORE_COMPACT_MIN_FILES", "16"))
+COMPACT_LOCK_TIMEOUT = 600  # 초, 이보다 오래된 잠금 파일은 중간에 죽은 압축 작업으로 보고 지움
+
+
+def new_run_id(created_at: datetime.datetime = None) -> str:
+    return f"{created_at or datetime.datetime.now():%Y%m%d_%H%M%S}_{uuid.uuid4().hex[:8]}"
+
+
+def _write_partition(table: pa.Table, store_dir: str, kind: str, date: str, run_id: str):
+    partition_dir = os.path.join(store_dir, kind, f"date={date}")
+    os.makedirs(partition_dir, exist_ok=True)
+    # "."으로 시작하는 임시 파일은 pyarrow dataset이 무시하므로 읽는 쪽이 반쯤 쓴 파일을 보지 않음
+    tmp_path = os.path.join(partition_dir, f".{run_id}.parquet.tmp")
+    pq.write_table(table, tmp_path, compression="zstd")
+    os.replace(tmp_path, os.path.join(partition_dir, f"{run_id}.parquet"))
+    return partition_dir
+
+
+def _partition_files(partition_dir: str) -> list:
+    return sorted(os.path.join(partition_dir, name) for name in os.listdir(partition_dir)
+                  if name.endswith(".parquet") and not name.startswith((".", "_")))
+
+
+def compact_partition(partition_dir: str, kind: str, min_files: int = 2) -> bool:
+    """
+    파티션의 parquet 파일이 min_files개 이상이면 하나로 합쳐 다시 씁니다. 합친 경우 True.
+    다른 프로세스가 같은 파티션을 압축 중이면 (잠금 파일) 건너뜁니다.
+    """
+    lock_path = os.path.join(partition_dir, ".compact.lock")
+    try:
+        if time.time() - os.path.getmtime(lock_path) > COMPACT_LOCK_TIMEOUT:
+            os.remove(lock_path)
+    except FileNotFoundError:
+        pass
+    try:
+        os.close(os.open(lock_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL))
+    except FileExistsError:
+        return False
+    try:
+        # 목록을 먼저 고정: 압축 중에 추가되는 실행 파일은 그대로 남아 다음 압축 때 합쳐짐
+        files = _partition_files(partition_dir)
+        if len(files) < min_files:
+            return False
+        table = ds.dataset(files, schema=SCHEMAS[kind], format="parquet").to_table()
+        compacted_id = f"compacted-{uuid.uuid4().hex}"
+        tmp_path = os.path.join(partition_dir, f".{compacted_id}.parquet.tmp")
+        pq.write_table(table, tmp_path, compression="zstd")
+        os.replace(tmp_path, os.path.join(partition_dir, f"{compacted_id}.parquet"))
+        for path in files:
+            os.remove(path)
+        return True
+    finally:
+        os.remove(lock_path)
+
+
+def compact(store_dir: str = DEFAULT_STORE_DIR, min_files: int = 2) -> int:
+    """모든 데이터셋의 날짜 파티션을 파티션당 파일 하나로 합치고, 합친 파티션 수를 반환합니다."""
+    compacted = 0
+    for kind in SCHEMAS:
+        kind_dir = os.path.join(store_dir, kind)
+        if not os.path.isdir(kind_dir):
+            continue
+        for name in sorted(os.listdir(kind_dir)):
+            partition_dir = os.path.join(kind_dir, name)
+            if name.startswith("date=") and os.path.isdir(partition_dir):
+                compacted += compact_partition(partition_dir, kind, min_files)
+    return compacted
+
+
+def append_run(run: dict, clip_scores: list, detections: list, stages: list = None, store_dir: str = DEFAULT_STORE_DIR) -> str:
+    """
+    실행 요약 1행과 프레임별 행을 저장소에 추가하고 run_id를 반환합니다.
+    run: RUN_SCHEMA의 컬럼 중 일부 (run_id, created_at, 통계 컬럼은 비어 있으면 채웁니다)
+    clip_scores/detections: 파이프라인의 {"frame", "score"} / {"frame", "objects"} 레코드
+    stages: Stage_Profiler.StageProfiler.summary() 결과 (있으면 stages 데이터셋에 추가)
+    """
+    created_at = run.get("created_at") or datetime.datetime.now().replace(microsecond=0)
+    run_id = run.get("run_id") or new_run_id(created_at)
+    date = f"{created_at:%Y-%m-%d}"
+
+    scores = [record["score"] for record in clip_scores]
+    objects_by_frame = {record["frame"]: record.get("objects", []) for record in detections}
+    summary = {
+        "num_frames": len(scores),
+        "clip_mean": sum(scores) / len(scores) if scores else None,
+        "clip_min": min(scores) if scores else None,
+        "clip_max": max(scores) if scores else None,
+        **run,
+        "run_id": run_id,
+        "created_at": created_at,
+    }
+    run_table = pa.Table.from_pylist([{name: summary.get(name) for name in RUN_SCHEMA.names}], schema=RUN_SCHEMA)
+
+    frame_rows = {
+        "run_id": [run_id] * len(clip_scores),
+        "video_name": [run.get("video_name")] * len(clip_scores),
+        "frame": [record["frame"] for record in clip_scores],
+        "frame_position": list(range(len(clip_scores))),
+        "frame_index": [record.get("frame_index") for record in clip_scores],
+        "timestamp": [record.get("timestamp") for record in clip_scores],
+        "clip_score": scores,
+        "objects": [objects_by_frame.get(record["frame"], []) for record in clip_scores],
+    }
+    frame_table = pa.Table.from_pydict(frame_rows, schema=FRAME_SCHEMA)
+
+    written = {"frames": _write_partition(frame_table, store_dir, "frames", date, run_id)}
+    if stages:
+        stage_rows = [{**stage, "run_id": run_id, "video_name": run.get("video_name")} for stage in stages]
+        stage_table = pa.Table.from_pylist([{name: row.get(name) for name in STAGE_SCHEMA.names} for row in stage_rows], schema=STAGE_SCHEMA)
+        written["stages"] = _write_partition(stage_table, store_dir, "stages", date, run_id)
+    written["runs"] = _write_partition(run_table, store_dir, "runs", date, run_id)
+    for kind, partition_dir in written.items():
+        compact_partition(partition_dir, kind, COMPACT_MIN_FILES)
+    return run_id
+
+
+def _dataset(store_dir: str, kind: str):
+    path = os.path.join(store_dir, kind)
+    if not os.path.isdir(path):
+        return None
+    return ds.dataset(path, format="parquet", partitioning=PARTITIONING)
+
+
+def _date_filter(start_date=None, end_date=None):
+    # 파티션 컬럼(date) 조건이라 범위 밖 파일은 열지도 않습니다.
+    expression = None
+    if start_date is not None:
+        expression = ds.field("date") >= f"{start_date}"[:10]
+    if end_date is not None:
+        condition = ds.field("date") <= f"{end_date}"[:10]
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def load_runs(start_date=None, end_date=None, columns: list = None, where=None, store_dir: str = DEFAULT_STORE_DIR):
+    """
+    실행 요약을 pandas DataFrame으로 반환합니다.
+    start_date/end_date: "YYYY-MM-DD" 또는 date/datetime (양 끝 포함)
+    where: 추가 pyarrow.dataset 조건식 (예: ds.field("clip_mean") < 25)
+    """
+    dataset = _dataset(store_dir, "runs")
+    if dataset is None:
+        return pa.Table.from_pylist([], schema=RUN_SCHEMA).to_pandas()
+    expression = _date_filter(start_date, end_date)
+    if where is not None:
+        expression = where if expression is None else expression & where
+    return dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+
+def load_frames(run_ids: list = None, start_date=None, end_date=None, columns: list = None, store_dir: str = DEFAULT_STORE_DIR):
+    """프레임별 행을 pandas DataFrame으로 반환합니다. run_ids를 주면 해당 실행만 읽습니다."""
+    dataset = _dataset(store_dir, "frames")
+    if dataset is None:
+        return pa.Table.from_pylist([], schema=FRAME_SCHEMA).to_pandas()
+    expression = _date_filter(start_date, end_date)
+    if run_ids is not None:
+        condition = ds.field("run_id").isin(list(run_ids))
+        expression = condition if expression is None else expression & condition
+    return dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+
+def load_stages(run_ids: list = None, start_date=None, end_date=None, columns: list = None, store_dir: str = DEFAULT_STORE_DIR):
+    """단계별 시간/메모리/처리량 요약을 pandas DataFrame으로 반환합니다. run_ids를 주면 해당 실행만 읽습니다."""
+    dataset = _dataset(store_dir, "stages")
+    if dataset is None:
+        return pa.Table.from_pylist([], schema=STAGE_SCHEMA).to_pandas()
+    expression = _date_filter(start_date, end_date)
+    if run_ids is not None:
+        condition = ds.field("run_id").isin(list(run_ids))
+        expression = condition if expression is None else expression & condition
+    return dataset.to_table(columns=columns, filter=expression).to_pandas()
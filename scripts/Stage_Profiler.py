@@ -0,0 +1,193 @@
+import os
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+try:
+    import psutil  # 현재 RSS (없으면 생략)
+except ImportError:
+    psutil = None
+
+
+# 최대 메모리 초기화는 프로세스 전체에 적용되므로, 진행 중인 구간 수도 모든 프로파일러(동시에 도는 작업들)가 공유합니다.
+_active_lock = threading.Lock()
+_active_spans = 0
+
+
+def _begin_span():
+    global _active_spans
+    with _active_lock:
+        if _active_spans == 0:
+            _reset_peaks()
+        _active_spans += 1
+
+
+def _end_span():
+    global _active_spans
+    with _active_lock:
+        _active_spans -= 1
+
+
+def _reset_peaks():
+    # 최대 RSS: Linux에서만 구간 단위로 초기화 가능 (ru_maxrss는 프로세스 시작 이후 최댓값이라 쓰지 않음)
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.reset_peak_memory_stats()
+
+
+def _peak_rss_mb():
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024  # KB
+    except OSError:
+        pass
+    return None
+
+
+def _rss_mb():
+    return psutil.Process().memory_info().rss / 1024 ** 2 if psutil is not None else None
+
+
+def _gpu_memory_mb():
+    # torch를 이미 쓰고 있는 프로세스에서만 측정 (프로파일링 때문에 torch를 새로 import하지 않음)
+    torch = sys.modules.get("torch")
+    if torch is None or not torch.cuda.is_available():
+        return None, None
+    return torch.cuda.memory_allocated() / 1024 ** 2, torch.cuda.max_memory_allocated() / 1024 ** 2
+
+
+class Span:
+    """span() 블록 안에서 처리한 프레임 수를 기록할 때 쓰는 객체 (span.frames = n)."""
+
+    def __init__(self, name: str, frames: int = None):
+        self.name = name
+        self.frames = frames
+
+
+class StageProfiler:
+    """
+    단계별 구간(span)의 벽시계 시간, CPU 시간, RSS, GPU 메모리, 프레임 처리량을 기록합니다.
+    cpu_s는 구간을 실행한 스레드의 CPU 시간(time.thread_time)이라 동시에 도는 다른 단계의 영향을 받지 않지만
+    torch/디코더의 내부 스레드는 빠지고, process_cpu_s는 그 스레드들까지 포함한 프로세스 전체 값입니다.
+    메모리는 프로세스 전체 기준입니다: 최대 메모리(peak_rss_mb, gpu_peak_mb)는 (모든 프로파일러를 통틀어)
+    진행 중인 구간이 없을 때 시작한 구간에서 초기화되므로, 구간이 겹치면 겹친 구간들의 사용량이 함께 잡힙니다.
+    구간은 끝날 때마다 JSONL 한 줄로 추가되고, write_trace() 시 trace_path가 있으면 Chrome trace(JSON)를 씁니다.
+    (chrome://tracing 또는 https://ui.perfetto.dev 에서 열 수 있음)
+    스케줄러의 여러 워커 스레드에서 동시에 사용해도 안전합니다.
+    """
+
+    def __init__(self, jsonl_path: str = None, trace_path: str = None):
+        self.jsonl_path = jsonl_path
+        self.trace_path = trace_path
+        self.records = []
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        if jsonl_path:
+            open(jsonl_path, "w", encoding="utf-8").close()  # 같은 결과 폴더에서 다시 실행하면 새로 기록
+
+    @contextmanager
+    def span(self, name: str, frames: int = None):
+        span = Span(name, frames)
+        _begin_span()
+        started_at = time.time()
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+        process_cpu_start = time.process_time()
+        error = None
+        try:
+            yield span
+        except BaseException as e:
+            error = repr(e)
+            raise
+        finally:
+            wall = time.perf_counter() - start
+            cpu = time.thread_time() - cpu_start
+            process_cpu = time.process_time() - process_cpu_start
+            gpu_mb, gpu_peak_mb = _gpu_memory_mb()
+            record = {
+                "stage": name,
+                "started_at": started_at,
+                "offset_s": round(start - self._origin, 6),
+                "wall_s": round(wall, 6),
+                "cpu_s": round(cpu, 6),
+                "process_cpu_s": round(process_cpu, 6),
+                "rss_mb": _rss_mb(),
+                "peak_rss_mb": _peak_rss_mb(),
+                "gpu_mb": gpu_mb,
+                "gpu_peak_mb": gpu_peak_mb,
+                "frames": span.frames,
+                "fps": round(span.frames / wall, 3) if span.frames and wall > 0 else None,
+                "thread": threading.current_thread().name,
+                "error": error,
+            }
+            _end_span()
+            self._emit(record)
+
+    def _emit(self, record: dict):
+        with self._lock:
+            self.records.append(record)
+            if self.jsonl_path:
+                with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def summary(self) -> list:
+        """단계 이름별 합계 (한 단계가 청크마다 여러 구간으로 기록되어도 한 행으로 합칩니다)."""
+        with self._lock:
+            records = list(self.records)
+        stages = {}
+        for record in records:
+            stage = stages.setdefault(record["stage"], {
+                "stage": record["stage"], "calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "frames": None,
+                "peak_rss_mb": None, "gpu_peak_mb": None,
+            })
+            stage["calls"] += 1
+            stage["wall_s"] += record["wall_s"]
+            stage["cpu_s"] += record["cpu_s"]
+            if record["frames"] is not None:
+                stage["frames"] = (stage["frames"] or 0) + record["frames"]
+            for key in ("peak_rss_mb", "gpu_peak_mb"):
+                if record[key] is not None:
+                    stage[key] = max(stage[key] or 0.0, record[key])
+        for stage in stages.values():
+            stage["fps"] = stage["frames"] / stage["wall_s"] if stage["frames"] and stage["wall_s"] > 0 else None
+        return list(stages.values())
+
+    def write_trace(self, trace_path: str = None):
+        trace_path = trace_path or self.trace_path
+        if not trace_path:
+            return
+        pid = os.getpid()
+        with self._lock:
+            records = list(self.records)
+        # tid는 정수여야 하므로 스레드 이름마다 번호를 붙이고, 이름은 메타데이터 이벤트로 표시
+        tids = {}
+        for record in records:
+            tids.setdefault(record["thread"], len(tids) + 1)
+        events = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": thread}} for thread, tid in tids.items()]
+        events += [{
+            "name": record["stage"],
+            "ph": "X",
+            "ts": record["offset_s"] * 1e6,
+            "dur": record["wall_s"] * 1e6,
+            "pid": pid,
+            "tid": tids[record["thread"]],
+            "args": {key: record[key] for key in ("cpu_s", "process_cpu_s", "rss_mb", "gpu_mb", "frames", "fps", "error") if record[key] is not None},
+        } for record in records]
+        with open(trace_path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        print(f"[✅] Chrome trace 저장 완료 → {trace_path}")
+
+
+@contextmanager
+def null_span(name: str = None, frames: int = None):
+    """프로파일러가 없을 때 쓰는 빈 구간."""
+    yield Span(name, frames)
@@ -1,5 +1,7 @@
 import os
 import json
+import threading
+import numpy as np
 from ultralytics import YOLO
 from tqdm import tqdm
 
@@ -11,25 +13,69 @@ def load_frames(frame_dir: str):
     ])
     return frame_paths
 
-def detect_objects(model_path: str, frame_paths: list, device: str = "cuda"):
-    model = YOLO(model_path)
+DEFAULT_BATCH_SIZE = 16
+
+_MODELS = {}
+_MODEL_LOCKS = {}
+_LOAD_LOCK = threading.Lock()
+
+def load_model(model_path: str):
+    """같은 가중치 파일은 프로세스 안에서 한 번만 로드하고 이후 호출에서 재사용합니다."""
+    with _LOAD_LOCK:
+        if model_path not in _MODELS:
+            _MODELS[model_path] = YOLO(model_path)
+            # ultralytics predictor는 스레드 안전하지 않으므로 모델별로 추론을 직렬화
+            _MODEL_LOCKS[model_path] = threading.Lock()
+        return _MODELS[model_path]
+
+# JSON에 저장하는 레코드 필드. 나머지(cls/conf/area 원시 배열)는 메모리/캐시에서만 쓰고 Object_Timeline이 요약합니다.
+JSON_FIELDS = ("frame", "objects", "frame_index", "timestamp")
+
+def _frame_source(frame):
+    # 경로(str)는 그대로, Frame_Extraction.FrameData는 BGR numpy 배열, numpy 배열은 그대로 전달
+    if isinstance(frame, str):
+        return frame, os.path.basename(frame)
+    if isinstance(frame, np.ndarray):
+        return frame, None
+    return frame.image, frame.name
+
+def detect_objects(model_path: str, frames: list, device: str = "cuda", batch_size: int = DEFAULT_BATCH_SIZE, half: bool = None):
+    # half를 지정하지 않으면 GPU에서는 FP16, CPU에서는 FP32로 추론
+    if half is None:
+        half = device.startswith("cuda")
+    model = load_model(model_path)
+    frames = list(frames)
     detections = []
 
-    for path in tqdm(frame_paths, desc="YOLO 객체 탐지 중"):
-        result = model(path, device=device, verbose=False)[0]
-        class_ids = result.boxes.cls.tolist()
-        names = result.names
-        detected_objects = list(set([names[int(cls)] for cls in class_ids]))
-        detections.append({
-            "frame": os.path.basename(path),
-            "objects": detected_objects
-        })
+    for start in tqdm(range(0, len(frames), batch_size), desc="YOLO 객체 탐지 중"):
+        sources, frame_names = zip(*(_frame_source(frame) for frame in frames[start:start + batch_size]))
+        with _MODEL_LOCKS[model_path]:
+            results = model(list(sources), device=device, half=half, verbose=False)
+        for offset, (result, frame_name) in enumerate(zip(results, frame_names)):
+            boxes = result.boxes
+            class_ids = boxes.cls.cpu().numpy().astype(np.int32)
+            names = result.names
+            detected_objects = list(set([names[int(cls)] for cls in class_ids]))
+            record = {
+                "frame": frame_name or f"frame_{start + offset:04d}.jpg",
+                "objects": detected_objects,
+                # 박스별 원시 값: 클래스 id, 신뢰도, 정규화된 박스 넓이(0~1)
+                "cls": class_ids,
+                "conf": boxes.conf.cpu().numpy().astype(np.float32),
+                "area": boxes.xywhn[:, 2:].prod(dim=1).cpu().numpy().astype(np.float32),
+            }
+            frame = frames[start + offset]
+            if not isinstance(frame, (str, np.ndarray)):
+                record["frame_index"] = int(frame.index)
+                record["timestamp"] = round(float(frame.timestamp), 4)
+            detections.append(record)
 
     return detections
 
 def save_results(detections: list, output_path: str):
+    records = [{key: record[key] for key in JSON_FIELDS if key in record} for record in detections]
     with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(detections, f, indent=2, ensure_ascii=False)
+        json.dump(records, f, indent=2, ensure_ascii=False)
     print(f"[✅] 객체 탐지 결과 저장 완료 → {output_path}")
 
 if __name__ == "__main__":
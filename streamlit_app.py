@@ -1,13 +1,189 @@
 import os
 import json
+import glob
+from collections import Counter
+import numpy as np
+import pandas as pd
+import altair as alt
 import streamlit as st
 import argparse # 인자 파싱을 위해 추가
 import sys # sys.exit() 사용을 위해 추가
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts"))
+
 # 🌟 타이틀
 st.set_page_config(page_title="Prompt-TuneVision Dashboard", layout="wide")
 st.title("🎬 Prompt-TuneVision : Prompt Evaluation Dashboard")
 
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+RUN_LIST_TTL = 10  # 초. 실행 목록은 이 간격으로만 디렉토리를 다시 훑습니다.
+MAX_CHART_POINTS = 1500  # CLIP 그래프의 실행당 최대 점 개수. 넘으면 LTTB/구간 min-max로 줄입니다.
+
+from Downsampling import lttb, minmax_buckets
+from Object_Timeline import load_timeline, summarize_timeline
+
+
+# --- 캐시된 로더 ---
+# Streamlit은 위젯을 조작할 때마다 스크립트 전체를 다시 실행하므로, 파일은 (경로, mtime)을 키로 캐시합니다.
+# 파이프라인이 파일을 다시 쓰면 mtime이 바뀌어 자동으로 새로 읽습니다.
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def _read_json(path, mtime):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def _read_text(path, mtime):
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().strip()
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _summarize_yolo(path, mtime):
+    yolo_data = _read_json(path, mtime)
+    object_counts = Counter(obj for item in yolo_data for obj in item.get("objects", []))  # "objects" 키가 없을 경우 대비
+    return len(yolo_data), dict(object_counts.most_common())
+
+
+def load_json(path):
+    mtime = _mtime(path)
+    return None if mtime is None else _read_json(path, mtime)
+
+
+def load_text(path):
+    mtime = _mtime(path)
+    return None if mtime is None else _read_text(path, mtime)
+
+
+def load_yolo_summary(path):
+    """(YOLO 분석 프레임 수, 객체별 등장 횟수) 또는 파일이 없으면 None."""
+    mtime = _mtime(path)
+    return None if mtime is None else _summarize_yolo(path, mtime)
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _summarize_timeline(path, mtime):
+    timeline = load_timeline(path)
+    return len(timeline["frame_index"]), summarize_timeline(timeline)
+
+
+def load_timeline_summary(path):
+    """(분석 프레임 수, 객체별 등장 비율/구간 요약) 또는 타임라인 파일이 없으면 None."""
+    mtime = _mtime(path)
+    return None if mtime is None else _summarize_timeline(path, mtime)
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _clip_timeline(path, mtime, max_points):
+    """
+    CLIP 점수 JSON을 그래프용 (선, min-max 띠) DataFrame으로 만듭니다.
+    x축은 모든 레코드에 timestamp가 있으면 초, 없으면(예전 결과) 샘플링 순번입니다.
+    """
+    scores = _read_json(path, mtime)
+    y = np.array([record["score"] for record in scores], dtype=np.float64)
+    has_time = bool(scores) and all(record.get("timestamp") is not None for record in scores)
+    x = np.array([record["timestamp"] for record in scores], dtype=np.float64) if has_time else np.arange(len(y), dtype=np.float64)
+    frames = np.array([record["frame"] for record in scores], dtype=object)
+
+    keep = lttb(x, y, max_points)
+    line = pd.DataFrame({"x": x[keep], "score": y[keep], "frame": frames[keep]})
+    band_x, band_min, band_max, _ = minmax_buckets(x, y, max_points)
+    band = pd.DataFrame({"x": band_x, "score_min": band_min, "score_max": band_max})
+    if len(y) <= max_points:
+        band = band.iloc[0:0]  # 줄이지 않았으면 띠가 선과 같으므로 생략
+    return line, band, has_time, len(y)
+
+
+def load_clip_timeline(path, max_points=MAX_CHART_POINTS):
+    mtime = _mtime(path)
+    return None if mtime is None else _clip_timeline(path, mtime, max_points)
+
+
+def run_label(run):
+    return f"{os.path.basename(os.path.dirname(run['results_dir']))} / {run['video_name']}"
+
+
+def clip_chart(timelines):
+    """
+    timelines: [(실행 이름, line, band, has_time)]. 실행이 하나면 min-max 띠를 함께 그리고,
+    여러 개면 선만 겹쳐 그립니다. 드래그/휠로 x축 확대·이동이 됩니다.
+    """
+    use_time = all(has_time for _, _, _, has_time in timelines)
+    x_title = "Time (s)" if use_time else "Sampled frame"
+    layers = []
+    for label, line, band, has_time in timelines:
+        if not use_time and has_time:
+            # 시간 축이 없는 실행과 겹칠 때는 모두 샘플링 순번으로 맞춤
+            line = line.assign(x=np.arange(len(line), dtype=np.float64))
+            band = band.iloc[0:0]
+        line = line.assign(run=label)
+        if len(timelines) == 1 and len(band):
+            layers.append(alt.Chart(band).mark_area(opacity=0.2).encode(
+                x=alt.X("x:Q", title=x_title), y="score_min:Q", y2="score_max:Q"))
+        layers.append(alt.Chart(line).mark_line(point=len(line) <= 200).encode(
+            x=alt.X("x:Q", title=x_title),
+            y=alt.Y("score:Q", title="Similarity Score", scale=alt.Scale(zero=False)),
+            color=alt.Color("run:N", legend=alt.Legend(orient="bottom") if len(timelines) > 1 else None),
+            tooltip=["run:N", "frame:N", alt.Tooltip("x:Q", title=x_title, format=".2f"), alt.Tooltip("score:Q", format=".2f")],
+        ))
+    return alt.layer(*layers).interactive(bind_y=False)
+
+
+@st.cache_data(show_spinner=False, ttl=RUN_LIST_TTL)
+def list_runs(data_dir=DATA_DIR):
+    """
+    data/<실행 폴더>/analysis_results/<video_name>_yolo.json 을 기준으로 실행 목록을 만듭니다.
+    파일 이름만 훑고 내용은 읽지 않습니다 (내용은 선택된 실행만 읽음).
+    """
+    runs = []
+    pattern = os.path.join(data_dir, "**", "analysis_results", "*_yolo.json")
+    for yolo_json_path in glob.glob(pattern, recursive=True):
+        results_dir = os.path.dirname(yolo_json_path)
+        video_name = os.path.basename(yolo_json_path)[:-len("_yolo.json")]
+        runs.append({"results_dir": results_dir, "video_name": video_name, "mtime": _mtime(yolo_json_path)})
+    runs.sort(key=lambda run: run["mtime"] or 0, reverse=True)
+    return runs
+
+
+@st.cache_data(show_spinner=False, ttl=RUN_LIST_TTL)
+def lookup_run_inputs(video_name):
+    """결과 저장소에서 해당 비디오의 가장 최근 실행의 (프롬프트 경로, 비디오 경로)를 찾습니다."""
+    try:
+        import pyarrow.dataset as ds
+        from Results_Store import load_runs
+        runs = load_runs(columns=["created_at", "prompt_path", "video_path"], where=ds.field("video_name") == video_name)
+    except Exception:
+        return None, None
+    if runs.empty:
+        return None, None
+    latest = runs.sort_values("created_at").iloc[-1]
+    return latest["prompt_path"], latest["video_path"]
+
+
+def select_run(default_run=None):
+    """사이드바에서 볼 실행을 고릅니다. 선택된 실행의 (results_dir, prompt, video, video_name)을 반환합니다."""
+    runs = list_runs()
+    if default_run is not None:
+        runs = [default_run] + [run for run in runs
+                                if (run["results_dir"], run["video_name"]) != (default_run["results_dir"], default_run["video_name"])]
+    if not runs:
+        return None
+
+    st.sidebar.header("🗂️ Runs")
+    run = st.sidebar.selectbox("분석 실행 선택", runs, index=0, format_func=run_label)
+    prompt_file_path, video_file_path = run.get("prompt_file_path"), run.get("video_file_path")
+    if prompt_file_path is None or video_file_path is None:
+        prompt_file_path, video_file_path = lookup_run_inputs(run["video_name"])
+    return run["results_dir"], prompt_file_path or "", video_file_path or "", run["video_name"]
+
+
 def display_dashboard(results_dir, prompt_file_path, video_file_path, video_name_arg):
     # 📌 0. 원본 프롬프트 및 비디오 출력
     st.header("📽️ Original Prompt & Generated Video")
@@ -16,9 +192,8 @@ def display_dashboard(results_dir, prompt_file_path, video_file_path, video_name
 
     with col1:
         st.subheader("📝 Prompt")
-        if os.path.exists(prompt_file_path):
-            with open(prompt_file_path, "r", encoding="utf-8") as f:
-                prompt_text = f.read().strip()
+        prompt_text = load_text(prompt_file_path)
+        if prompt_text is not None:
             st.code(prompt_text, language="text")
         else:
             st.error(f"Prompt file not found: {prompt_file_path}")
@@ -34,28 +209,47 @@ def display_dashboard(results_dir, prompt_file_path, video_file_path, video_name
         else:
             st.error(f"Video file not found: {video_file_path}")
 
-    # 📊 1. CLIP 유사도 플롯
+    # 📊 1. CLIP 유사도 그래프 (원본 점수 JSON으로 직접 그림)
     st.header("📈 CLIP Similarity per Frame")
-    clip_plot_path = os.path.join(results_dir, f"{video_name_arg}_clip_plot.png")
-    if os.path.exists(clip_plot_path):
-        st.image(clip_plot_path, caption="CLIP 유사도 분석 결과", use_container_width=True) # use_container_width=True로 변경
+    clip_json_path = os.path.join(results_dir, f"{video_name_arg}_clip.json")
+    timeline = load_clip_timeline(clip_json_path)
+    if timeline is not None:
+        line, band, has_time, num_frames = timeline
+        timelines = [(video_name_arg, line, band, has_time)]
+
+        other_runs = [run for run in list_runs() if (run["results_dir"], run["video_name"]) != (results_dir, video_name_arg)]
+        compare_runs = st.multiselect("다른 실행과 비교", other_runs, format_func=run_label)
+        for run in compare_runs:  # 선택한 실행의 점수만 읽음
+            other = load_clip_timeline(os.path.join(run["results_dir"], f"{run['video_name']}_clip.json"))
+            if other is not None:
+                timelines.append((run_label(run), other[0], other[1], other[2]))
+
+        st.altair_chart(clip_chart(timelines), use_container_width=True)
+        if num_frames > len(line):
+            st.caption(f"{num_frames}개 프레임을 {len(line)}개 점으로 줄여 표시 (LTTB, 음영은 구간별 최소~최대)")
     else:
-        st.warning(f"CLIP plot not found: {clip_plot_path}")
+        st.warning(f"CLIP score data not found: {clip_json_path}")
 
     # 🧠 2. YOLO 탐지 객체 요약
     st.header("🔍 YOLO Detected Objects")
     yolo_json_path = os.path.join(results_dir, f"{video_name_arg}_yolo.json")
-    if os.path.exists(yolo_json_path):
-        with open(yolo_json_path, "r", encoding="utf-8") as f:
-            yolo_data = json.load(f)
-
-        all_objects = []
-        for item in yolo_data:
-            all_objects.extend(item.get("objects", [])) # "objects" 키가 없을 경우 대비
-        
-        if yolo_data: # yolo_data가 비어있지 않은 경우에만 계산
-            object_counts = {obj: all_objects.count(obj) for obj in set(all_objects)}
-            st.write(f"총 프레임 수 (YOLO 분석 대상): {len(yolo_data)}")
+    timeline_path = os.path.join(results_dir, f"{video_name_arg}_object_timeline.npz")
+    timeline = load_timeline_summary(timeline_path)
+    yolo_summary = None if timeline is not None else load_yolo_summary(yolo_json_path)  # 타임라인이 없는 예전 결과만 JSON 집계
+    if timeline is not None:
+        num_frames, objects = timeline
+        st.write(f"총 프레임 수 (YOLO 분석 대상): {num_frames}")
+        if objects:
+            table = pd.DataFrame(objects)
+            table["intervals"] = table["intervals"].map(lambda runs: ", ".join(f"{start}–{end}" for start, end in runs))
+            st.dataframe(table, hide_index=True, use_container_width=True,
+                         column_config={"coverage": st.column_config.ProgressColumn("coverage", format="%.2f", min_value=0, max_value=1)})
+        else:
+            st.info("No objects were detected in any frame.")
+    elif yolo_summary is not None:
+        num_frames, object_counts = yolo_summary
+        if num_frames: # yolo_data가 비어있지 않은 경우에만 표시
+            st.write(f"총 프레임 수 (YOLO 분석 대상): {num_frames}")
             st.write("탐지된 객체 빈도:")
             st.json(object_counts)
         else:
@@ -67,15 +261,19 @@ def display_dashboard(results_dir, prompt_file_path, video_file_path, video_name
     # 📦 3. 객체 등장 비교 결과
     st.header("📊 Object Appearance Analysis")
     comparison_json_path = os.path.join(results_dir, f"{video_name_arg}_object_comparison.json")
-    if os.path.exists(comparison_json_path):
-        with open(comparison_json_path, "r", encoding="utf-8") as f:
-            comparison = json.load(f)
-
+    comparison = load_json(comparison_json_path)
+    if comparison is not None:
         st.write("Prompt 내 언급 객체:")
         st.write(comparison.get("prompt_objects", []))
 
         st.success(f"✅ 등장한 객체: {comparison.get('appeared_objects', [])}")
         st.warning(f"❗ 누락된 객체: {comparison.get('missing_objects', [])}")
+        grounded = comparison.get("grounded_objects")
+        if grounded:
+            st.write("CLIP grounding (키워드가 보이는 프레임 비율):")
+            st.json({keyword: f"{ratio:.0%}" for keyword, ratio in sorted(grounded.items(), key=lambda item: -item[1])})
+        if comparison.get("unrecognized_objects"):
+            st.info(f"ℹ️ 검출기 라벨에 없는 단어 (비교 제외): {comparison['unrecognized_objects']}")
     else:
         st.warning(f"Object comparison JSON data not found: {comparison_json_path}")
 
@@ -83,9 +281,8 @@ def display_dashboard(results_dir, prompt_file_path, video_file_path, video_name
     st.header("🛠️ Revised Prompt & Feedback (by GPT)")
     # 파일명은 run_pipeline.py에서 저장하는 _feedback_and_revised_prompt.txt 사용
     revised_prompt_feedback_path = os.path.join(results_dir, f"{video_name_arg}_feedback_and_revised_prompt.txt")
-    if os.path.exists(revised_prompt_feedback_path):
-        with open(revised_prompt_feedback_path, "r", encoding="utf-8") as f:
-            improved_text = f.read().strip()
+    improved_text = load_text(revised_prompt_feedback_path)
+    if improved_text is not None:
         st.text_area("Feedback + Improved Prompt", value=improved_text, height=300)
     else:
         st.warning(f"Revised prompt and feedback file not found: {revised_prompt_feedback_path}")
@@ -94,10 +291,11 @@ if __name__ == '__main__':
     # Streamlit 앱이 `streamlit run streamlit_app.py -- --arg1 val1` 형태로 실행될 때 인자 파싱
     # 'streamlit run' 뒤의 '--'는 스크립트에 인자를 전달하기 위한 구분자입니다.
     parser = argparse.ArgumentParser(description="Prompt-TuneVision Dashboard")
-    parser.add_argument("--results_dir", required=True, help="Path to the analysis results directory.")
-    parser.add_argument("--prompt_file_path", required=True, help="Path to the original prompt text file.")
-    parser.add_argument("--video_file_path", required=True, help="Path to the generated video file.")
-    parser.add_argument("--video_name", required=True, help="Base name of the video (used for finding result files).")
+    # 인자를 모두 주면 해당 실행이 기본 선택되고, 생략하면 data/ 아래의 최근 실행부터 보여줍니다.
+    parser.add_argument("--results_dir", help="Path to the analysis results directory.")
+    parser.add_argument("--prompt_file_path", help="Path to the original prompt text file.")
+    parser.add_argument("--video_file_path", help="Path to the generated video file.")
+    parser.add_argument("--video_name", help="Base name of the video (used for finding result files).")
     
     # Streamlit은 자체적으로 인자를 파싱하므로, 스크립트 인자만 골라내기
     # sys.argv[0]은 스크립트 이름, 그 이후부터가 인자
@@ -115,7 +313,15 @@ if __name__ == '__main__':
         # `streamlit run app.py -- --arg1 val1 --arg2 val2`와 같이 사용해야 함.
         # 이 경우 sys.argv는 ['app.py', '--arg1', 'val1', '--arg2', 'val2']가 됩니다.
         args = parser.parse_args()
-        display_dashboard(args.results_dir, args.prompt_file_path, args.video_file_path, args.video_name)
+        default_run = None
+        if args.results_dir and args.video_name:
+            default_run = {"results_dir": args.results_dir, "video_name": args.video_name,
+                           "prompt_file_path": args.prompt_file_path, "video_file_path": args.video_file_path}
+        selected = select_run(default_run)
+        if selected is None:
+            st.info(f"No analysis results found under {DATA_DIR}.")
+        else:
+            display_dashboard(*selected)
     except SystemExit as e:
         # argparse가 --help 등으로 종료할 때 SystemExit 예외 발생, 정상 종료로 처리
         if e.code != 0: # 코드가 0이 아니면 실제 오류이므로 다시 발생
@@ -0,0 +1,42 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+import nltk
+from Label_Index import COCO_LABELS, _build_index, LabelIndex
+
+
+def _has_wordnet():
+    try:
+        nltk.data.find("corpora/wordnet")
+        return True
+    except LookupError:
+        return False
+
+
+pytestmark = pytest.mark.skipif(not _has_wordnet(), reason="WordNet 데이터가 없음 (nltk.download('wordnet'))")
+
+
+@pytest.fixture(scope="module")
+def index():
+    return LabelIndex(_build_index(tuple(sorted(COCO_LABELS))))
+
+
+def test_label_name_maps_only_to_itself(index):
+    # person의 하위어(guy.n.01의 "cat", 비유적 의미의 "dog")가 사람으로 대응되면 안 됨
+    assert index.lookup("cat") == ("cat",)
+    assert index.lookup("cats") == ("cat",)
+    assert index.lookup("dog") == ("dog",)
+
+
+def test_figurative_hyponym_not_mapped_to_person(index):
+    # tiger.n.01은 "a fierce person"이지만 tiger의 주된 의미는 동물
+    assert "person" not in index.lookup("tiger")
+
+
+def test_hyponyms_and_synonyms(index):
+    assert index.lookup("puppy") == ("dog",)
+    assert index.lookup("woman") == ("person",)
@@ -1,69 +1,214 @@
 import os
 import time
-import subprocess
-from datetime import datetime
-import sys
-python_executable = sys.executable  # 현재 파이썬 실행 파일의 절대 경로
+import queue
+import struct
+
+from analysis_worker import AnalysisWorker, submit_job
+from pairing import video_keys
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:  # watchdog이 없으면 디렉토리 폴링으로 대체
+    Observer = None
+    FileSystemEventHandler = object
 
 PROMPT_DIR = "data/prompts"
 VIDEO_DIR = "ComfyUI/output"
-POLL_INTERVAL = 2  # 초
-
-def get_latest_files_after(start_time):
-    prompt_files = {
-        f: os.path.getmtime(os.path.join(PROMPT_DIR, f))
-        for f in os.listdir(PROMPT_DIR)
-        if f.endswith(".txt")
-    }
-
-    video_files = {
-        f: os.path.getmtime(os.path.join(VIDEO_DIR, f))
-        for f in os.listdir(VIDEO_DIR)
-        if f.endswith(".mp4")
-    }
-
-    matched = []
-    for p_file, p_time in prompt_files.items():
-        if p_time < start_time:
-            continue
-        base_name = os.path.splitext(p_file)[0]
-        candidates = [v for v in video_files if base_name in v]
-        if candidates:
-            latest_video = max(candidates, key=lambda v: video_files[v])
-            matched.append((p_file, latest_video))
-
-    return matched
+POLL_INTERVAL = 2  # 초 (watchdog이 없을 때의 폴링 주기)
+READY_CHECK_INTERVAL = 1.0  # 초, 아직 쓰는 중인 MP4를 다시 확인하는 주기
+READY_TIMEOUT = 600  # 초, 이 시간 동안 완성되지 않은 MP4는 포기
+
+# 실행 중인 분석 워커 데몬이 없을 때 사용할 프로세스 내 워커 (모델은 한 번만 로드)
+local_worker = None
+
+
+def is_mp4_complete(path):
+    """
+    MP4의 최상위 box들을 훑어 moov/mdat이 모두 있고 box 크기 합이 파일 크기와 같은지 확인합니다.
+    인코더가 아직 쓰는 중이면 마지막 box가 잘려 있거나 moov가 없습니다.
+    """
+    try:
+        file_size = os.path.getsize(path)
+        found = set()
+        offset = 0
+        with open(path, "rb") as f:
+            while offset < file_size:
+                f.seek(offset)
+                header = f.read(16)
+                if len(header) < 8:
+                    return False
+                size, box_type = struct.unpack(">I4s", header[:8])
+                if size == 1:
+                    if len(header) < 16:
+                        return False
+                    size = struct.unpack(">Q", header[8:16])[0]
+                elif size == 0:  # 파일 끝까지 이어지는 box
+                    size = file_size - offset
+                if size < 8:
+                    return False
+                found.add(box_type)
+                offset += size
+        return offset == file_size and {b"moov", b"mdat"} <= found
+    except OSError:
+        return False
+
+
+class PairIndex:
+    """프롬프트 base name → 비디오 목록 인덱스. 새 파일 하나당 O(파일명 길이)로 짝을 찾습니다."""
+
+    def __init__(self, start_time):
+        self.start_time = start_time
+        self.prompts = {}  # base name → 프롬프트 파일명 (start_time 이후 생성된 것만)
+        self.videos = {}   # 접두어 → {비디오 파일명: mtime} (완성된 것만)
+
+    def add_prompt(self, prompt_file, mtime):
+        """새 프롬프트에 대해 (프롬프트, 가장 최근 비디오) 짝을 반환합니다."""
+        if mtime < self.start_time:
+            return []
+        base_name = os.path.splitext(prompt_file)[0]
+        self.prompts[base_name] = prompt_file
+        candidates = self.videos.get(base_name)
+        if not candidates:
+            return []
+        return [(prompt_file, max(candidates, key=candidates.get))]
+
+    def add_video(self, video_file, mtime):
+        """새로 완성된 비디오와 짝이 맞는 (프롬프트, 비디오) 목록을 반환합니다."""
+        matched = []
+        for key in video_keys(video_file):
+            self.videos.setdefault(key, {})[video_file] = mtime
+            if key in self.prompts:
+                matched.append((self.prompts[key], video_file))
+        return matched
+
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, events):
+        self.events = events
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.events.put(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.events.put(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.events.put(event.dest_path)
+
+    def on_closed(self, event):
+        if not event.is_directory:
+            self.events.put(event.src_path)
+
 
 def run_analysis_pipeline(prompt_file, video_file):
-    print(f"[▶️] 분석 시작: prompt={prompt_file}, video={video_file}")
-    subprocess.run([
-        python_executable,
-        "run_pipeline.py",
-        "--prompt", os.path.join(PROMPT_DIR, prompt_file),
-        "--video", os.path.join(VIDEO_DIR, video_file)
-    ], check=True)
+    global local_worker
+    prompt_path = os.path.join(PROMPT_DIR, prompt_file)
+    video_path = os.path.join(VIDEO_DIR, video_file)
+
+    # 서브프로세스를 새로 띄우지 않고, 상주 워커의 큐에 작업만 넣습니다.
+    if local_worker is None:
+        try:
+            reply = submit_job(prompt_path, video_path)
+            print(f"[📨] 분석 워커에 작업 전송: prompt={prompt_file}, video={video_file} ({reply})")
+            return
+        except ConnectionRefusedError:
+            print("[ℹ️] 실행 중인 분석 워커가 없어 이 프로세스 안에서 워커를 시작합니다.")
+            local_worker = AnalysisWorker().start()
+
+    pending = local_worker.submit(os.path.abspath(prompt_path), os.path.abspath(video_path))
+    print(f"[📥] 분석 작업 대기열 추가: prompt={prompt_file}, video={video_file} (대기 {pending})")
+
+
+class Monitor:
+    """프롬프트/비디오 디렉토리의 변경을 받아 인덱스를 갱신하고, 완성된 짝마다 분석을 요청합니다."""
+
+    def __init__(self, start_time):
+        self.index = PairIndex(start_time)
+        self.processed = set()
+        self.pending_videos = {}  # 아직 쓰는 중인 비디오 → 처음 발견한 시각
+        self.known_files = set()
+
+    def scan(self):
+        """디렉토리를 한 번 훑어 처음 보는 파일만 처리합니다 (시작 시 / 폴링 모드)."""
+        for f in os.listdir(VIDEO_DIR):
+            self.on_path(os.path.join(VIDEO_DIR, f))
+        for f in os.listdir(PROMPT_DIR):
+            self.on_path(os.path.join(PROMPT_DIR, f))
+
+    def on_path(self, path):
+        directory, name = os.path.split(os.path.abspath(path))
+        if name in self.known_files and name not in self.pending_videos:
+            return
+        if directory == os.path.abspath(PROMPT_DIR) and name.endswith(".txt"):
+            self.known_files.add(name)
+            self.dispatch(self.index.add_prompt(name, os.path.getmtime(path)))
+        elif directory == os.path.abspath(VIDEO_DIR) and name.endswith(".mp4"):
+            self.known_files.add(name)
+            self.pending_videos.setdefault(name, time.time())
+            self.check_pending()
+
+    def check_pending(self):
+        now = time.time()
+        for name, first_seen in list(self.pending_videos.items()):
+            path = os.path.join(VIDEO_DIR, name)
+            if is_mp4_complete(path):
+                del self.pending_videos[name]
+                self.dispatch(self.index.add_video(name, os.path.getmtime(path)))
+            elif now - first_seen > READY_TIMEOUT:
+                print(f"[⚠️] {READY_TIMEOUT}초 동안 완성되지 않은 비디오를 건너뜁니다: {name}")
+                del self.pending_videos[name]
+                # 나중에 파일이 다시 쓰이거나 옮겨지면 (이벤트/다음 스캔에서) 처음부터 다시 기다림
+                self.known_files.discard(name)
+
+    def dispatch(self, pairs):
+        for pair in pairs:
+            if pair in self.processed:
+                continue
+            run_analysis_pipeline(*pair)
+            self.processed.add(pair)
+
 
 def main():
     print("[👀] 프롬프트 및 비디오 감시 시작...")
-    start_time = time.time()
-    processed = set()
+    monitor = Monitor(time.time())
+    monitor.scan()
+
+    events = queue.Queue()
+    observer = None
+    if Observer is not None:
+        observer = Observer()
+        handler = _EventHandler(events)
+        observer.schedule(handler, PROMPT_DIR, recursive=False)
+        observer.schedule(handler, VIDEO_DIR, recursive=False)
+        observer.start()
+    else:
+        print(f"[ℹ️] watchdog을 사용할 수 없어 {POLL_INTERVAL}초 간격 폴링으로 감시합니다.")
 
     while True:
         try:
-            pairs = get_latest_files_after(start_time)
-            for prompt_file, video_file in pairs:
-                if (prompt_file, video_file) in processed:
-                    continue
-                run_analysis_pipeline(prompt_file, video_file)
-                processed.add((prompt_file, video_file))
-
-            time.sleep(POLL_INTERVAL)
+            if observer is None:
+                time.sleep(POLL_INTERVAL)
+                monitor.scan()
+            else:
+                try:
+                    path = events.get(timeout=READY_CHECK_INTERVAL)
+                    monitor.on_path(path)
+                except queue.Empty:
+                    pass
+            monitor.check_pending()
 
         except KeyboardInterrupt:
             print("\n[🛑] 감시 종료")
+            if observer is not None:
+                observer.stop()
+                observer.join()
+            if local_worker is not None:
+                local_worker.stop()
             break
-        except subprocess.CalledProcessError as e:
-            print(f"[❌] 분석 중 오류 발생: {e}")
         except Exception as e:
             print(f"[⚠️] 예기치 못한 오류: {e}")
 